@@ -2,6 +2,7 @@ from mongoengine.base.common import *
 from mongoengine.base.datastructures import *
 from mongoengine.base.document import *
 from mongoengine.base.fields import *
+from mongoengine.base.lazybson import *
 from mongoengine.base.metaclasses import *
 
 # Help with backwards compatibility
@@ -10,6 +10,62 @@ AUTO_CREATE_INDEX = False
 
 _document_registry = {}
 
+# Incremented whenever a document class is registered or the fields of a
+# class change, which may change how field paths resolve, see
+# BaseDocument._lookup_field
+_fields_version = 0
+
+
+def _fields_changed():
+    """Invalidates the field paths resolved for all document classes."""
+    global _fields_version
+    _fields_version += 1
+
+
+def _register_document(cls):
+    """Adds a document class to the registry."""
+    _document_registry[cls._class_name] = cls
+    _fields_changed()
+
+
+class FieldsDict(dict):
+    """The `_fields` of a document class, invalidating the cached field
+    paths of document classes when fields are added, replaced or removed.
+    """
+
+    __slots__ = ()
+
+    def __setitem__(self, key, value):
+        dict.__setitem__(self, key, value)
+        _fields_changed()
+
+    def __delitem__(self, key):
+        dict.__delitem__(self, key)
+        _fields_changed()
+
+    def update(self, *args, **kwargs):
+        dict.update(self, *args, **kwargs)
+        _fields_changed()
+
+    def setdefault(self, key, default=None):
+        value = dict.setdefault(self, key, default)
+        _fields_changed()
+        return value
+
+    def pop(self, *args):
+        value = dict.pop(self, *args)
+        _fields_changed()
+        return value
+
+    def popitem(self):
+        item = dict.popitem(self)
+        _fields_changed()
+        return item
+
+    def clear(self):
+        dict.clear(self)
+        _fields_changed()
+
 
 def get_document(name):
     doc = _document_registry.get(name, None)
@@ -1,10 +1,24 @@
 import weakref
+
+from bson import ObjectId
+
 from mongoengine.common import _import_class
 
 __all__ = ("BaseDict", "BaseList")
 
 
+def _pullable(value):
+    """Whether MongoDB matches `value` in $pull exactly when Python compares
+    it equal. Embedded documents only match an identical copy, including
+    key order and extra stored keys, and booleans never match numbers.
+    """
+    return (isinstance(value, (str, ObjectId, int, float)) and
+            not isinstance(value, bool))
+
+
 class WeakInstanceMixin(object):
+    __slots__ = ()
+
     _instance_ref = None
 
     def _get_instance(self):
@@ -59,14 +73,9 @@ class BaseDict(WeakInstanceMixin, dict):
         self._mark_as_changed()
         return super(BaseDict, self).__delattr__(*args, **kwargs)
 
-    def __getstate__(self):
-        self.instance = None
-        self._dereferenced = False
-        return self
-
-    def __setstate__(self, state):
-        self = state
-        return self
+    def __reduce_ex__(self, protocol):
+        # Pickled as a plain dict, the owning document wraps it again
+        return dict, (dict(self),)
 
     def clear(self, *args, **kwargs):
         self._mark_as_changed()
@@ -96,6 +105,11 @@ class BaseList(WeakInstanceMixin, list):
     _dereferenced = False
     _name = None
 
+    # Operations applied since the list was loaded or saved as
+    # (operator, value) tuples, used to save appends and removals with
+    # $push, $pull or $pop. None if the list must be saved as a whole.
+    _ops = None
+
     def __init__(self, list_items, instance, name):
         Document = _import_class('Document')
         EmbeddedDocument = _import_class('EmbeddedDocument')
@@ -121,34 +135,44 @@ class BaseList(WeakInstanceMixin, list):
         self._mark_as_changed()
         return super(BaseList, self).__delitem__(*args, **kwargs)
 
-    def __getstate__(self):
-        self.instance = None
-        self._dereferenced = False
-        return self
+    def __reduce_ex__(self, protocol):
+        # Pickled as a plain list, the owning document wraps it again
+        return list, (list(self),)
 
-    def __setstate__(self, state):
-        self = state
-        return self
+    def append(self, value):
+        super(BaseList, self).append(value)
+        self._mark_as_changed(('$push', [value]))
 
-    def append(self, *args, **kwargs):
-        self._mark_as_changed()
-        return super(BaseList, self).append(*args, **kwargs)
-
-    def extend(self, *args, **kwargs):
-        self._mark_as_changed()
-        return super(BaseList, self).extend(*args, **kwargs)
+    def extend(self, values):
+        values = list(values)
+        super(BaseList, self).extend(values)
+        self._mark_as_changed(('$push', values))
 
     def insert(self, *args, **kwargs):
         self._mark_as_changed()
         return super(BaseList, self).insert(*args, **kwargs)
 
-    def pop(self, *args, **kwargs):
-        self._mark_as_changed()
-        return super(BaseList, self).pop(*args, **kwargs)
+    def pop(self, index=-1):
+        length = len(self)
+        value = super(BaseList, self).pop(index)
+        if index in (-1, length - 1):
+            self._mark_as_changed(('$pop', 1))
+        elif index in (0, -length):
+            self._mark_as_changed(('$pop', -1))
+        else:
+            self._mark_as_changed()
+        return value
 
-    def remove(self, *args, **kwargs):
-        self._mark_as_changed()
-        return super(BaseList, self).remove(*args, **kwargs)
+    def remove(self, value):
+        matches = [item for item in self if item == value]
+        super(BaseList, self).remove(value)
+        # $pull removes every occurrence of the value, and only those the
+        # database considers equal to it
+        if (len(matches) == 1 and _pullable(value) and
+                _pullable(matches[0])):
+            self._mark_as_changed(('$pull', value))
+        else:
+            self._mark_as_changed()
 
     def reverse(self, *args, **kwargs):
         self._mark_as_changed()
@@ -158,6 +182,27 @@ class BaseList(WeakInstanceMixin, list):
         self._mark_as_changed()
         return super(BaseList, self).sort(*args, **kwargs)
 
-    def _mark_as_changed(self):
+    def _mark_as_changed(self, operation=None):
+        if operation is None:
+            self._ops = None
+        elif self._ops is not None:
+            self._ops.append(operation)
         if hasattr(self._instance, '_mark_as_changed'):
             self._instance._mark_as_changed(self._name)
+
+    def _operation(self):
+        """Returns the (operator, value) pair equivalent to the recorded
+        operations, or None if the list has to be saved as a whole.
+        """
+        ops = self._ops
+        if not ops:
+            return None
+        operator = ops[0][0]
+        if any(op[0] != operator for op in ops):
+            return None
+        if operator == '$push':
+            return operator, [value for op in ops for value in op[1]]
+        if operator == '$pull':
+            return operator, [op[1] for op in ops]
+        # Only a single element can be popped per update
+        return ops[0] if len(ops) == 1 else None
@@ -3,18 +3,21 @@ import warnings
 from functools import partial
 
 import pymongo
-from bson import json_util
+from bson import Binary, decode, encode, json_util
 from bson.son import SON
 
 from mongoengine.common import _import_class
+from mongoengine.context_managers import _identity_key, _identity_map
 from mongoengine.errors import (ValidationError, LookUpError)
 from mongoengine.python_support import PY3, txt_type
 from mongoengine.pymongo_support import LEGACY_JSON_OPTIONS
 
+from mongoengine.base import common
 from mongoengine.base.proxy import DocumentProxy
 from mongoengine.base.common import get_document, ALLOW_INHERITANCE
 from mongoengine.base.datastructures import BaseDict, BaseList
-from mongoengine.base.fields import ComplexBaseField
+from mongoengine.base.fields import BaseField, ComplexBaseField
+from mongoengine.base.lazybson import LazyBSONDocument
 
 __all__ = ('BaseDocument', 'NON_FIELD_ERRORS')
 
@@ -22,9 +25,47 @@ NON_FIELD_ERRORS = '__all__'
 
 _set = object.__setattr__
 
+# The maximum number of paths cached per document class
+FIELD_PATH_CACHE_SIZE = 1000
+
+
+class _FieldPathCache(object):
+    """Field paths resolved by :meth:`BaseDocument._lookup_field` and
+    :meth:`BaseDocument._translate_field_name` for a document class, and the
+    query plans of :func:`mongoengine.queryset.transform.query` built on them.
+    """
+
+    __slots__ = ('version', 'paths', 'names', 'plans')
+
+    def __init__(self):
+        # Valid until a document class is registered or fields change
+        self.version = common._fields_version
+        self.paths = {}
+        self.names = {}
+        self.plans = {}
+
 
 class BaseDocument(object):
 
+    # Instances only get a __dict__ unless the document opts in to a slotted
+    # layout with ``meta = {'slots': True}``, see DocumentMetaclass
+    __slots__ = ()
+
+    # Per-instance state declared as slots by slotted documents
+    _instance_slots = ('_db_data', '_lazy', '_internal_data',
+                       '_changed_fields', '_dirty_fields', '_atomic_bases')
+    # Slots that are created on first access, mapped to a default factory
+    _slot_defaults = {'_changed_fields': set, '_dirty_fields': type(None),
+                      '_atomic_bases': type(None)}
+    _slotted = False
+
+    # Field name -> keys of embedded documents with unsaved changes, created
+    # on the first change, see _mark_dirty
+    _dirty_fields = None
+    # Field name -> value of atomic fields before their first change since
+    # loading or saving, created on the first change, see _mark_atomic
+    _atomic_bases = None
+
     #_dynamic = False
     #_dynamic_lock = True
     _initialised = False
@@ -38,7 +79,8 @@ class BaseDocument(object):
         _set(self, '_db_data', _son)
         _set(self, '_lazy', False)
         _set(self, '_internal_data', {})
-        _set(self, '_changed_fields', set())
+        if not self._slotted:
+            _set(self, '_changed_fields', set())
         if values:
             pk = values.pop('pk', None)
             for field, value in values.items():
@@ -58,7 +100,7 @@ class BaseDocument(object):
 
     @property
     def _created(self):
-        return self._db_data != None or self._lazy
+        return self._db_data is not None or self._lazy
 
     def __iter__(self):
         if 'id' in self._fields and 'id' not in self._fields_ordered:
@@ -129,6 +171,51 @@ class BaseDocument(object):
         else:
             return hash(self.pk)
 
+    def __getstate__(self):
+        """Only the data loaded from the database and the values that changed
+        since are pickled, other fields are decoded lazily again.
+        """
+        changed_names = set(name.split('.', 1)[0]
+                            for name in self._get_changed_fields())
+        internal_data = self._internal_data
+        state = {
+            '_db_data': self._db_data,
+            '_lazy': self._lazy,
+            '_internal_data': dict((name, internal_data[name])
+                                   for name in changed_names
+                                   if name in internal_data),
+            '_changed_fields': set(self._changed_fields),
+        }
+        if self._dirty_fields:
+            state['_dirty_fields'] = self._dirty_fields
+        if self._atomic_bases:
+            state['_atomic_bases'] = self._atomic_bases
+        if getattr(self, '_partial', None):
+            state['_partial'] = self._partial
+        return state
+
+    def __setstate__(self, state):
+        _set(self, '_db_data', state['_db_data'])
+        _set(self, '_lazy', state['_lazy'])
+        _set(self, '_internal_data', {})
+        _set(self, '_changed_fields', state['_changed_fields'])
+        for name in ('_dirty_fields', '_atomic_bases', '_partial'):
+            if name in state:
+                _set(self, name, state[name])
+
+        # Lists and dicts are pickled as plain values, wrap them and attach
+        # embedded documents to this document again
+        changed_fields = self._changed_fields
+        internal_data = self._internal_data
+        for name, value in state['_internal_data'].items():
+            value_for_instance = getattr(self._fields.get(name),
+                                         'value_for_instance', None)
+            if value_for_instance is not None:
+                value = value_for_instance(value, self)
+            if isinstance(value, BaseList) and name in changed_fields:
+                value._ops = None
+            internal_data[name] = value
+
     def clean(self):
         """
         Hook for doing document level data cleaning before validation is run.
@@ -142,8 +229,7 @@ class BaseDocument(object):
     def to_mongo(self):
         """Return as SON data ready for use with MongoDB.
         """
-        sets, unsets = self._delta(full=True)
-        son = SON(data=sets)
+        son = self._serializer(self)
         allow_inheritance = self._meta.get('allow_inheritance',
                                           ALLOW_INHERITANCE)
         if allow_inheritance:
@@ -153,9 +239,14 @@ class BaseDocument(object):
     def to_dict(self):
         return dict((field, getattr(self, field)) for field in self._fields)
 
-    def validate(self, clean=True):
+    def validate(self, clean=True, fields=None):
         """Ensure that all fields' values are valid and that required fields
         are present.
+
+        :param clean: call the document clean method first
+        :param fields: (optional) names of the fields whose values are
+            validated. The remaining fields are only checked for being
+            present, without decoding them.
         """
         # Ensure that each field is matched to a valid value
         errors = {}
@@ -165,9 +256,20 @@ class BaseDocument(object):
             except ValidationError as error:
                 errors[NON_FIELD_ERRORS] = error
 
+        if fields is None:
+            names = self._fields
+        else:
+            names = fields
+            for name, field in self._fields.items():
+                if (name not in names and field.required and
+                   not getattr(field, '_auto_gen', False) and
+                   not self._has_value(name)):
+                    errors[name] = ValidationError('Field is required',
+                                                   field_name=name)
+
         # Get a list of tuples of field names and their current values
-        fields = [(field, getattr(self, name))
-                  for name, field in list(self._fields.items())]
+        fields = [(self._fields[name], getattr(self, name)) for name in names
+                  if name in self._fields]
         #if self._dynamic:
         #    fields += [(field, self._data.get(name))
         #               for name, field in self._dynamic_fields.items()]
@@ -200,6 +302,27 @@ class BaseDocument(object):
             message = "ValidationError (%s:%s) " % (self._class_name, pk)
             raise ValidationError(message, errors=errors)
 
+    def _has_value(self, name):
+        """Whether a field has a value, without decoding it if it wasn't
+        accessed yet.
+        """
+        data = self._internal_data
+        if name in data:
+            return data[name] is not None
+        if self._lazy:
+            return True
+        db_data = self._db_data
+        db_field = self._db_field_map.get(name, name)
+        if db_data is not None and db_field in db_data:
+            # A value stored as null is missing, like an unset value
+            return db_data[db_field] is not None
+        if getattr(self, '_partial', None):
+            # The field may not have been loaded
+            self._complete()
+            return self._has_value(name)
+        default = self._fields[name].default
+        return (default() if callable(default) else default) is not None
+
     def to_json(self, json_options=None):
         """Converts a document to JSON"""
         if json_options is None:
@@ -220,6 +343,72 @@ class BaseDocument(object):
         """Converts json data to an unsaved document instance"""
         return cls._from_son(json_util.loads(json_data))
 
+    def to_cache_bytes(self):
+        """Encodes the document as BSON for caching it, see
+        :meth:`from_cache_bytes`. Data loaded as raw BSON is copied without
+        decoding it, otherwise only changed values are converted.
+        """
+        db_data = self._db_data
+        if isinstance(db_data, LazyBSONDocument):
+            db_data = db_data.raw
+        elif db_data is not None:
+            db_data = encode(db_data)
+
+        changed = {}
+        internal_data = self._internal_data
+        for name in self._get_changed_fields():
+            name = name.split('.', 1)[0]
+            if name in internal_data and name not in changed:
+                value = internal_data[name]
+                if value is not None:
+                    value = self._fields[name].to_mongo(value)
+                changed[name] = value
+
+        cache = {'_cls': self._class_name, 'changed': changed}
+        if db_data is not None:
+            cache['data'] = Binary(db_data)
+        if self._lazy:
+            cache['lazy'] = True
+        if self._atomic_bases:
+            cache['atomic'] = self._atomic_bases
+        if getattr(self, '_partial', None):
+            cache['partial'] = list(self._partial)
+        return encode(cache)
+
+    @classmethod
+    def from_cache_bytes(cls, data):
+        """Restores a document encoded by :meth:`to_cache_bytes`. Fields that
+        weren't changed are decoded lazily from the cached raw BSON. Changes
+        within embedded documents and lists are restored as changes of the
+        whole field.
+        """
+        cache = decode(data)
+        doc_cls = get_document(cache['_cls'])
+        if not issubclass(doc_cls, cls):
+            raise ValueError('Cached document is a %s, not a %s' %
+                             (doc_cls._class_name, cls._class_name))
+
+        changed = {}
+        for name, value in cache['changed'].items():
+            if value is not None:
+                value = doc_cls._fields[name].to_python(value)
+            changed[name] = value
+
+        db_data = cache.get('data')
+        state = {
+            '_db_data': None if db_data is None else LazyBSONDocument(db_data),
+            '_lazy': cache.get('lazy', False),
+            '_internal_data': changed,
+            '_changed_fields': set(changed),
+        }
+        if 'atomic' in cache:
+            state['_atomic_bases'] = cache['atomic']
+        if 'partial' in cache:
+            state['_partial'] = tuple(cache['partial'])
+        doc = doc_cls.__new__(doc_cls)
+        doc.__setstate__(state)
+        return doc
+
     def __expand_dynamic_values(self, name, value):
         """expand any dynamic values to their correct types / values"""
         if not isinstance(value, (dict, list, tuple)):
@@ -261,91 +450,145 @@ class BaseDocument(object):
         if key:
             self._changed_fields.add(key)
 
+    def _mark_atomic(self, name, value):
+        """Remembers the value of the atomic field `name` before it changes
+        for the first time since the document was loaded or saved.
+        """
+        atomic_bases = self._atomic_bases
+        if atomic_bases is None:
+            atomic_bases = {}
+            _set(self, '_atomic_bases', atomic_bases)
+        atomic_bases.setdefault(name, value)
+
+    def _mark_dirty(self, name, key):
+        """Marks the embedded document stored under `key` of the field `name`
+        (or the field's value itself if `key` is None) as having changes.
+        """
+        dirty_fields = self._dirty_fields
+        if dirty_fields is None:
+            dirty_fields = {}
+            _set(self, '_dirty_fields', dirty_fields)
+        dirty_fields.setdefault(name, set()).add(key)
+
+    def _dirty_children(self):
+        """Yields the path prefix and the embedded document of every field
+        value marked dirty that isn't saved as a whole already.
+        """
+        dirty_fields = self._dirty_fields
+        if not dirty_fields:
+            return
+        changed_fields = self._changed_fields
+        internal_data = self._internal_data
+        for field_name, keys in dirty_fields.items():
+            if field_name in changed_fields:
+                continue
+            value = internal_data.get(field_name)
+            if value is None:
+                continue
+            for key in keys:
+                if key is None:
+                    child, prefix = value, field_name
+                else:
+                    try:
+                        child = value[key]
+                    except (IndexError, KeyError, TypeError):
+                        continue
+                    prefix = '%s.%s' % (field_name, key)
+                # Skip documents that were moved or assigned elsewhere since
+                if (getattr(child, '_owner_key', None) == (field_name, key) and
+                        child._instance is self):
+                    yield prefix, child
+
     def _get_changed_fields(self):
         """Returns a list of all fields that have explicitly been changed.
+
+        Embedded documents report their changes to the owning document, so
+        only the branches marked dirty are visited.
         """
         changed_fields = set(self._changed_fields)
-        EmbeddedDocumentField = _import_class("EmbeddedDocumentField")
-        for field_name, field in self._fields.items():
-            if field_name not in changed_fields:
-                if (isinstance(field, ComplexBaseField) and
-                   isinstance(field.field, EmbeddedDocumentField)):
-                    field_value = getattr(self, field_name, None)
-                    if field_value:
-                        for idx in (field_value if isinstance(field_value, dict)
-                                    else range(len(field_value))):
-                            changed_subfields = field_value[idx]._get_changed_fields()
-                            if changed_subfields:
-                                changed_fields |= set(['.'.join([field_name, str(idx), subfield_name])
-                                        for subfield_name in changed_subfields])
-                elif isinstance(field, EmbeddedDocumentField):
-                    field_value = getattr(self, field_name, None)
-                    if field_value:
-                        changed_subfields = field_value._get_changed_fields()
-                        if changed_subfields:
-                            changed_fields |= set(['.'.join([field_name, subfield_name])
-                                    for subfield_name in changed_subfields])
+        for prefix, child in self._dirty_children():
+            changed_fields.update('%s.%s' % (prefix, subfield_name)
+                                  for subfield_name in child._get_changed_fields())
         return changed_fields
 
     def _clear_changed_fields(self):
+        changed_fields = self._changed_fields
+        dirty_children = list(self._dirty_children())
         _set(self, '_changed_fields', set())
+        _set(self, '_dirty_fields', None)
+        _set(self, '_atomic_bases', None)
+        for prefix, child in dirty_children:
+            child._clear_changed_fields()
+
+        # Values saved as a whole may contain embedded documents that were
+        # added or moved, (re)attach them to their current position
         EmbeddedDocumentField = _import_class("EmbeddedDocumentField")
-        for field_name, field in self._fields.items():
-            if (isinstance(field, ComplexBaseField) and
-               isinstance(field.field, EmbeddedDocumentField)):
-                field_value = getattr(self, field_name, None)
-                if field_value:
-                    for idx in (field_value if isinstance(field_value, dict)
-                                else range(len(field_value))):
-                        field_value[idx]._clear_changed_fields()
-            elif isinstance(field, EmbeddedDocumentField):
-                field_value = getattr(self, field_name, None)
-                if field_value:
-                    field_value._clear_changed_fields()
+        internal_data = self._internal_data
+        for field_name in changed_fields:
+            value = internal_data.get(field_name)
+            if value is None:
+                continue
+            if isinstance(value, BaseList):
+                # Track operations from the saved state on
+                value._ops = []
+            field = self._fields.get(field_name)
+            if isinstance(field, EmbeddedDocumentField):
+                value._set_owner(self, (field_name, None))
+                value._clear_changed_fields()
+            elif (isinstance(field, ComplexBaseField) and
+                  isinstance(field.field, EmbeddedDocumentField)):
+                for key in (value if isinstance(value, dict)
+                            else range(len(value))):
+                    item = value[key]
+                    if item is not None:
+                        item._set_owner(self, (field_name, key))
+                        item._clear_changed_fields()
 
     def _delta(self, full=False):
-        sets = {}
         unsets = {}
 
+        if full or not self._created:
+            sets = self._serializer(self, unsets)
+            return sets, unsets
+
+        return self._partial_delta(self._get_changed_fields())
+
+    def _partial_delta(self, changed_fields):
+        """Returns the sets and unsets for the given changed field paths.
+        """
+        sets = {}
+        unsets = {}
 
         def get_db_value(field, value):
             if value is None:
                 value = field.default() if callable(field.default) else field.default
             return field.to_mongo(value)
 
+        # List of (db_field_name, db_value) tuples.
+        db_data = []
 
-        if full or not self._created:
-            fields = iter(self._fields.items())
-            db_data = ((self._db_field_map.get(field_name, field_name),
-                    get_db_value(field, getattr(self, field_name)))
-                    for field_name, field in fields)
+        for field_name in changed_fields:
+            parts = field_name.split('.')
 
-        else:
-            # List of (db_field_name, db_value) tuples.
-            db_data = []
-
-            for field_name in self._get_changed_fields():
-                parts = field_name.split('.')
-
-                db_field_parts = []
-
-                value = self
-                for part in parts:
-                    if isinstance(value, list) and part.isdigit():
-                        db_field_parts.append(part)
-                        field = field.field
-                        value = value[int(part)]
-                    elif isinstance(value, dict):
-                        db_field_parts.append(part)
-                        field = field.field
-                        value = value[part]
-                    else: # It's a document
-                        obj = value
-                        field = obj._fields[part]
-                        db_field_parts.append(obj._db_field_map.get(part, part))
-                        value = getattr(obj, part)
-
-                db_data.append(('.'.join(db_field_parts), get_db_value(field, value)))
+            db_field_parts = []
+
+            value = self
+            for part in parts:
+                if isinstance(value, list) and part.isdigit():
+                    db_field_parts.append(part)
+                    field = field.field
+                    value = value[int(part)]
+                elif isinstance(value, dict):
+                    db_field_parts.append(part)
+                    field = field.field
+                    value = value[part]
+                else: # It's a document
+                    obj = value
+                    field = obj._fields[part]
+                    db_field_parts.append(obj._db_field_map.get(part, part))
+                    value = getattr(obj, part)
+
+            db_data.append(('.'.join(db_field_parts), get_db_value(field, value)))
 
         for db_field_name, db_value in db_data:
             if db_value == None:
@@ -355,6 +598,133 @@ class BaseDocument(object):
 
         return sets, unsets
 
+    def _list_operations(self):
+        """Returns the update operators equivalent to the appends and
+        removals recorded by changed list fields, keyed by field name.
+        """
+        ListField = _import_class('ListField')
+        SortedListField = _import_class('SortedListField')
+        dirty_fields = self._dirty_fields or ()
+        internal_data = self._internal_data
+        operations = {}
+        for name in self._changed_fields:
+            value = internal_data.get(name)
+            # Changes within the items require saving the list as a whole
+            if not isinstance(value, BaseList) or name in dirty_fields:
+                continue
+            field = self._fields.get(name)
+            if (not isinstance(field, ListField) or
+                    isinstance(field, SortedListField)):
+                continue
+            operation = value._operation()
+            if operation is None:
+                continue
+            operator, arg = operation
+            if operator == '$push':
+                arg = {'$each': field.to_mongo(arg)}
+            elif operator == '$pull':
+                arg = {'$in': field.to_mongo(arg)}
+            operations[name] = (operator, arg)
+        return operations
+
+    def _atomic_operations(self):
+        """Returns the $inc operations of changed atomic fields keyed by
+        field name, or None for fields changed back to their loaded value.
+        Fields without a numeric value before or after the change are left
+        to be set.
+        """
+        operations = {}
+        atomic_bases = self._atomic_bases
+        if not atomic_bases:
+            return operations
+        changed_fields = self._changed_fields
+        internal_data = self._internal_data
+        for name, base in atomic_bases.items():
+            value = internal_data.get(name)
+            if (name not in changed_fields or
+                    not isinstance(base, (int, float)) or
+                    not isinstance(value, (int, float))):
+                continue
+            increment = value - base
+            operations[name] = ('$inc', increment) if increment else None
+        return operations
+
+    def _delta_update(self, full=False):
+        """Returns the update document that saves the changes of the
+        document. Appends to and removals from list fields are saved with
+        $push, $pull and $pop where possible instead of setting the list,
+        changes of atomic fields with $inc.
+        """
+        operations = {}
+        if not full and self._created:
+            operations.update(self._list_operations())
+            operations.update(self._atomic_operations())
+        if operations:
+            sets, unsets = self._partial_delta(
+                [name for name in self._get_changed_fields()
+                 if name not in operations])
+        else:
+            sets, unsets = self._delta(full)
+
+        update = {}
+        if sets:
+            update['$set'] = sets
+        if unsets:
+            update['$unset'] = unsets
+        for name, operation in operations.items():
+            if operation is not None:
+                operator, arg = operation
+                db_field = self._db_field_map.get(name, name)
+                update.setdefault(operator, {})[db_field] = arg
+        return update
+
+    @classmethod
+    def _compile_serializer(cls):
+        """Build the function used by :meth:`to_mongo` and full
+        :meth:`_delta` calls to convert a document to SON in a single pass
+        over its fields, in `_fields_ordered` order. Fields whose value
+        converts to None are left out of the SON and recorded in the
+        `unsets` dict if one is given. Called by the document metaclass.
+        """
+        names = cls._fields_ordered
+        if 'id' in cls._fields and 'id' not in names:
+            names = ('id',) + names
+
+        plan = []
+        for name in names:
+            field = cls._fields[name]
+            # Fields overriding __get__ are read through the descriptor
+            if type(field).__get__ is BaseField.__get__:
+                load = field._load
+            else:
+                load = None
+            plan.append((name, cls._db_field_map.get(name, name),
+                         field.to_mongo, field.default,
+                         callable(field.default), load))
+
+        def serialize(doc, unsets=None):
+            pairs = []
+            append = pairs.append
+            for name, db_field, to_mongo, default, call_default, load in plan:
+                if load is None:
+                    value = getattr(doc, name)
+                else:
+                    try:
+                        value = doc._internal_data[name]
+                    except KeyError:
+                        value = load(doc)
+                if value is None:
+                    value = default() if call_default else default
+                value = to_mongo(value)
+                if value is None:
+                    if unsets is not None:
+                        unsets[db_field] = 1
+                else:
+                    append((db_field, value))
+            return SON(pairs)
+
+        cls._serializer = staticmethod(serialize)
+
     @classmethod
     def _get_collection_name(cls):
         """Returns the collection name for this class.
@@ -362,16 +732,57 @@ class BaseDocument(object):
         return cls._meta.get('collection', None)
 
     @classmethod
-    def _from_son(cls, son, _auto_dereference=False):
+    def _from_son(cls, son, _auto_dereference=False, _identity=True):
+        # Within an identity_map, return the instance already loaded or
+        # referenced for this primary key, fetching lazy ones from `son`
+        identity_map = _identity_map.get() if _identity else None
+        if identity_map is not None:
+            collection_name = cls._get_collection_name()
+            pk = son.get('_id') if collection_name else None
+            if pk is not None:
+                key = _identity_key(cls, pk)
+                doc = identity_map.get(key)
+                if doc is None:
+                    doc = cls._from_son(son, _identity=False)
+                elif isinstance(doc, DocumentProxy):
+                    proxy = doc
+                    doc = cls._from_son(son, _identity=False)
+                    _set(proxy, '_DocumentProxy__document', doc)
+                elif doc._lazy:
+                    doc._hydrate(son)
+                identity_map[key] = doc
+                return doc
+
         # get the class name from the document, falling back to the given
-        # class if unavailable
+        # class if unavailable. Lazily decoded documents index the elements
+        # scanned for it, so later field lookups don't scan them again.
         class_name = son.get('_cls', cls._class_name)
 
         # Return correct subclass for document type
         if class_name != cls._class_name:
             cls = get_document(class_name)
 
-        return cls(_son=son)
+        if cls.__init__ is not BaseDocument.__init__:
+            # Respect custom constructors
+            return cls(_son=son)
+
+        # Skip the keyword handling of __init__ when loading from the database
+        doc = cls.__new__(cls)
+        _set(doc, '_db_data', son)
+        _set(doc, '_lazy', False)
+        _set(doc, '_internal_data', {})
+        if not cls._slotted:
+            _set(doc, '_changed_fields', set())
+        return doc
+
+    def _hydrate(self, son):
+        """Replaces the data of the document with `son` fetched from the
+        database, discarding decoded values and changes.
+        """
+        _set(self, '_db_data', son)
+        _set(self, '_internal_data', {})
+        _set(self, '_lazy', False)
+        self._clear_changed_fields()
 
     @classmethod
     def _build_index_specs(cls, meta_indexes):
@@ -537,13 +948,38 @@ class BaseDocument(object):
                                    [(field_name, field._geo_index)]})
         return geo_indices
 
+    @classmethod
+    def _field_path_cache(cls):
+        """Returns the :class:`_FieldPathCache` of the class, replaced when the
+        fields of the class or the document registry change.
+        """
+        cache = cls.__dict__.get('_field_paths')
+        if cache is None or cache.version != common._fields_version:
+            cache = _FieldPathCache()
+            setattr(cls, '_field_paths', cache)
+        return cache
+
     @classmethod
     def _lookup_field(cls, parts):
         """Lookup a field based on its attribute and return a list containing
-        the field's parents and the field.
+        the field's parents and the field. Resolved paths are cached per
+        class.
         """
         if not isinstance(parts, (list, tuple)):
             parts = [parts]
+        paths = cls._field_path_cache().paths
+        key = tuple(parts)
+        fields = paths.get(key)
+        if fields is None:
+            fields = tuple(cls._resolve_field_path(parts))
+            if len(paths) >= FIELD_PATH_CACHE_SIZE:
+                paths.clear()
+            paths[key] = fields
+        return list(fields)
+
+    @classmethod
+    def _resolve_field_path(cls, parts):
+        """Resolves a field path for :meth:`_lookup_field`."""
         fields = []
         field = None
 
@@ -592,9 +1028,17 @@ class BaseDocument(object):
     def _translate_field_name(cls, field, sep='.'):
         """Translate a field attribute name to a database field name.
         """
-        parts = field.split(sep)
-        parts = [f.db_field for f in cls._lookup_field(parts)]
-        return '.'.join(parts)
+        names = cls._field_path_cache().names
+        key = (field, sep)
+        name = names.get(key)
+        if name is None:
+            parts = field.split(sep)
+            parts = [f.db_field for f in cls._lookup_field(parts)]
+            name = '.'.join(parts)
+            if len(names) >= FIELD_PATH_CACHE_SIZE:
+                names.clear()
+            names[key] = name
+        return name
 
     def __set_field_display(self):
         """Dynamically set the display value for a field with choices"""
@@ -25,6 +25,9 @@ class BaseField(object):
     _geo_index = False
     _auto_gen = False  # Call `generate` to generate a value
     _auto_dereference = True
+    # Save changes as an increment of the previous value, see
+    # BaseDocument._atomic_operations
+    atomic = False
 
     # These track each time a Field instance is created. Used to retain order.
     # The auto_creation_counter is used for fields that MongoEngine implicitly
@@ -87,28 +90,57 @@ class BaseField(object):
         if instance is None:
             # Document class being used rather than a document object
             return self
-        else:
-            name = self.name
-            data = instance._internal_data
-            if not name in data:
-                if instance._lazy and name != instance._meta['id_field']:
-                    # We need to fetch the doc from the database.
-                    instance.reload()
-                    # Reloading changes our internal data pointer.
-                    data = instance._internal_data
-                db_field = instance._db_field_map.get(name, name)
-                try:
-                    db_value = instance._db_data[db_field]
-                except (TypeError, KeyError):
-                    value = self.default() if callable(self.default) else self.default
-                else:
-                    value = self.to_python(db_value)
+        data = instance._internal_data
+        name = self.name
+        if name in data:
+            return data[name]
+        # Decode on first access without raising and catching a KeyError
+        return self._load(instance)
 
-                if hasattr(self, 'value_for_instance'):
-                    value = self.value_for_instance(value, instance)
-                data[name] = value
+    def _load(self, instance):
+        """Decode the field's value for an instance on first access. Replaced
+        by the accessor built in :meth:`_compile_accessor`.
+        """
+        return self._compile_accessor()(instance)
 
-            return data[name]
+    def _compile_accessor(self):
+        """Build the loader :meth:`__get__` falls back to when the value isn't
+        decoded yet. The db key, default, converter and `value_for_instance`
+        hook are resolved once here instead of on every first access.
+        Called by the document metaclass once the field's name is known.
+        """
+        name = self.name
+        db_field = self.db_field or name
+        default = self.default
+        call_default = callable(default)
+        to_python = self.to_python
+        value_for_instance = getattr(self, 'value_for_instance', None)
+        # The primary key is known for lazy documents, so reading it must not
+        # trigger a fetch.
+        check_lazy = db_field != '_id'
+
+        def load(instance):
+            if check_lazy and instance._lazy:
+                # We need to fetch the doc from the database.
+                instance.reload()
+            try:
+                db_value = instance._db_data[db_field]
+            except (TypeError, KeyError):
+                if getattr(instance, '_partial', None):
+                    # Fetch the fields a partially loaded document lacks
+                    instance._complete()
+                    return load(instance)
+                value = default() if call_default else default
+            else:
+                value = to_python(db_value)
+            if value_for_instance is not None:
+                value = value_for_instance(value, instance)
+            # Reloading changes our internal data pointer.
+            instance._internal_data[name] = value
+            return value
+
+        self._load = load
+        return load
 
     def __set__(self, instance, value):
         """Descriptor for assigning a value to a field in a document.
@@ -129,6 +161,8 @@ class BaseField(object):
             has_changed = True
 
         if has_changed:
+            if self.atomic:
+                instance._mark_atomic(name, self.__get__(instance, None))
             instance._mark_as_changed(name)
 
         instance._internal_data[name] = value
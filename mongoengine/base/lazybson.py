@@ -0,0 +1,148 @@
+import struct
+from collections.abc import Mapping
+
+import bson
+from bson.codec_options import DEFAULT_CODEC_OPTIONS
+from bson.errors import InvalidBSON
+from bson.raw_bson import RawBSONDocument
+
+__all__ = ('LazyBSONDocument', 'raw_bson_collection')
+
+
+_unpack_int = struct.Struct('<i').unpack_from
+_pack_int = struct.Struct('<i').pack
+
+# Value sizes of the BSON element types, indexed by type byte. Fixed-width
+# types map to their size, _SIZED to types whose value starts with its total
+# size, _STRING to length-prefixed strings and None to the remaining types.
+_SIZED = -1
+_STRING = -2
+_SIZES = [None] * 256
+for _type, _size in ((0x01, 8),         # double
+                     (0x02, _STRING),   # string
+                     (0x03, _SIZED),    # embedded document
+                     (0x04, _SIZED),    # array
+                     (0x06, 0),         # undefined
+                     (0x07, 12),        # ObjectId
+                     (0x08, 1),         # boolean
+                     (0x09, 8),         # UTC datetime
+                     (0x0A, 0),         # null
+                     (0x0D, _STRING),   # code
+                     (0x0E, _STRING),   # symbol
+                     (0x0F, _SIZED),    # code with scope
+                     (0x10, 4),         # int32
+                     (0x11, 8),         # timestamp
+                     (0x12, 8),         # int64
+                     (0x13, 16),        # decimal128
+                     (0x7F, 0),         # max key
+                     (0xFF, 0)):        # min key
+    _SIZES[_type] = _size
+del _type, _size
+
+
+def raw_bson_collection(collection):
+    """Return `collection` configured to return
+    :class:`~bson.raw_bson.RawBSONDocument` results.
+    """
+    codec_options = collection.codec_options.with_options(
+        document_class=RawBSONDocument)
+    return collection.with_options(codec_options=codec_options)
+
+
+class LazyBSONDocument(Mapping):
+    """A read-only mapping over the raw bytes of a BSON document that only
+    decodes the elements which are looked up.
+
+    Element offsets are indexed incrementally: a lookup scans forward from
+    the last indexed element until the key is found, skipping over values
+    without decoding them. Each value is decoded on every lookup, documents
+    cache decoded field values in their `_internal_data`.
+    """
+
+    __slots__ = ('raw', 'codec_options', '_offsets', '_position')
+
+    def __init__(self, raw, codec_options=DEFAULT_CODEC_OPTIONS):
+        self.raw = raw
+        self.codec_options = codec_options
+        self._offsets = {}
+        self._position = 4
+
+    def __reduce__(self):
+        return (self.__class__, (self.raw, self.codec_options))
+
+    def _scan(self, key=None):
+        """Index the start and end offsets of elements until `key` (as UTF-8
+        bytes) is found or the document ends.
+        """
+        raw = self.raw
+        find = raw.find
+        offsets = self._offsets
+        position = self._position
+        end = len(raw) - 1
+        while position < end:
+            element_type = raw[position]
+            name_end = find(b'\x00', position + 1)
+            name = raw[position + 1:name_end]
+            start = position
+            position = name_end + 1
+            size = _SIZES[element_type]
+            if size is None:
+                if element_type == 0x05:  # binary
+                    size = 5 + _unpack_int(raw, position)[0]
+                elif element_type == 0x0B:  # regex
+                    size = find(b'\x00', find(b'\x00', position) + 1) + 1 - position
+                elif element_type == 0x0C:  # DBPointer
+                    size = 16 + _unpack_int(raw, position)[0]
+                else:
+                    raise InvalidBSON('Detected unknown BSON type %r for '
+                                      'fieldname %r' % (element_type, name))
+            elif size == _SIZED:
+                size = _unpack_int(raw, position)[0]
+            elif size == _STRING:
+                size = 4 + _unpack_int(raw, position)[0]
+            position += size
+            offsets[name] = (start, position)
+            if name == key:
+                break
+        self._position = position
+
+    def _offset(self, key):
+        key = key.encode('utf-8')
+        try:
+            return self._offsets[key]
+        except KeyError:
+            if self._position < len(self.raw) - 1:
+                self._scan(key)
+            return self._offsets[key]
+
+    def __getitem__(self, key):
+        try:
+            start, end = self._offset(key)
+        except KeyError:
+            raise KeyError(key)
+        # Decode the element as a document of its own
+        element = self.raw[start:end]
+        document = _pack_int(len(element) + 5) + element + b'\x00'
+        return bson.decode(document, self.codec_options)[key]
+
+    def __contains__(self, key):
+        try:
+            self._offset(key)
+        except KeyError:
+            return False
+        return True
+
+    def __iter__(self):
+        self._scan()
+        return (name.decode('utf-8') for name in self._offsets)
+
+    def __len__(self):
+        self._scan()
+        return len(self._offsets)
+
+    def __repr__(self):
+        return '%s(%r)' % (self.__class__.__name__, self.raw)
+
+    def to_dict(self):
+        """Decode the whole document."""
+        return bson.decode(self.raw, self.codec_options)
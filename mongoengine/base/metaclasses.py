@@ -9,7 +9,8 @@ from mongoengine.queryset import (DO_NOTHING, DoesNotExist,
                                   MultipleObjectsReturned,
                                   QuerySet, QuerySetManager)
 
-from mongoengine.base.common import _document_registry, ALLOW_INHERITANCE
+from mongoengine.base.common import (_document_registry, _register_document,
+                                     ALLOW_INHERITANCE, FieldsDict)
 from mongoengine.base.fields import BaseField, ComplexBaseField, ObjectIdField
 
 __all__ = ('DocumentMetaclass', 'TopLevelDocumentMetaclass')
@@ -88,7 +89,7 @@ class DocumentMetaclass(type):
             raise InvalidDocumentError(msg)
 
         # Set _fields and db_field maps
-        attrs['_fields'] = doc_fields
+        attrs['_fields'] = FieldsDict(doc_fields)
         attrs['_db_field_map'] = dict([(k, getattr(v, 'db_field', k))
                                       for k, v in doc_fields.items()])
         attrs['_fields_ordered'] = tuple(i[1] for i in sorted(
@@ -131,9 +132,32 @@ class DocumentMetaclass(type):
         attrs['_subclasses'] = (_cls, )
         attrs['_types'] = attrs['_subclasses']  # TODO depreciate _types
 
+        # Opt-in slotted instance layout
+        slotted_base = any(getattr(base, '_slotted', False)
+                           for base in flattened_bases)
+        new_slots = ()
+        if attrs['_meta'].get('slots') and '__slots__' not in attrs:
+            attrs['_slotted'] = True
+            if slotted_base:
+                attrs['__slots__'] = ()
+            else:
+                new_slots = next(base._instance_slots
+                                 for base in flattened_bases
+                                 if hasattr(base, '_instance_slots'))
+                # Documents are referenced weakly by their lists and dicts
+                if not any(base.__weakrefoffset__ for base in bases):
+                    new_slots += ('__weakref__',)
+                attrs['__slots__'] = new_slots
+
         # Create the new_class
         new_class = super_new(cls, name, bases, attrs)
 
+        # Slots such as _changed_fields are only created when first used
+        for slot, factory in new_class._slot_defaults.items():
+            if slot in new_slots:
+                setattr(new_class, slot,
+                        SlotDefault(new_class.__dict__[slot], factory))
+
         # Set _subclasses
         for base in document_bases:
             if _cls not in base._subclasses:
@@ -146,7 +170,13 @@ class DocumentMetaclass(type):
             new_class._collection = None
 
         # Add class to the _document_registry
-        _document_registry[new_class._class_name] = new_class
+        _register_document(new_class)
+
+        # Build the specialised first-access loaders now that every field
+        # knows its name and db_field
+        for field in new_class._fields.values():
+            field._compile_accessor()
+        new_class._compile_serializer()
 
         # In Python 2, User-defined methods objects have special read-only
         # attributes 'im_func' and 'im_self' which contain the function obj
@@ -364,6 +394,8 @@ class TopLevelDocumentMetaclass(DocumentMetaclass):
             new_class.id = new_class._fields['id']
             new_class._meta['id_field'] = 'id'
             new_class._db_field_map['id'] = id_field.db_field
+            id_field._compile_accessor()
+            new_class._compile_serializer()
 
 
         # Merge in exceptions with parent hierarchy
@@ -380,6 +412,34 @@ class TopLevelDocumentMetaclass(DocumentMetaclass):
         return new_class
 
 
+class SlotDefault(object):
+    """Wraps a slot descriptor so that reading an unset slot creates its
+    value with `factory` instead of raising :class:`AttributeError`.
+    """
+
+    __slots__ = ('member', 'factory')
+
+    def __init__(self, member, factory):
+        self.member = member
+        self.factory = factory
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        try:
+            return self.member.__get__(instance, owner)
+        except AttributeError:
+            value = self.factory()
+            self.member.__set__(instance, value)
+            return value
+
+    def __set__(self, instance, value):
+        self.member.__set__(instance, value)
+
+    def __delete__(self, instance):
+        self.member.__delete__(instance)
+
+
 class MetaDict(dict):
     """Custom dictionary for meta classes.
     Handles the merging of set indexes
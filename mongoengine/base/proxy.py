@@ -1,3 +1,4 @@
+from mongoengine.context_managers import _identity_key, _identity_map
 from mongoengine.queryset import OperationError, DoesNotExist
 from bson.dbref import DBRef
 
@@ -124,12 +125,16 @@ class LocalProxy(object):
 
 
 class DocumentProxy(LocalProxy):
-    __slots__ = ('__document_type', '__document', '__pk')
+    __slots__ = ('__document_type', '__document', '__pk', '__prefetch_source',
+                 '__partial')
 
-    def __init__(self, document_type, pk):
+    def __init__(self, document_type, pk, partial=None):
         object.__setattr__(self, '_DocumentProxy__document_type', document_type)
         object.__setattr__(self, '_DocumentProxy__document', None)
         object.__setattr__(self, '_DocumentProxy__pk', pk)
+        object.__setattr__(self, '_DocumentProxy__prefetch_source', None)
+        # The db fields to fetch, see ReferenceField's load_only
+        object.__setattr__(self, '_DocumentProxy__partial', partial)
         object.__setattr__(self, document_type._meta['id_field'], self.pk)
 
     @property
@@ -182,12 +187,30 @@ class DocumentProxy(LocalProxy):
     pk = pk()
 
     def _get_current_object(self):
+        if self.__document == None and self.__prefetch_source is not None:
+            batch, field_name = self.__prefetch_source
+            object.__setattr__(self, '_DocumentProxy__prefetch_source', None)
+            batch.prefetch(field_name)
         if self.__document == None:
-            collection = self.__document_type._get_collection()
-            son = collection.find_one({'_id': self.__pk})
+            identity_map = _identity_map.get()
+            if identity_map is not None:
+                key = _identity_key(self.__document_type, self.__pk)
+                document = identity_map.get(key)
+                if (document is not None and
+                        not isinstance(document, DocumentProxy) and
+                        not document._lazy):
+                    object.__setattr__(self, '_DocumentProxy__document', document)
+                    return document
+            document_type = self.__document_type
+            partial = self.__partial
+            collection = document_type._get_collection()
+            son = collection.find_one({'_id': self.__pk},
+                                      document_type._partial_projection(partial))
             if son is None:
                 raise DoesNotExist(f"Document {self.pk} has been deleted.")
-            document = self.__document_type._from_son(son)
+            document = document_type._from_son(son)
+            if partial and document._db_data is son:
+                object.__setattr__(document, '_partial', partial)
             object.__setattr__(self, '_DocumentProxy__document', document)
         return self.__document
 
@@ -23,8 +23,9 @@ def _import_class(cls_name):
     field_classes = ('DictField', 'DynamicField', 'EmbeddedDocumentField',
                      'FileField', 'GenericReferenceField',
                      'GenericEmbeddedDocumentField', 'GeoPointField',
-                     'PointField', 'LineStringField', 'PolygonField',
-                     'ReferenceField', 'StringField', 'ComplexBaseField')
+                     'ListField', 'PointField', 'LineStringField',
+                     'PolygonField', 'ReferenceField', 'SortedListField',
+                     'StringField', 'ComplexBaseField')
     queryset_classes = ('OperationError',)
     deref_classes = ('DeReference',)
 
@@ -1,13 +1,33 @@
 from contextlib import contextmanager
+from contextvars import ContextVar
 
+import pymongo
+from pymongo import DeleteOne, InsertOne, UpdateOne
 from pymongo.write_concern import WriteConcern
 
+from mongoengine import signals
 from mongoengine.common import _import_class
 from mongoengine.connection import DEFAULT_CONNECTION_NAME, get_db
+from mongoengine.errors import OperationError, WriteBatchError
 
 
 __all__ = ("switch_db", "switch_collection", "no_dereference",
-           "no_sub_classes", "query_counter")
+           "no_sub_classes", "query_counter", "identity_map", "write_batch")
+
+
+# The documents of the innermost active identity_map, keyed by the full name
+# of their collection (database and collection name) and primary key, or None
+_identity_map = ContextVar('mongoengine_identity_map', default=None)
+
+# The innermost active write_batch, or None
+_write_batch = ContextVar('mongoengine_write_batch', default=None)
+
+
+def _identity_key(document, pk):
+    """ Return the identity map key of the document with the given primary
+    key, for a document class or an instance switched to another database
+    or collection. """
+    return (document._get_collection().full_name, pk)
 
 
 class switch_db(object):
@@ -165,6 +185,224 @@ class no_sub_classes(object):
         return self.cls
 
 
+class identity_map(object):
+    """ identity_map context manager.
+
+    Within the block, documents loaded from the same collection of the same
+    database with the same primary key are the same instance, including lazy references, so each
+    document is fetched at most once::
+
+        with identity_map():
+            for comment in Comment.objects:
+                comment.author.name  # Fetches each author once
+
+    The identity map is bound to the current thread or asyncio task.
+    Documents loaded with a projection (`only()` / `exclude()`) bypass it.
+    """
+
+    def __init__(self):
+        """ Construct the identity_map context manager. """
+        self.documents = {}
+        self._token = None
+
+    def __enter__(self):
+        """ Make the identity map the current one """
+        self._token = _identity_map.set(self.documents)
+        return self
+
+    def __exit__(self, t, value, traceback):
+        """ Restore the previous identity map """
+        _identity_map.reset(self._token)
+        self._token = None
+
+    def __len__(self):
+        return len(self.documents)
+
+    def get(self, document_cls, pk):
+        """ Return the document of the given class' collection with the
+        given primary key, or None if it isn't in the identity map. """
+        return self.documents.get(_identity_key(document_cls, pk))
+
+
+class write_batch(object):
+    """ write_batch context manager.
+
+    Within the block, :meth:`~mongoengine.Document.save`,
+    :meth:`~mongoengine.Document.update` and
+    :meth:`~mongoengine.Document.delete` queue their writes, which are sent
+    on exit with one ``bulk_write`` per collection::
+
+        with write_batch():
+            for post in posts:
+                post.views += 1
+                post.save()  # Written when the block exits
+
+    Saving a document several times queues a single write of the changes
+    the document has when the block exits. ``post_save`` and
+    ``post_delete`` are sent once the writes are done. Documents with
+    delete rules are deleted immediately and saves don't cascade. If the
+    block raises an exception, the queued writes are discarded.
+
+    Failed writes raise :class:`~mongoengine.errors.WriteBatchError`,
+    listing the documents whose writes failed. The other documents are
+    saved, except for the writes after a failure if `ordered` is set, which
+    are listed as not attempted.
+
+    The batch is bound to the current thread or asyncio task.
+    """
+
+    def __init__(self, ordered=True):
+        """ Construct the write_batch context manager.
+
+        :param ordered: whether the writes are applied in order, stopping at
+            the first failure
+        """
+        self.ordered = ordered
+        self.writes = []
+        self._saves = {}
+        self._token = None
+
+    def __enter__(self):
+        """ Make the batch the current one """
+        self._token = _write_batch.set(self)
+        return self
+
+    def __exit__(self, t, value, traceback):
+        """ Restore the previous batch and write the queued operations """
+        _write_batch.reset(self._token)
+        self._token = None
+        if t is None:
+            self.flush()
+        else:
+            self.writes = []
+            self._saves = {}
+
+    def __len__(self):
+        return len(self.writes)
+
+    def save(self, document, full=False):
+        """ Queue saving the document, once per batch. """
+        write = self._saves.get(id(document))
+        if write is None:
+            write = ['save', document, full]
+            self._saves[id(document)] = write
+            self.writes.append(write)
+        elif full:
+            write[2] = True
+
+    def update(self, document, query, update, upsert=False):
+        """ Queue an update of the document. """
+        self.writes.append(['update', document, (query, update, upsert)])
+
+    def delete(self, document, query):
+        """ Queue deleting the document. """
+        self.writes.append(['delete', document, query])
+
+    def flush(self):
+        """ Write the queued operations with one ``bulk_write`` per
+        collection. """
+        writes, self.writes, self._saves = self.writes, [], {}
+
+        # The requests of each collection with their document and the SON
+        # of inserted documents
+        collections = {}
+        done = []
+        for kind, document, arg in writes:
+            son = None
+            if kind == 'save':
+                if document._created:
+                    update = document._save_update(arg)
+                    if not update:
+                        done.append((kind, document, None))
+                        continue
+                    request = UpdateOne(document._db_object_key, update)
+                else:
+                    son = document.to_mongo()
+                    request = InsertOne(son)
+            elif kind == 'update':
+                query, update, upsert = arg
+                request = UpdateOne(query, update, upsert=upsert)
+            else:
+                request = DeleteOne(arg)
+            collection = document._get_collection()
+            collections.setdefault(collection.full_name, (collection, []))[
+                1].append((request, kind, document, son))
+
+        errors = []
+        try:
+            failed = False
+            for collection, requests in collections.values():
+                if failed and self.ordered:
+                    # Writes after a failure aren't attempted
+                    errors.extend(_not_attempted(requests, 0))
+                    continue
+                failures = self._bulk_write(collection, requests, errors)
+                for index, (request, kind, document, son) in enumerate(
+                        requests):
+                    if index not in failures:
+                        done.append((kind, document, son))
+                failed = failed or bool(failures)
+        finally:
+            # Documents whose writes are done are updated even if another
+            # collection's bulk write failed
+            for kind, document, son in done:
+                _written(kind, document, son)
+
+        if errors:
+            message = 'Could not write %d document(s) of the batch (%s)' % (
+                len(errors), errors[0][1].get('errmsg'))
+            raise WriteBatchError(message, errors)
+
+    def _bulk_write(self, collection, requests, errors):
+        """ Send the requests of a collection, adding the documents whose
+        writes failed or weren't attempted to `errors`. Returns the indexes
+        of the requests that weren't written. """
+        try:
+            collection.bulk_write([request for request, _, _, _ in requests],
+                                  ordered=self.ordered)
+        except pymongo.errors.BulkWriteError as err:
+            write_errors = err.details['writeErrors']
+            for write_error in write_errors:
+                errors.append((requests[write_error['index']][2],
+                               write_error))
+            indexes = [write_error['index'] for write_error in write_errors]
+            if self.ordered and indexes:
+                # Writes after the first failure weren't attempted
+                errors.extend(_not_attempted(requests, min(indexes) + 1))
+                return set(range(min(indexes), len(requests)))
+            return set(indexes)
+        except pymongo.errors.OperationFailure as err:
+            raise OperationError('Could not write batch (%s)' % err)
+        return set()
+
+
+def _not_attempted(requests, start):
+    """ Returns the errors of the requests of a write_batch from `start` on,
+    which weren't attempted after an earlier write failed. """
+    return [(requests[index][2],
+             {'index': index, 'errmsg': 'not attempted after an earlier '
+                                        'write of the batch failed'})
+            for index in range(start, len(requests))]
+
+
+def _written(kind, document, son):
+    """ Update a document whose queued write of a write_batch is done. """
+    if kind == 'save':
+        if son is not None:
+            # bulk_write sets the generated id on the inserted SON
+            document._mark_inserted(son, son['_id'])
+        document._clear_changed_fields()
+        signals.post_save.send(document.__class__, document=document,
+                               created=son is not None)
+    elif kind == 'delete':
+        identity_map = _identity_map.get()
+        if identity_map is not None:
+            key = _identity_key(document, document.pk)
+            if identity_map.get(key) is document:
+                del identity_map[key]
+        signals.post_delete.send(document.__class__, document=document)
+
+
 class query_counter(object):
     """ Query_counter context manager to get the number of queries. """
 
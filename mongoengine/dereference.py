@@ -1,26 +1,111 @@
-from bson import DBRef, SON
+from bson import DBRef
 
-from .base import (BaseDict, BaseList, TopLevelDocumentMetaclass, get_document)
-from .fields import (ReferenceField, ListField, DictField, MapField)
-from .connection import get_db
+from .base import BaseDocument, get_document
+from .base.proxy import DocumentProxy
+from .fields import (ReferenceField, GenericReferenceField, ListField,
+                     DictField, SafeReferenceField, SafeReferenceListField)
+from .connection import DEFAULT_CONNECTION_NAME
+from .errors import InvalidQueryError
 from .queryset import QuerySet
 from .document import Document
 
+_set = object.__setattr__
+
+
+def _reference_fields(document_cls):
+    """Returns the fields of `document_cls` that may contain references, as
+    ``(name, db_field, field)`` tuples.
+    """
+    fields = document_cls.__dict__.get('_dereference_fields')
+    if fields is None:
+        fields = tuple((name, field.db_field or name, field)
+                       for name, field in document_cls._fields.items()
+                       if _holds_references(field))
+        # Cache per class, subclasses have their own fields
+        setattr(document_cls, '_dereference_fields', fields)
+    return fields
+
+
+def _holds_safe_references(field):
+    while (isinstance(field, (ListField, DictField)) and
+           not isinstance(field, SafeReferenceListField)):
+        field = field.field
+    return isinstance(field, (SafeReferenceField, SafeReferenceListField))
+
+
+def _holds_references(field):
+    while isinstance(field, (ListField, DictField)):
+        field = field.field
+    return isinstance(field, (ReferenceField, GenericReferenceField))
+
+
+def _lookup_reference(field):
+    """Returns the reference field of `field` or of a list `field`."""
+    if isinstance(field, ListField) and not isinstance(field.field, ListField):
+        return field.field
+    return field
+
+
+def _db_alias(document_cls):
+    return document_cls._meta.get('db_alias', DEFAULT_CONNECTION_NAME)
+
+
+def _can_lookup(field, document_cls):
+    # $lookup can't match the id of DBRef values, nor join the collection of
+    # another database
+    return (isinstance(field, ReferenceField) and not field.dbref and
+            _db_alias(field.document_type) == _db_alias(document_cls))
+
+
+def _partial_fields(name, field, load_only=None):
+    """Returns the db fields to fetch the documents referenced by the field
+    `name` with, taking the `load_only` overrides of a queryset into account,
+    or None to fetch whole documents.
+    """
+    while isinstance(field, (ListField, DictField)):
+        field = field.field
+    if not isinstance(field, ReferenceField):
+        return None
+    if load_only and name in load_only:
+        return field.partial_fields(load_only[name] or ())
+    return field.partial_fields()
+
+
+def _raw_reference(field, value):
+    """Returns the ``(document_type, pk)`` referenced by the raw database
+    `value` of a reference `field`.
+    """
+    if isinstance(field, GenericReferenceField):
+        return get_document(value['_cls']), value['_ref'].id
+    if isinstance(value, DBRef):
+        return field.document_type, value.id
+    if isinstance(value, dict):
+        # Stored with store_cls
+        return field.document_type, value['_id']
+    return field.document_type, value
+
 
 class DeReference(object):
+    """Resolves the references of documents with one query per referenced
+    collection and depth level.
+
+    References are read from the raw data of the documents, so fields which
+    don't hold references are never decoded. Fields that were already
+    decoded have their lazy references fetched in place.
+    """
 
-    def __call__(self, items, max_depth=1, instance=None, name=None):
+    def __call__(self, items, max_depth=1, instance=None, name=None,
+                 load_only=None):
         """
         Cheaply dereferences the items to a set depth.
-        Also handles the convertion of complex data types.
 
-        :param items: The iterable (dict, list, queryset) to be dereferenced.
+        :param items: The iterable (list, queryset) of documents to be
+            dereferenced, or of raw values of the field `name` of `instance`.
         :param max_depth: The maximum depth to recurse to
-        :param instance: The owning instance used for tracking changes by
-            :class:`~mongoengine.base.ComplexBaseField`
-        :param name: The name of the field, used for tracking changes by
-            :class:`~mongoengine.base.ComplexBaseField`
-        :param get: A boolean determining if being called by __get__
+        :param instance: The document class `items` are raw values of
+        :param name: The name of the field `items` are raw values of
+        :param load_only: A mapping of reference field names to the names of
+            the fields to fetch, overriding the fields' `load_only` option
         """
         if items is None or isinstance(items, str):
             return items
@@ -30,190 +115,311 @@ class DeReference(object):
         if isinstance(items, QuerySet):
             items = [i for i in items]
 
-        self.max_depth = max_depth
-        doc_type = None
-
-        if instance and isinstance(instance, (Document, TopLevelDocumentMetaclass)):
-            doc_type = instance._fields.get(name)
-            if hasattr(doc_type, 'field'):
-                doc_type = doc_type.field
-
-            if isinstance(doc_type, ReferenceField):
-                field = doc_type
-                doc_type = doc_type.document_type
-                is_list = not hasattr(items, 'items')
-
-                if is_list and all([i.__class__ == doc_type for i in items]):
-                    return items
-                elif not is_list and all([i.__class__ == doc_type
-                                         for i in list(items.values())]):
-                    return items
-                elif not field.dbref:
-                    if not hasattr(items, 'items'):
-                        items = [field.to_python(v)
-                             if not isinstance(v, (DBRef, Document)) else v
-                             for v in items]
-                    else:
-                        items = dict([
-                            (k, field.to_python(v))
-                            if not isinstance(v, (DBRef, Document)) else (k, v)
-                            for k, v in items.items()]
-                        )
-
-        self.reference_map = self._find_references(items)
-        self.object_map = self._fetch_objects(doc_type=doc_type)
-        return self._attach_objects(items, 0, instance, name)
-
-    def _find_references(self, items, depth=0):
-        """
-        Recursively finds all db references to be dereferenced
+        if instance is not None and name:
+            return self._dereference_values(items, instance, name)
+
+        seen = set()
+        documents = [doc for doc in items if isinstance(doc, BaseDocument)]
+        for _ in range(max_depth):
+            documents = [doc for doc in documents if id(doc) not in seen]
+            if not documents:
+                break
+            seen.update(id(doc) for doc in documents)
+            documents = self._dereference_documents(documents,
+                                                    load_only=load_only)
+            # Overrides only apply to the fields of the items
+            load_only = None
+        return items
+
+    def resolve_safe_references(self, documents, cache, load_only=None):
+        """Resolves the :class:`~mongoengine.fields.SafeReferenceField` and
+        :class:`~mongoengine.fields.SafeReferenceListField` fields of
+        `documents` with one query per referenced collection, instead of one
+        query per reference when they are accessed.
 
-        :param items: The iterable (dict, list, queryset)
-        :param depth: The current depth of recursion
+        `cache` is a dict recording the fetched and missing references, so
+        references shared by several calls are only fetched once. See
+        :meth:`__call__` for `load_only`.
         """
-        reference_map = {}
-        if not items or depth >= self.max_depth:
-            return reference_map
+        self._dereference_documents(documents, _holds_safe_references, cache,
+                                    load_only)
 
-        # Determine the iterator to use
-        if not hasattr(items, 'items'):
-            iterator = enumerate(items)
-        else:
-            iterator = iter(items.items())
-
-        # Recursively find dbreferences
-        depth += 1
-        for k, item in iterator:
-            if isinstance(item, Document):
-                for field_name, field in item._fields.items():
-                    v = getattr(item, field_name)
-                    if isinstance(v, (DBRef)):
-                        reference_map.setdefault(field.document_type, []).append(v.id)
-                    elif isinstance(v, Document) and getattr(v, '_lazy', False):
-                        reference_map.setdefault(field.document_type, []).append(v.pk)
-                    elif isinstance(v, (dict, SON)) and '_ref' in v:
-                        reference_map.setdefault(get_document(v['_cls']), []).append(v['_ref'].id)
-                    elif isinstance(v, (dict, list, tuple)) and depth <= self.max_depth:
-                        field_cls = getattr(getattr(field, 'field', None), 'document_type', None)
-                        references = self._find_references(v, depth)
-                        for key, refs in references.items():
-                            if isinstance(field_cls, (Document, TopLevelDocumentMetaclass)):
-                                key = field_cls
-                            reference_map.setdefault(key, []).extend(refs)
-            elif isinstance(item, (DBRef)):
-                reference_map.setdefault(item.collection, []).append(item.id)
-            elif isinstance(item, (dict, SON)) and '_ref' in item:
-                reference_map.setdefault(get_document(item['_cls']), []).append(item['_ref'].id)
-            elif isinstance(item, (dict, list, tuple)) and depth - 1 <= self.max_depth:
-                references = self._find_references(item, depth - 1)
-                for key, refs in references.items():
-                    reference_map.setdefault(key, []).extend(refs)
-
-        return reference_map
-
-    def _fetch_objects(self, doc_type=None):
-        """Fetch all references and convert to their document objects
+    def lookup_stages(self, document_cls, field_names=None, load_only=None):
+        """Returns the ``$lookup`` aggregation stages joining the documents
+        referenced by the fields `field_names` of `document_cls`, and the
+        joins to pass to :meth:`attach_joined`. By default, all
+        :class:`~mongoengine.fields.ReferenceField` fields and lists of them
+        referencing documents of the same database are joined. The joined
+        documents only have the fields to load of the reference fields, see
+        :meth:`__call__` for `load_only`.
         """
-        object_map = {}
-        for col, dbrefs in self.reference_map.items():
-            keys = list(object_map.keys())
-            refs = list(set([dbref for dbref in dbrefs if str(dbref).encode('utf-8') not in keys]))
-            if hasattr(col, 'objects'):  # We have a document class for the refs
-                references = col.objects.in_bulk(refs)
-                for key, doc in references.items():
-                    object_map[key] = doc
-            else:  # Generic reference: use the refs data to convert to document
-                if isinstance(doc_type, (ListField, DictField, MapField)):
-                    continue
+        if field_names is None:
+            field_names = [name for name, _, field
+                           in _reference_fields(document_cls)
+                           if _can_lookup(_lookup_reference(field),
+                                          document_cls)]
 
-                if doc_type:
-                    references = doc_type._get_db()[col].find({'_id': {'$in': refs}})
-                    for ref in references:
-                        doc = doc_type._from_son(ref)
-                        object_map[doc.id] = doc
-                else:
-                    references = get_db()[col].find({'_id': {'$in': refs}})
-                    for ref in references:
-                        if '_cls' in ref:
-                            doc = get_document(ref["_cls"])._from_son(ref)
-                        elif doc_type is None:
-                            doc = get_document(
-                                ''.join(x.capitalize()
-                                    for x in col.split('_')))._from_son(ref)
-                        else:
-                            doc = doc_type._from_son(ref)
-                        object_map[doc.id] = doc
-        return object_map
+        stages = []
+        joins = []
+        for name in field_names:
+            field = document_cls._fields.get(name)
+            reference = _lookup_reference(field)
+            if not _can_lookup(reference, document_cls):
+                raise InvalidQueryError('Cannot look up field "%s" of %s, '
+                                        'only ReferenceField fields without '
+                                        'dbref and lists of them referencing '
+                                        'documents of the same database can '
+                                        'be looked up'
+                                        % (name, document_cls.__name__))
+            document_type = reference.document_type
+            db_field = field.db_field or name
+            alias = '_lookup_%s' % db_field
+            stages.append({'$lookup': {
+                'from': document_type._get_collection_name(),
+                'localField': db_field + '._id' if reference.store_cls
+                              else db_field,
+                'foreignField': '_id',
+                'as': alias,
+            }})
+            partial = _partial_fields(name, field, load_only)
+            if partial:
+                # Project the joined documents to the fields to load
+                keys = ['_id'] + list(document_type._partial_projection(partial))
+                projection = dict((key, '$$doc.' + key) for key in keys)
+                stages.append({'$addFields': {alias: {'$map': {
+                    'input': '$' + alias, 'as': 'doc', 'in': projection}}}})
+            joins.append((name, db_field, field, reference, partial, alias))
+        return stages, joins
 
-    def _attach_objects(self, items, depth=0, instance=None, name=None):
+    def attach_joined(self, doc, joined, joins):
+        """Attaches the documents of the `joined` mapping of join alias to
+        referenced SON documents, as returned by the stages of
+        :meth:`lookup_stages`, to `doc`. Returns the referenced documents.
         """
-        Recursively finds all db references to be dereferenced
-
-        :param items: The iterable (dict, list, queryset)
-        :param depth: The current depth of recursion
-        :param instance: The owning instance used for tracking changes by
-            :class:`~mongoengine.base.ComplexBaseField`
-        :param name: The name of the field, used for tracking changes by
-            :class:`~mongoengine.base.ComplexBaseField`
+        documents = []
+        for name, db_field, field, reference, partial, alias in joins:
+            try:
+                value = doc._db_data[db_field]
+            except (TypeError, KeyError):
+                continue
+            document_type = reference.document_type
+            collection_name = document_type._get_collection_name()
+            fetched = dict(((collection_name, son['_id']),
+                            [document_type, son, None, partial])
+                           for son in joined.get(alias) or ())
+            value = self._resolve(field, value, fetched)
+            value_for_instance = getattr(field, 'value_for_instance', None)
+            if value_for_instance:
+                value = value_for_instance(value, doc)
+            doc._internal_data[name] = value
+            documents.extend(entry[2] for entry in fetched.values()
+                             if entry[2] is not None)
+        return documents
+
+    def _dereference_values(self, values, document_cls, name):
+        """Converts raw values of a field, e.g. returned by
+        :meth:`~mongoengine.queryset.QuerySet.distinct`, fetching the
+        documents they reference.
         """
-        if not items:
-            if isinstance(items, (BaseDict, BaseList)):
-                return items
+        field = document_cls._fields.get(name)
+        if isinstance(field, (ListField, DictField)):
+            # Distinct values of a list field are its items
+            field = field.field
+        if not isinstance(field, (ReferenceField, GenericReferenceField)):
+            return values
+
+        wanted = {}
+        for value in values:
+            if value is not None:
+                self._want(wanted, *_raw_reference(field, value))
+        fetched = self._fetch(wanted)
+        return [self._resolve(field, value, fetched) for value in values]
 
-            if instance:
-                if isinstance(items, dict):
-                    return BaseDict(items, instance, name)
+    def _dereference_documents(self, documents, holds_references=None,
+                               cache=None, load_only=None):
+        """Fetches the references of `documents`, returning the documents
+        that were fetched. Only the fields for which `holds_references`
+        returns True are dereferenced if it is given. See :meth:`_fetch` for
+        `cache` and :meth:`__call__` for `load_only`.
+        """
+        # Collect the referenced primary keys of every collection
+        wanted = {}
+        pending = []
+        for doc in documents:
+            if doc._lazy:
+                continue
+            internal_data = doc._internal_data
+            db_data = doc._db_data
+            for name, db_field, field in _reference_fields(type(doc)):
+                if holds_references and not holds_references(field):
+                    continue
+                if name in internal_data:
+                    value = internal_data[name]
+                    refs = []
+                    self._collect_lazy(value, refs)
+                    override = load_only and name in load_only
+                    for ref in refs:
+                        if type(ref) is DocumentProxy:
+                            document_type = ref._DocumentProxy__document_type
+                            partial = ref._DocumentProxy__partial
+                        else:
+                            document_type = type(ref)
+                            partial = ref._partial
+                        if override:
+                            partial = _partial_fields(name, field, load_only)
+                        self._want(wanted, document_type, ref.pk, partial)
+                    pending.append((doc, name, field, None, refs))
                 else:
-                    return BaseList(items, instance, name)
-
-        if isinstance(items, (dict, SON)):
-            if '_ref' in items:
-                return self.object_map.get(items['_ref'].id, items)
-            elif '_cls' in items:
-                doc = get_document(items['_cls'])._from_son(items)
-                doc._internal_data = self._attach_objects(doc._internal_data, depth, doc, None)
-                return doc
-
-        if not hasattr(items, 'items'):
-            is_list = True
-            as_tuple = isinstance(items, tuple)
-            iterator = enumerate(items)
-            data = []
-        else:
-            is_list = False
-            iterator = iter(items.items())
-            data = {}
-
-        depth += 1
-        for k, v in iterator:
-            if is_list:
-                data.append(v)
+                    try:
+                        value = db_data[db_field]
+                    except (TypeError, KeyError):
+                        continue
+                    if value is None:
+                        continue
+                    partial = _partial_fields(name, field, load_only)
+                    self._collect_raw(field, value, wanted, partial)
+                    pending.append((doc, name, field, value, None))
+
+        fetched = self._fetch(wanted, cache)
+
+        # Attach the fetched documents
+        for doc, name, field, value, refs in pending:
+            if refs is None:
+                value = self._resolve(field, value, fetched)
+                value_for_instance = getattr(field, 'value_for_instance', None)
+                if value_for_instance:
+                    value = value_for_instance(value, doc)
+                doc._internal_data[name] = value
             else:
-                data[k] = v
-
-            if k in self.object_map and not is_list:
-                data[k] = self.object_map[k]
-            elif isinstance(v, Document):
-                for field_name, field in v._fields.items():
-                    v = data[k]._internal_data.get(field_name, None)
-                    if isinstance(v, (DBRef)):
-                        data[k]._internal_data[field_name] = self.object_map.get(v.id, v)
-                    elif isinstance(v, Document) and getattr(v, '_lazy', False):
-                        data[k]._internal_data[field_name] = self.object_map.get(v.pk, v)
-                    elif isinstance(v, (dict, SON)) and '_ref' in v:
-                        data[k]._internal_data[field_name] = self.object_map.get(v['_ref'].id, v)
-                    elif isinstance(v, dict) and depth <= self.max_depth:
-                        data[k]._internal_data[field_name] = self._attach_objects(v, depth, instance=instance, name=name)
-                    elif isinstance(v, (list, tuple)) and depth <= self.max_depth:
-                        data[k]._internal_data[field_name] = self._attach_objects(v, depth, instance=instance, name=name)
-            elif isinstance(v, (dict, list, tuple)) and depth <= self.max_depth:
-                data[k] = self._attach_objects(v, depth - 1, instance=instance, name=name)
-            elif hasattr(v, 'id'):
-                data[k] = self.object_map.get(v.id, v)
-
-        if instance and name:
-            if is_list:
-                return tuple(data) if as_tuple else BaseList(data, instance, name)
-            return BaseDict(data, instance, name)
-        depth += 1
-        return data
+                for ref in refs:
+                    self._hydrate(ref, fetched)
+
+        return [entry[2] for entry in fetched.values()
+                if entry is not None and entry[2] is not None]
+
+    def _want(self, wanted, document_type, pk, partial=None):
+        """Adds `pk` to the primary keys to fetch from the collection of
+        `document_type`, with the `partial` db fields only if given. The
+        fields wanted by several references to a document are merged.
+        """
+        pks = wanted.setdefault(document_type._get_collection_name(),
+                                (document_type, {}))[1]
+        if pk not in pks:
+            pks[pk] = partial
+        elif pks[pk] is not None:
+            pks[pk] = partial and tuple(sorted(set(pks[pk]).union(partial)))
+
+    def _collect_lazy(self, value, refs):
+        """Appends the lazy references in the decoded `value` to `refs`."""
+        # Check proxies first, isinstance would fetch them for their class
+        if type(value) is DocumentProxy:
+            if value._lazy:
+                refs.append(value)
+        elif isinstance(value, (list, tuple)):
+            for item in value:
+                self._collect_lazy(item, refs)
+        elif isinstance(value, dict):
+            for item in value.values():
+                self._collect_lazy(item, refs)
+        elif isinstance(value, Document):
+            if value._lazy:
+                refs.append(value)
+
+    def _collect_raw(self, field, value, wanted, partial=None):
+        """Adds the primary keys referenced by the raw `value` of `field` to
+        `wanted`.
+        """
+        if isinstance(field, ListField):
+            for item in value:
+                if item is not None:
+                    self._collect_raw(field.field, item, wanted, partial)
+        elif isinstance(field, DictField):
+            for item in value.values():
+                if item is not None:
+                    self._collect_raw(field.field, item, wanted, partial)
+        else:
+            document_type, pk = _raw_reference(field, value)
+            self._want(wanted, document_type, pk, partial)
+
+    def _fetch(self, wanted, cache=None):
+        """Fetches the wanted primary keys with one query per collection
+        and set of fields to load. Returns a mapping of ``(collection name,
+        pk)`` to ``[document type, son, document, partial]`` lists, where the
+        document is created on first use and `partial` are the only db
+        fields that were fetched.
+
+        If a `cache` dict is given, the results are added to it, primary keys
+        it already has aren't fetched again and missing documents are
+        recorded as None.
+        """
+        fetched = {} if cache is None else cache
+        for collection_name, (document_type, pks) in wanted.items():
+            if cache is not None:
+                pks = dict((pk, partial) for pk, partial in pks.items()
+                           if (collection_name, pk) not in cache)
+                if not pks:
+                    continue
+            # One query per distinct set of fields to load
+            groups = {}
+            for pk, partial in pks.items():
+                groups.setdefault(partial, []).append(pk)
+            collection = document_type._get_collection()
+            for partial, group in groups.items():
+                projection = document_type._partial_projection(partial)
+                for son in collection.find({'_id': {'$in': group}},
+                                           projection):
+                    fetched[(collection_name, son['_id'])] = [
+                        document_type, son, None, partial]
+            if cache is not None:
+                for pk in pks:
+                    cache.setdefault((collection_name, pk), None)
+        return fetched
+
+    def _document(self, entry):
+        """Returns the document of a fetched entry."""
+        if entry[2] is None:
+            doc = entry[0]._from_son(entry[1])
+            if entry[3] and doc._db_data is entry[1]:
+                _set(doc, '_partial', entry[3])
+            entry[2] = doc
+        return entry[2]
+
+    def _hydrate(self, ref, fetched):
+        """Loads the lazy reference `ref` with its fetched data."""
+        if not ref._lazy:
+            return
+        entry = fetched.get((ref._get_collection_name(), ref.pk))
+        if entry is None:
+            return
+        if type(ref) is DocumentProxy:
+            _set(ref, '_DocumentProxy__document', self._document(entry))
+        elif entry[2] is None:
+            # The reference becomes the document of the entry
+            ref._hydrate(entry[1], entry[3])
+            entry[2] = ref
+        elif entry[2] is not ref:
+            ref._hydrate(entry[1], entry[3])
+
+    def _resolve(self, field, value, fetched, safe=False):
+        """Converts the raw `value` of `field`, replacing references with the
+        fetched documents. Missing documents are returned as None if `safe`.
+        """
+        if value is None:
+            return None
+        if isinstance(field, SafeReferenceListField):
+            items = [self._resolve(field.field, v, fetched, True)
+                     for v in value]
+            return [item for item in items if item is not None]
+        if isinstance(field, ListField):
+            return [self._resolve(field.field, v, fetched) for v in value]
+        if isinstance(field, DictField):
+            return {k: self._resolve(field.field, v, fetched)
+                    for k, v in value.items()}
+        document_type, pk = _raw_reference(field, value)
+        entry = fetched.get((document_type._get_collection_name(), pk))
+        if entry is not None:
+            return self._document(entry)
+        if safe or isinstance(field, SafeReferenceField):
+            # The referenced document doesn't exist
+            return None
+        return field.to_python(value)
@@ -8,11 +8,14 @@ from mongoengine.base import (DocumentMetaclass, TopLevelDocumentMetaclass,
                               BaseDocument, get_document, ALLOW_INHERITANCE,
                               AUTO_CREATE_INDEX)
 from mongoengine.base.datastructures import WeakInstanceMixin
+from mongoengine.base.proxy import DocumentProxy
+from mongoengine.base.lazybson import LazyBSONDocument, raw_bson_collection
 from mongoengine.errors import (InvalidQueryError, InvalidDocumentError)
 from mongoengine.queryset import OperationError, NotUniqueError, QuerySet, DoesNotExist
 from mongoengine.connection import get_db, DEFAULT_CONNECTION_NAME
 from mongoengine.context_managers import (set_write_concern, switch_db,
-                                          switch_collection)
+                                          switch_collection, _identity_key,
+                                          _identity_map, _write_batch)
 
 __all__ = ('Document', 'EmbeddedDocument', 'DynamicDocument',
            'DynamicEmbeddedDocument', 'OperationError',
@@ -56,9 +59,36 @@ class EmbeddedDocument(WeakInstanceMixin, BaseDocument, metaclass=DocumentMetacl
     # my_metaclass is defined so that metaclass can be queried in Python 2 & 3
     my_metaclass  = DocumentMetaclass
 
-    def __init__(self, *args, **kwargs):
-        super(EmbeddedDocument, self).__init__(*args, **kwargs)
-        self._changed_fields = set()
+    __slots__ = ()
+
+    _instance_slots = BaseDocument._instance_slots + ('_instance_ref',
+                                                      '_owner_key')
+    _slot_defaults = dict(BaseDocument._slot_defaults,
+                          _instance_ref=type(None), _owner_key=type(None))
+
+    # (field name, list index or dict key) of this document within its
+    # owning document, None if changes aren't tracked by the owner
+    _owner_key = None
+
+    def _set_owner(self, instance, owner_key):
+        self._instance = instance
+        self._owner_key = owner_key
+
+    def _mark_owner_dirty(self):
+        owner_key = self._owner_key
+        if owner_key is not None:
+            instance = self._instance
+            if instance is not None:
+                instance._mark_dirty(*owner_key)
+
+    def _mark_as_changed(self, key):
+        if key:
+            self._changed_fields.add(key)
+            self._mark_owner_dirty()
+
+    def _mark_dirty(self, name, key):
+        super(EmbeddedDocument, self)._mark_dirty(name, key)
+        self._mark_owner_dirty()
 
     def __eq__(self, other):
         if isinstance(other, self.__class__):
@@ -119,6 +149,26 @@ class Document(BaseDocument, metaclass=TopLevelDocumentMetaclass):
     # my_metaclass is defined so that metaclass can be queried in Python 2 & 3
     my_metaclass  = TopLevelDocumentMetaclass
 
+    __slots__ = ()
+
+    _instance_slots = BaseDocument._instance_slots + ('_Document__objects',
+                                                      '_prefetch_batch',
+                                                      '_prefetch_source',
+                                                      '_partial')
+    _slot_defaults = dict(BaseDocument._slot_defaults,
+                          _prefetch_batch=type(None),
+                          _prefetch_source=type(None),
+                          _partial=type(None))
+
+    # The PrefetchBatch of an auto_prefetch queryset the document was loaded
+    # with, and for lazy references the (batch, field name) they were read
+    # from, see QuerySet.auto_prefetch
+    _prefetch_batch = None
+    _prefetch_source = None
+    # The db fields loaded by a lazy reference with load_only, or that were
+    # loaded by a partially loaded document, see _complete
+    _partial = None
+
     def pk():
         """Primary key alias
         """
@@ -210,7 +260,7 @@ class Document(BaseDocument, metaclass=TopLevelDocumentMetaclass):
 
         return True
 
-    def save(self, validate=True, clean=True,
+    def save(self, validate='changed', clean=True,
              write_concern=None,  cascade=None, cascade_kwargs=None,
              _refs=None, full=False, **kwargs):
         """Save the :class:`~mongoengine.Document` to the database. If the
@@ -218,8 +268,12 @@ class Document(BaseDocument, metaclass=TopLevelDocumentMetaclass):
         created.
 
         :param validate: validates the document; set to ``False`` to skip.
+            ``'changed'`` (the default) only validates the values of changed
+            fields when updating an existing document, checking the other
+            fields for required-ness without decoding them. ``'full'`` or
+            ``True`` validates every field.
         :param clean: call the document clean method, requires `validate` to be
-            True.
+            enabled.
         :param write_concern: Extra keyword arguments are passed down to
             :meth:`~pymongo.collection.Collection.save` OR
             :meth:`~pymongo.collection.Collection.insert`
@@ -235,6 +289,9 @@ class Document(BaseDocument, metaclass=TopLevelDocumentMetaclass):
         :param _refs: A list of processed references used in cascading saves
         :param full: Save all model fields instead of just changed ones.
 
+        Within a :class:`~mongoengine.context_managers.write_batch`, the
+        document is validated and its write is queued.
+
         .. versionchanged:: 0.5
             In existing documents it only saves changed fields using
             set / unset.  Saves are cascaded and any
@@ -252,8 +309,13 @@ class Document(BaseDocument, metaclass=TopLevelDocumentMetaclass):
 
         signals.pre_save.send(self.__class__, document=self)
 
-        if validate:
-            self.validate(clean=clean)
+        self._validate_for_save(validate, clean, full)
+
+        batch = _write_batch.get()
+        if batch is not None:
+            # Written when the write_batch block exits
+            batch.save(self, full)
+            return self
 
         if not write_concern:
             write_concern = {'w': 1}
@@ -264,16 +326,7 @@ class Document(BaseDocument, metaclass=TopLevelDocumentMetaclass):
         try:
             if self._created:
                 # Update: Get delta.
-                sets, unsets = self._delta(full)
-                db_id_field = self._fields[self._meta['id_field']].db_field
-                sets.pop(db_id_field, None)
-
-                update_query = {}
-                if sets:
-                    update_query['$set'] = sets
-                if unsets:
-                    update_query['$unset'] = unsets
-
+                update_query = self._save_update(full)
                 if update_query:
                     collection.update_one(self._db_object_key, update_query)
 
@@ -282,11 +335,7 @@ class Document(BaseDocument, metaclass=TopLevelDocumentMetaclass):
                 # Insert: Get full SON.
                 doc = self.to_mongo()
                 object_id = collection.insert_one(doc).inserted_id
-                id_field = self._meta['id_field']
-                del self._internal_data[id_field]
-                _set(self, '_db_data', doc)
-                doc['_id'] = object_id
-
+                self._mark_inserted(doc, object_id)
                 created = True
 
             cascade = (self._meta.get('cascade', False)
@@ -318,6 +367,41 @@ class Document(BaseDocument, metaclass=TopLevelDocumentMetaclass):
         signals.post_save.send(self.__class__, document=self, created=created)
         return self
 
+    def _validate_for_save(self, validate, clean, full):
+        """Validates the document before saving it, see :meth:`save`."""
+        if validate == 'changed' and self._created and not full:
+            changed_fields = set(name.split('.', 1)[0]
+                                 for name in self._get_changed_fields())
+            self.validate(clean=clean, fields=changed_fields)
+        elif validate:
+            self.validate(clean=clean)
+
+    def _save_update(self, full=False):
+        """Returns the update saving the changes of an existing document, or
+        an empty dict if there's nothing to save.
+        """
+        update_query = self._delta_update(full)
+        sets = update_query.get('$set')
+        if sets:
+            db_id_field = self._fields[self._meta['id_field']].db_field
+            sets.pop(db_id_field, None)
+            if not sets:
+                del update_query['$set']
+        return update_query
+
+    def _mark_inserted(self, son, object_id):
+        """Makes `son`, which was inserted with the id `object_id`, the data
+        of the document.
+        """
+        id_field = self._meta['id_field']
+        del self._internal_data[id_field]
+        _set(self, '_db_data', son)
+        son['_id'] = object_id
+
+        identity_map = _identity_map.get()
+        if identity_map is not None:
+            identity_map.setdefault(_identity_key(self, object_id), self)
+
     def cascade_save(self, *args, **kwargs):
         """Recursively saves any references /
            generic references on an objects"""
@@ -388,13 +472,32 @@ class Document(BaseDocument, metaclass=TopLevelDocumentMetaclass):
         A convenience wrapper to :meth:`~mongoengine.QuerySet.update`.
 
         Raises :class:`OperationError` if called on an object that has not yet
-        been saved.
+        been saved. Returns the number of updated documents, except within a
+        :class:`~mongoengine.context_managers.write_batch`, where the update
+        is queued and None is returned. `write_concern` and `read_concern`
+        can't be passed within a batch.
         """
         if not self.pk:
             raise OperationError('attempt to update a document not yet saved')
 
         # Need to add shard key to query, or you get an error
-        return self._qs.filter(**self._object_key).update_one(**kwargs)
+        queryset = self._qs.filter(**self._object_key)
+        batch = _write_batch.get()
+        if batch is not None:
+            upsert = kwargs.pop('upsert', False)
+            # Only this document is updated either way
+            kwargs.pop('multi', None)
+            options = [name for name in ('write_concern', 'read_concern')
+                       if kwargs.pop(name, None) is not None]
+            if options:
+                raise OperationError('%s not supported within a write_batch'
+                                     % ', '.join(options))
+            if not kwargs and not upsert:
+                raise OperationError('No update parameters, would remove data')
+            query, update = queryset._update_spec(kwargs, upsert)
+            batch.update(self, query, update, upsert)
+            return None
+        return queryset.update_one(**kwargs)
 
     def delete(self, write_concern=None):
         """Delete the :class:`~mongoengine.Document` from the database. This
@@ -409,6 +512,12 @@ class Document(BaseDocument, metaclass=TopLevelDocumentMetaclass):
         """
         signals.pre_delete.send(self.__class__, document=self)
 
+        batch = _write_batch.get()
+        if batch is not None and not self._meta.get('delete_rules'):
+            # Written when the write_batch block exits
+            batch.delete(self, self._qs.filter(**self._object_key)._query)
+            return
+
         if not write_concern:
             write_concern = {'w': 1}
 
@@ -419,6 +528,12 @@ class Document(BaseDocument, metaclass=TopLevelDocumentMetaclass):
         except pymongo.errors.OperationFailure as err:
             message = 'Could not delete document (%s)' % err.message
             raise OperationError(message)
+
+        identity_map = _identity_map.get()
+        if identity_map is not None:
+            key = _identity_key(self, self.pk)
+            if identity_map.get(key) is self:
+                del identity_map[key]
         signals.post_delete.send(self.__class__, document=self)
 
     def switch_db(self, db_alias):
@@ -436,6 +551,9 @@ class Document(BaseDocument, metaclass=TopLevelDocumentMetaclass):
 
         :param db_alias: The database alias to use for saving the document
         """
+        if self._slotted:
+            raise OperationError('switch_db is not supported on documents '
+                                 'with a slotted layout')
         with switch_db(self.__class__, db_alias) as cls:
             collection = cls._get_collection()
             db = cls._get_db
@@ -463,6 +581,9 @@ class Document(BaseDocument, metaclass=TopLevelDocumentMetaclass):
         :param collection_name: The database alias to use for saving the
             document
         """
+        if self._slotted:
+            raise OperationError('switch_collection is not supported on '
+                                 'documents with a slotted layout')
         with switch_collection(self.__class__, collection_name) as cls:
             collection = cls._get_collection()
         self._get_collection = lambda: collection
@@ -472,36 +593,125 @@ class Document(BaseDocument, metaclass=TopLevelDocumentMetaclass):
         self.__objects._collection_obj = collection
         return self
 
-    def select_related(self, max_depth=1):
+    def select_related(self, max_depth=1, strategy='queries', fields=None):
         """Handles dereferencing of :class:`~bson.dbref.DBRef` objects to
         a maximum depth in order to cut down the number queries to mongodb.
 
+        See :meth:`~mongoengine.queryset.QuerySet.select_related` for the
+        `strategy` and `fields` arguments. With ``'lookup'``, the referenced
+        documents are joined to the document by an aggregation in one round
+        trip.
+
         .. versionadded:: 0.5
         """
         from . import dereference
-        self._internal_data = dereference.DeReference()(self._internal_data, max_depth)
+        deref = dereference.DeReference()
+        if strategy == 'lookup':
+            stages, joins = deref.lookup_stages(self.__class__, fields)
+            if not joins:
+                return self
+            match = {'_id': self.pk} if self._lazy else self._db_object_key
+            pipeline = [{'$match': match}] + stages
+            if not self._lazy:
+                # Only the joined documents are needed
+                pipeline.append({'$project': dict(
+                    (alias, 1) for _, _, _, _, _, alias in joins)})
+            for son in self._get_collection().aggregate(pipeline):
+                joined = dict((alias, son.pop(alias, None))
+                              for _, _, _, _, _, alias in joins)
+                if self._lazy:
+                    self._hydrate(son)
+                referenced = deref.attach_joined(self, joined, joins)
+                if max_depth > 1:
+                    deref(referenced, max_depth - 1)
+        elif strategy != 'queries':
+            raise ValueError('Unknown select_related strategy %r' % strategy)
+        else:
+            deref([self], max_depth)
         return self
 
     def reload(self):
-        """Reloads all attributes from the database.
+        """Reloads all attributes from the database. Documents loaded with
+        :meth:`~mongoengine.queryset.QuerySet.raw_bson` are reloaded as raw
+        BSON as well.
         """
+        if self._lazy and self._prefetch_source is not None:
+            batch, field_name = self._prefetch_source
+            _set(self, '_prefetch_source', None)
+            batch.prefetch(field_name)
+            if not self._lazy:
+                return self
+
+        identity_map = _identity_map.get()
+        if identity_map is not None:
+            key = _identity_key(self, self.pk)
+            loaded = identity_map.get(key)
+            # A lazy reference to a document loaded within the identity map
+            # doesn't need to be fetched
+            if (self._lazy and loaded is not None and loaded is not self and
+                    not isinstance(loaded, DocumentProxy) and not loaded._lazy):
+                self._hydrate(loaded._db_data, loaded._partial)
+                return self
+
         id_field = self._meta['id_field']
         collection = self._get_collection()
+        raw = isinstance(self._db_data, LazyBSONDocument)
+        if raw:
+            collection = raw_bson_collection(collection)
         # If this is a lazy object, we only have the ID field and don't want to
         # call _db_object_key, since _db_object_key could fetch (reload) the
-        # object.
+        # object. Lazy references with load_only only fetch those fields.
+        partial = self._partial if self._lazy else None
         if self._lazy:
-            son = collection.find_one({ '_id': self.pk })
+            son = collection.find_one({ '_id': self.pk },
+                                      self._partial_projection(partial))
         else:
             son = collection.find_one(self._db_object_key)
         if son == None:
             raise self.DoesNotExist(f'Document {self.pk} has been deleted.')
-        _set(self, '_db_data', son)
-        _set(self, '_internal_data', {})
-        _set(self, '_lazy', False)
-        self._clear_changed_fields()
+        if raw:
+            son = LazyBSONDocument(son.raw, self._db_data.codec_options)
+        self._hydrate(son, partial)
+        if identity_map is not None:
+            identity_map.setdefault(key, self)
         return self
 
+    def _hydrate(self, son, partial=None):
+        """Replaces the data of the document with `son` fetched from the
+        database, discarding decoded values and changes. `partial` are the
+        db fields `son` was projected to, if any.
+        """
+        super(Document, self)._hydrate(son)
+        _set(self, '_partial', partial)
+
+    def _complete(self):
+        """Fetches the fields a partially loaded document lacks, keeping its
+        decoded values and changes.
+        """
+        collection = self._get_collection()
+        raw = isinstance(self._db_data, LazyBSONDocument)
+        if raw:
+            collection = raw_bson_collection(collection)
+        son = collection.find_one({'_id': self.pk})
+        if son is None:
+            raise self.DoesNotExist(f'Document {self.pk} has been deleted.')
+        if raw:
+            son = LazyBSONDocument(son.raw, self._db_data.codec_options)
+        _set(self, '_db_data', son)
+        _set(self, '_partial', None)
+
+    @classmethod
+    def _partial_projection(cls, db_fields):
+        """Returns the projection loading only `db_fields`, or None to load
+        the whole document.
+        """
+        if not db_fields:
+            return None
+        projection = dict((db_field, 1) for db_field in db_fields)
+        if cls._meta['allow_inheritance']:
+            projection['_cls'] = 1
+        return projection
+
     def to_dbref(self):
         """Returns an instance of :class:`~bson.dbref.DBRef` useful in
         `__raw__` queries."""
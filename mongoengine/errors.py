@@ -5,7 +5,8 @@ from mongoengine.python_support import txt_type
 
 __all__ = ('NotRegistered', 'InvalidDocumentError', 'LookUpError',
            'DoesNotExist', 'MultipleObjectsReturned', 'InvalidQueryError',
-           'OperationError', 'NotUniqueError', 'ValidationError')
+           'OperationError', 'NotUniqueError', 'WriteBatchError',
+           'ValidationError')
 
 
 class NotRegistered(Exception):
@@ -40,6 +41,21 @@ class NotUniqueError(OperationError):
     pass
 
 
+class WriteBatchError(OperationError):
+    """Raised when writes of a
+    :class:`~mongoengine.context_managers.write_batch` fail.
+
+    :ivar errors: A list of ``(document, write error)`` pairs, where the
+        write error is the error document returned by the server for the
+        write queued by the document. Writes that weren't attempted after an
+        earlier failure of an ordered batch only have an ``errmsg``.
+    """
+
+    def __init__(self, message, errors=None):
+        super(WriteBatchError, self).__init__(message)
+        self.errors = errors or []
+
+
 class ValidationError(AssertionError):
     """Validation exception.
 
@@ -28,6 +28,7 @@ from mongoengine.queryset import DoesNotExist
 from .queryset import DO_NOTHING, QuerySet
 from .document import Document, EmbeddedDocument
 from .connection import get_db, DEFAULT_CONNECTION_NAME
+from .context_managers import _identity_key, _identity_map
 
 try:
     from PIL import Image, ImageOps
@@ -154,8 +155,15 @@ class IntField(BaseField):
     """An integer field.
     """
 
-    def __init__(self, min_value=None, max_value=None, **kwargs):
+    def __init__(self, min_value=None, max_value=None, atomic=False,
+                 **kwargs):
+        """
+        :param atomic: Save changes of a document loaded from the database
+            with $inc by the difference to the loaded value, so concurrent
+            increments aren't lost. Defaults to False.
+        """
         self.min_value, self.max_value = min_value, max_value
+        self.atomic = atomic
         super(IntField, self).__init__(**kwargs)
 
     def from_python(self, value):
@@ -184,8 +192,15 @@ class FloatField(BaseField):
     """A floating point number field.
     """
 
-    def __init__(self, min_value=None, max_value=None, **kwargs):
+    def __init__(self, min_value=None, max_value=None, atomic=False,
+                 **kwargs):
+        """
+        :param atomic: Save changes of a document loaded from the database
+            with $inc by the difference to the loaded value, so concurrent
+            increments aren't lost. Defaults to False.
+        """
         self.min_value, self.max_value = min_value, max_value
+        self.atomic = atomic
         super(FloatField, self).__init__(**kwargs)
 
     def validate(self, value):
@@ -429,6 +444,16 @@ class EmbeddedDocumentField(BaseField):
     def to_python(self, val):
         return self.document_type._from_son(val)
 
+    def value_for_instance(self, value, instance, name=None, key=None):
+        if isinstance(value, EmbeddedDocument):
+            # Changes are only reported for values stored directly in the
+            # field or directly in a list or dict field
+            if name is None:
+                value._set_owner(instance, (self.name, None))
+            else:
+                value._set_owner(instance, None if key is None else (name, key))
+        return value
+
     def to_mongo(self, val):
         return val and val.to_mongo()
 
@@ -562,13 +587,30 @@ class ListField(ComplexBaseField):
         kwargs.setdefault('default', lambda: [])
         super(ListField, self).__init__(**kwargs)
 
-    def value_for_instance(self, value, instance, name=None):
+    def value_for_instance(self, value, instance, name=None, key=None):
+        # Items are only keyed by their index in a list stored directly in
+        # the field, not in one nested in another list or dict
+        keyed = name is None
         name = name or self.name
         if value and self.field:
             value_for_instance = getattr(self.field, 'value_for_instance', None)
             if value_for_instance:
-                value = [value_for_instance(v, instance, name) for v in value]
-        return BaseList(value or [], instance, name)
+                value = [value_for_instance(v, instance, name,
+                                            idx if keyed else None)
+                         for idx, v in enumerate(value)]
+        tracked = keyed and value is not None
+        value = BaseList(value or [], instance, name)
+        if tracked:
+            # Record appends and removals, see BaseDocument._delta_update
+            value._ops = []
+        return value
+
+    def __set__(self, instance, value):
+        super(ListField, self).__set__(instance, value)
+        # Assigned lists are saved as a whole
+        value = instance._internal_data.get(self.name)
+        if isinstance(value, BaseList):
+            value._ops = None
 
     def from_python(self, val):
         from_python = getattr(self.field, 'from_python', None)
@@ -695,12 +737,15 @@ class DictField(ComplexBaseField):
         to_python = getattr(self.field, 'to_python', None)
         return {k: to_python(v) for k, v in val.items()} if to_python and val else val or None
 
-    def value_for_instance(self, value, instance, name=None):
+    def value_for_instance(self, value, instance, name=None, key=None):
+        keyed = name is None
         name = name or self.name
         if value and self.field:
             value_for_instance = getattr(self.field, 'value_for_instance', None)
             if value_for_instance:
-                value = {k: value_for_instance(v, instance, name) for k, v in value.items()}
+                value = {k: value_for_instance(v, instance, name,
+                                               k if keyed else None)
+                         for k, v in value.items()}
         return BaseDict(value or {}, instance, name)
 
     def to_mongo(self, val):
@@ -750,6 +795,38 @@ class MapField(DictField):
         super(MapField, self).__init__(field=field, *args, **kwargs)
 
 
+def _lazy_reference(document_type, pk, class_name=None, partial=None):
+    """Returns a document of `document_type` with the given primary key that
+    is fetched on first access. Within an identity_map, the document already
+    loaded or referenced with this primary key is returned instead.
+
+    If the name of the document's class is known, a lazy document of that
+    class is returned even if `document_type` allows inheritance. If
+    `partial` db fields are given, only those are fetched at first.
+    """
+    identity_map = _identity_map.get()
+    if identity_map is not None:
+        key = _identity_key(document_type, pk)
+        obj = identity_map.get(key)
+        if obj is not None:
+            return obj
+
+    if class_name is None and document_type._meta['allow_inheritance']:
+        # We don't know of which type the object will be.
+        obj = DocumentProxy(document_type, pk, partial)
+    else:
+        if class_name is not None and class_name != document_type._class_name:
+            document_type = get_document(class_name)
+        obj = document_type(pk=pk)
+        obj._lazy = True
+        if partial:
+            obj._partial = partial
+
+    if identity_map is not None:
+        identity_map[key] = obj
+    return obj
+
+
 class ReferenceField(BaseField):
     """A reference to a document that will be automatically dereferenced on
     access (lazily).
@@ -783,24 +860,49 @@ class ReferenceField(BaseField):
         `reverse_delete_rules` do not trigger pre / post delete signals to be
         triggered.
 
+    With `load_only`, lazy references only fetch the given fields of the
+    referenced document when they are first accessed. Other fields are
+    fetched when one of them is accessed.
+
+    With `store_cls`, references are stored as ``{_id, _cls}`` documents, so
+    references to documents of a class allowing inheritance are read as lazy
+    documents of their actual class instead of proxies that have to fetch the
+    document to know it. References stored as ids are still read, and are
+    converted when the field is written. Proxies that weren't fetched are
+    stored as ``{_id}`` documents, without their class. Queries on the field
+    match the stored ``_id``, so existing references need to be migrated
+    before filtering on the field.
+
     .. versionchanged:: 0.5 added `reverse_delete_rule`
     """
 
+    # Query operators matching the `_id` of references stored with store_cls
+    id_operators = (None, 'ne', 'in', 'nin', 'all')
+
     def __init__(self, document_type, dbref=False,
-                 reverse_delete_rule=DO_NOTHING, **kwargs):
+                 reverse_delete_rule=DO_NOTHING, store_cls=False,
+                 load_only=None, **kwargs):
         """Initialises the Reference Field.
 
         :param dbref:  Store the reference as :class:`~pymongo.dbref.DBRef`
           or as the :class:`~pymongo.objectid.ObjectId`.id .
         :param reverse_delete_rule: Determines what to do when the referring
           object is deleted
+        :param store_cls: Store the reference as a document with the `_id`
+          and the `_cls` of the referenced document
+        :param load_only: The names of the fields of the referenced document
+          to fetch when the reference is dereferenced
         """
         if not isinstance(document_type, str):
             if not issubclass(document_type, (Document, str)):
                 self.error('Argument to ReferenceField constructor must be a '
                            'document class or a string')
+        if dbref and store_cls:
+            self.error('ReferenceField can\'t use both dbref and store_cls')
 
         self.dbref = dbref
+        self.store_cls = store_cls
+        self.load_only = tuple(load_only) if load_only else None
         self.document_type_obj = document_type
         self.reverse_delete_rule = reverse_delete_rule
         super(ReferenceField, self).__init__(**kwargs)
@@ -826,7 +928,7 @@ class ReferenceField(BaseField):
             if self.dbref:
                 return value
             else:
-                return value.id
+                return self._typed(value.id)
         elif issubclass(type_, (Document, DocumentProxy)):
             document_type = self.document_type
             # We need the id from the saved object to create the DBRef
@@ -840,13 +942,47 @@ class ReferenceField(BaseField):
             if self.dbref:
                 collection = document_type._get_collection_name()
                 return DBRef(collection, pk)
+            elif self.store_cls:
+                if type_ is DocumentProxy:
+                    # Don't fetch the document to know its class
+                    document = value._DocumentProxy__document
+                    if document is None:
+                        return self._typed(pk)
+                    type_ = document.__class__
+                return SON([('_id', pk), ('_cls', type_._class_name)])
             else:
                 return pk
+        elif isinstance(value, dict) and '_id' in value:
+            return value if self.store_cls else value['_id']
         elif value != None: # string ID
             document_type = self.document_type
             collection = document_type._get_collection_name()
             return DBRef(collection, value)
 
+    def partial_fields(self, load_only=None):
+        """Returns the db fields to fetch referenced documents with, from the
+        `load_only` field names or the field's `load_only` option, or None to
+        fetch whole documents.
+        """
+        if load_only is None:
+            load_only = self.load_only
+        if not load_only:
+            return None
+        db_field_map = self.document_type._db_field_map
+        return tuple(db_field_map.get(name, name) for name in load_only)
+
+    def _typed(self, pk):
+        """Returns the stored value of a reference to `pk` of an unknown
+        class. With `store_cls`, the class is only stored if the document
+        type has no subclasses, otherwise it's read back as a proxy.
+        """
+        if not self.store_cls:
+            return pk
+        document_type = self.document_type
+        if len(document_type._subclasses) == 1:
+            return SON([('_id', pk), ('_cls', document_type._class_name)])
+        return SON([('_id', pk)])
+
     def to_python(self, value):
         if value != None:
             document_type = self.document_type
@@ -855,15 +991,24 @@ class ReferenceField(BaseField):
             else:
                 if isinstance(value, DBRef):
                     pk = value.id
+                elif isinstance(value, dict):
+                    # References stored with store_cls
+                    return _lazy_reference(document_type, value['_id'],
+                                           value.get('_cls'),
+                                           self.partial_fields())
                 else:
                     pk = value
-            if document_type._meta['allow_inheritance']:
-                # We don't know of which type the object will be.
-                obj = DocumentProxy(document_type, pk)
-            else:
-                obj = document_type(pk=pk)
-                obj._lazy = True
-            return obj
+            return _lazy_reference(document_type, pk,
+                                   partial=self.partial_fields())
+
+    def value_for_instance(self, value, instance, name=None, key=None):
+        # Link lazy references of documents loaded by an auto_prefetch
+        # queryset to their batch
+        batch = getattr(instance, '_prefetch_batch', None)
+        if batch is not None and name is None and value is not None:
+            if value._lazy:
+                batch.link(value, self.name)
+        return value
 
     def from_python(self, value):
         if isinstance(value, (BaseDocument, DocumentProxy)):
@@ -879,20 +1024,27 @@ class ReferenceField(BaseField):
                 document_type = self.document_type
                 if isinstance(value, DBRef):
                     pk = value.id
+                elif isinstance(value, dict) and '_id' in value:
+                    return _lazy_reference(document_type, value['_id'],
+                                           value.get('_cls'),
+                                           self.partial_fields())
                 else:
                     pk = value
-                if document_type._meta['allow_inheritance']:
-                    # We don't know of which type the object will be.
-                    obj = DocumentProxy(document_type, pk)
-                else:
-                    obj = document_type(pk=pk)
-                    obj._lazy = True
-                return obj
+                return _lazy_reference(document_type, pk,
+                                       partial=self.partial_fields())
 
     def prepare_query_value(self, op, value):
-        return self.to_mongo(self.from_python(value))
+        value = self.to_mongo(self.from_python(value))
+        if op in self.id_operators and isinstance(value, dict):
+            # References stored with store_cls are matched by their `_id`
+            return value['_id']
+        return value
 
     def validate(self, value):
+        # With store_cls, check proxies first, isinstance would fetch them
+        # for their class
+        if self.store_cls and type(value) is DocumentProxy:
+            return
         if not isinstance(value, (self.document_type, DBRef, DocumentProxy)):
             self.error("A ReferenceField only accepts DBRef or documents")
 
@@ -917,7 +1069,7 @@ class SafeReferenceField(ReferenceField):
 
     def to_python(self, value):
         obj = super(SafeReferenceField, self).to_python(value)
-        if obj:
+        if obj and obj._lazy:
             # Must dereference so we don't get an invalid ObjectId back.
             try:
                 obj.reload()
@@ -951,7 +1103,14 @@ class SafeReferenceListField(ListField):
     def to_python(self, value):
         result = super(SafeReferenceListField, self).to_python(value)
         if result:
-            objs = self.field.document_type.objects.in_bulk([obj.id for obj in result])
+            queryset = self.field.document_type.objects
+            partial = self.field.partial_fields()
+            if partial:
+                queryset = queryset.only(*self.field.load_only)
+            objs = queryset.in_bulk([obj.id for obj in result])
+            if partial:
+                for obj in objs.values():
+                    obj._partial = partial
             return [_f for _f in [objs.get(obj.id) for obj in result] if _f]
 
 class GenericReferenceField(BaseField):
@@ -992,10 +1151,7 @@ class GenericReferenceField(BaseField):
     def to_python(self, value):
         if value != None:
             doc_cls = get_document(value['_cls'])
-            reference = value['_ref']
-            obj = doc_cls(pk=reference.id)
-            obj._lazy = True
-            return obj
+            return _lazy_reference(doc_cls, value['_ref'].id)
 
     def to_mongo(self, document):
         if document is None:
@@ -0,0 +1,186 @@
+import atexit
+import threading
+import time
+import warnings
+import weakref
+
+import pymongo
+from bson import encode
+from pymongo import UpdateOne
+
+from mongoengine.errors import InvalidQueryError, OperationError
+from mongoengine.queryset import transform
+from mongoengine.queryset.visitor import Q
+
+__all__ = ('CounterBuffer',)
+
+
+# Buffers flushed when the interpreter exits
+_exit_buffers = weakref.WeakSet()
+
+# Codes of write errors that may succeed when retried, as for retryable writes
+RETRYABLE_ERROR_CODES = frozenset([
+    6,      # HostUnreachable
+    7,      # HostNotFound
+    89,     # NetworkTimeout
+    91,     # ShutdownInProgress
+    189,    # PrimarySteppedDown
+    262,    # ExceededTimeLimit
+    9001,   # SocketException
+    10107,  # NotWritablePrimary
+    11600,  # InterruptedAtShutdown
+    11602,  # InterruptedDueToReplStateChange
+    13435,  # NotPrimaryNoSecondaryOk
+    13436,  # NotPrimaryOrSecondary
+])
+
+
+class CounterBuffer(object):
+    """Increments buffered in process, created with
+    :meth:`~mongoengine.queryset.QuerySet.counter_buffer`.
+
+    Increments of the same documents and fields are summed, and written with
+    a single unordered ``bulk_write`` once `max_size` distinct queries are
+    pending or the oldest pending increment is `max_delay` seconds old, when
+    :meth:`flush` is called, when a ``with`` block using the buffer exits
+    and when the interpreter exits::
+
+        views = Post.objects.counter_buffer()
+        views.update({'pk': post.pk}, inc__views=1)
+
+    Increments older than `max_delay` are written by a timer thread, unless
+    `max_delay` is None. Increments whose write fails with a transient error,
+    such as a lost connection or a primary stepping down, are kept pending
+    and retried with the next write. Other failed increments are dropped.
+    """
+
+    def __init__(self, queryset, max_size=1000, max_delay=1.0, upsert=False,
+                 flush_on_exit=True):
+        self._queryset = queryset
+        self.max_size = max_size
+        self.max_delay = max_delay
+        self.upsert = upsert
+        # Pending increments keyed by the BSON of their query
+        self._pending = {}
+        self._since = None
+        self._timer = None
+        self._lock = threading.Lock()
+        if flush_on_exit:
+            _exit_buffers.add(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, t, value, traceback):
+        self.flush()
+
+    def __len__(self):
+        return len(self._pending)
+
+    def update(self, query, **update):
+        """Buffers increments of the documents matching `query`.
+
+        :param query: a :class:`~mongoengine.queryset.Q` object or a dict of
+            query keyword arguments, combined with the buffer's queryset
+        :param update: ``inc__`` and ``dec__`` keyword arguments
+        """
+        if not isinstance(query, Q):
+            query = Q(**query)
+        query = self._queryset.filter(query)._query
+        update = transform.update(self._queryset._document, **update)
+        if list(update) != ['$inc']:
+            raise InvalidQueryError('Only inc__ and dec__ updates can be '
+                                    'buffered')
+        with self._lock:
+            self._add({encode(query): (query, update['$inc'])},
+                      time.monotonic())
+            due = (len(self._pending) >= self.max_size or
+                   (self.max_delay is not None and
+                    time.monotonic() - self._since >= self.max_delay))
+            if not due:
+                self._schedule()
+        if due:
+            self.flush()
+
+    def flush(self):
+        """Writes the pending increments. The increments whose write fails
+        with a transient error are kept pending, those failing otherwise are
+        dropped. Raises :class:`~mongoengine.errors.OperationError` if the
+        database rejected a write.
+        """
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            since, self._since = self._since, None
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        if not pending:
+            return
+        requests = [UpdateOne(query, {'$inc': increments},
+                              upsert=self.upsert)
+                    for query, increments in pending.values()]
+        try:
+            self._queryset._collection.bulk_write(requests, ordered=False)
+        except Exception as err:
+            if isinstance(err, pymongo.errors.BulkWriteError):
+                # The other increments were written
+                retry = set(write_error['index'] for write_error in
+                            err.details['writeErrors']
+                            if write_error.get('code') in
+                            RETRYABLE_ERROR_CODES)
+                pending = dict(item for index, item in
+                               enumerate(pending.items()) if index in retry)
+            elif not isinstance(err, pymongo.errors.ConnectionFailure):
+                pending = {}
+            if pending:
+                with self._lock:
+                    self._add(pending, since)
+                    self._schedule(self.max_delay)
+            if isinstance(err, pymongo.errors.OperationFailure):
+                raise OperationError('Could not write increments (%s)' % err)
+            raise
+
+    def _add(self, pending, since):
+        """Merges the `pending` increments, buffered since `since`, into the
+        buffer. Must be called with the lock held.
+        """
+        for key, (query, increments) in pending.items():
+            current = self._pending.get(key)
+            if current is None:
+                self._pending[key] = (query, dict(increments))
+            else:
+                current = current[1]
+                for db_field, value in increments.items():
+                    current[db_field] = current.get(db_field, 0) + value
+        if self._since is None or since < self._since:
+            self._since = since
+
+    def _schedule(self, delay=None):
+        """Starts a timer writing the pending increments once they're
+        `max_delay` seconds old, or after `delay` seconds. Must be called
+        with the lock held.
+        """
+        if (self._timer is not None or self.max_delay is None or
+                not self._pending):
+            return
+        if delay is None:
+            delay = max(self._since + self.max_delay - time.monotonic(), 0)
+        self._timer = threading.Timer(delay, self._flush_due)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _flush_due(self):
+        """Writes the pending increments from the timer thread."""
+        try:
+            self.flush()
+        except Exception as err:
+            # Transient failures stay pending and a new timer retries them
+            warnings.warn('Could not write buffered increments: %s' % err,
+                          RuntimeWarning)
+
+
+@atexit.register
+def _flush_on_exit():
+    """Flushes the buffers still alive when the interpreter exits."""
+    for buffer in list(_exit_buffers):
+        buffer.flush()
@@ -0,0 +1,167 @@
+import queue
+import threading
+import weakref
+
+__all__ = ('PrefetchBatch', 'BackgroundCursor')
+
+_set = object.__setattr__
+
+
+class PrefetchBatch(object):
+    """Documents loaded together by a queryset using
+    :meth:`~mongoengine.queryset.QuerySet.auto_prefetch`.
+
+    Lazy references read from a document of the batch are linked to it, so
+    fetching the first of them fetches the references of the same field of
+    all documents in the batch with a single query. `load_only` maps field
+    names to the names of the fields to fetch for them, overriding the
+    fields' own `load_only` option.
+    """
+
+    __slots__ = ('documents', 'fetched', 'load_only', '__weakref__')
+
+    def __init__(self, documents, load_only=None):
+        # The batch shouldn't keep documents that are no longer used alive
+        self.documents = [weakref.ref(doc) for doc in documents]
+        self.fetched = set()
+        self.load_only = load_only
+        for doc in documents:
+            _set(doc, '_prefetch_batch', self)
+
+    def link(self, reference, field_name):
+        """Marks the lazy `reference` as read from the field `field_name` of a
+        document of the batch.
+        """
+        from mongoengine.base.proxy import DocumentProxy
+        source = (self, field_name)
+        if isinstance(reference, DocumentProxy):
+            _set(reference, '_DocumentProxy__prefetch_source', source)
+        else:
+            _set(reference, '_prefetch_source', source)
+
+    def prefetch(self, field_name):
+        """Fetches the lazy references of the field `field_name` of all
+        documents in the batch, once.
+        """
+        from mongoengine.base.proxy import DocumentProxy
+        if field_name in self.fetched:
+            return
+        self.fetched.add(field_name)
+
+        document_type = None
+        references = {}
+        for ref in self.documents:
+            doc = ref()
+            if doc is None or doc._lazy:
+                continue
+            field = doc._fields.get(field_name)
+            reference = getattr(doc, field_name)
+            if reference is not None and reference._lazy:
+                document_type = field.document_type
+                references.setdefault(reference.pk, []).append(reference)
+        if not references:
+            return
+
+        if self.load_only and field_name in self.load_only:
+            partial = field.partial_fields(self.load_only[field_name] or ())
+        else:
+            partial = field.partial_fields()
+        collection = document_type._get_collection()
+        for son in collection.find({'_id': {'$in': list(references)}},
+                                   document_type._partial_projection(partial)):
+            for reference in references[son['_id']]:
+                if isinstance(reference, DocumentProxy):
+                    if reference._lazy:
+                        doc = document_type._from_son(son)
+                        if partial and doc._db_data is son:
+                            _set(doc, '_partial', partial)
+                        _set(reference, '_DocumentProxy__document', doc)
+                elif reference._lazy:
+                    reference._hydrate(son, partial)
+
+
+class BackgroundCursor(object):
+    """Reads a cursor in a worker thread for
+    :meth:`~mongoengine.queryset.QuerySet.prefetch`.
+
+    The worker reads the results in batches of `batch_size` documents and
+    hands them over through a queue holding up to `depth` batches, so the
+    server is queried for the next results while the current ones are
+    processed, with a bounded number of results held in memory.
+    """
+
+    __slots__ = ('cursor', 'batch', 'done', 'queue', 'stop', 'thread')
+
+    def __init__(self, cursor, depth, batch_size):
+        self.cursor = cursor
+        self.batch = iter(())
+        self.done = False
+        self.queue = queue.Queue(depth)
+        self.stop = threading.Event()
+        # The worker doesn't reference the BackgroundCursor, so abandoning it
+        # stops the worker
+        self.thread = threading.Thread(
+            target=_read_batches,
+            args=(cursor, batch_size, self.queue, self.stop))
+        self.thread.daemon = True
+        self.thread.start()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        while True:
+            try:
+                return next(self.batch)
+            except StopIteration:
+                if self.done:
+                    raise
+            batch = self.queue.get()
+            if isinstance(batch, list):
+                self.batch = iter(batch)
+            else:
+                # The cursor is exhausted or failed
+                self.done = True
+                if batch is not None:
+                    raise batch
+
+    def close(self, wait=False):
+        """Stops the worker, waiting for it to release the cursor if `wait`.
+        """
+        self.stop.set()
+        if wait:
+            self.thread.join()
+
+    def __del__(self):
+        self.stop.set()
+
+
+def _read_batches(cursor, batch_size, batches, stop):
+    """Puts lists of up to `batch_size` results of `cursor` on the `batches`
+    queue until the cursor is exhausted, followed by None, or the exception
+    the cursor raised. Returns early once `stop` is set.
+    """
+    def put(item):
+        while not stop.is_set():
+            try:
+                batches.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    try:
+        batch = []
+        for doc in cursor:
+            batch.append(doc)
+            if len(batch) == batch_size:
+                if not put(batch):
+                    return
+                batch = []
+            elif stop.is_set():
+                return
+        if batch and not put(batch):
+            return
+        put(None)
+    except Exception as error:
+        put(error)
@@ -1,24 +1,32 @@
 import copy
 import itertools
+import numbers
 import operator
+import os
 import pprint
 import re
 import warnings
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 
 import pymongo
-from bson import json_util
+from pymongo import InsertOne, UpdateOne
+from bson import SON, ObjectId, decode, json_util
 from bson.code import Code
 from pymongo.collection import ReturnDocument
 from pymongo.common import validate_read_preference
 from pymongo.read_concern import ReadConcern
 
-from mongoengine import signals
+from mongoengine import connection, signals
+from mongoengine.base.common import _document_registry, get_document
+from mongoengine.base.lazybson import LazyBSONDocument, raw_bson_collection
 from mongoengine.common import _import_class
 from mongoengine.context_managers import set_read_write_concern, set_write_concern
 from mongoengine.errors import InvalidQueryError, NotUniqueError, OperationError
 from mongoengine.pymongo_support import LEGACY_JSON_OPTIONS
 from mongoengine.queryset import transform
+from mongoengine.queryset.counters import CounterBuffer
 from mongoengine.queryset.field_list import QueryFieldList
+from mongoengine.queryset.prefetch import BackgroundCursor, PrefetchBatch
 from mongoengine.queryset.visitor import Q, QNode
 
 __all__ = ('QuerySet', 'DO_NOTHING', 'NULLIFY', 'CASCADE', 'DENY', 'PULL')
@@ -26,6 +34,8 @@ __all__ = ('QuerySet', 'DO_NOTHING', 'NULLIFY', 'CASCADE', 'DENY', 'PULL')
 # The maximum number of items to display in a QuerySet.__repr__
 REPR_OUTPUT_SIZE = 20
 ITER_CHUNK_SIZE = 100
+# The number of ids sampled per partition by QuerySet.partition
+PARTITION_SAMPLE_SIZE = 20
 
 # Delete rules
 DO_NOTHING = 0
@@ -61,9 +71,15 @@ class QuerySet(object):
         self._none = False
         self._as_pymongo = False
         self._as_pymongo_coerce = False
+        self._raw_bson = False
+        self._auto_prefetch = False
+        self._load_only = None
+        self._prefetch_depth = 0
+        self._background_cursor_obj = None
         self._result_cache = []
         self._has_more = True
         self._len = None
+        self._safe_references = None
 
         # If inheritance is allowed, only return instances and instances of
         # subclasses of the class being used
@@ -167,11 +183,192 @@ class QuerySet(object):
         (until the cursor is exhausted).
         """
         if self._has_more:
+            start = len(self._result_cache)
             try:
                 for i in range(ITER_CHUNK_SIZE):
                     self._result_cache.append(next(self))
             except StopIteration:
                 self._has_more = False
+            if self._safe_references is None:
+                self._safe_references = {}
+            self._load_batch(self._result_cache[start:],
+                             self._safe_references)
+
+    def _load_batch(self, batch, safe_references):
+        """Loads the references of a batch of results together. See
+        :meth:`~mongoengine.dereference.DeReference.resolve_safe_references`
+        for `safe_references`.
+        """
+        if self._scalar or self._as_pymongo:
+            return
+        # Check the safe references of the batch together instead of
+        # fetching each one when it's accessed
+        self._dereference.resolve_safe_references(
+            batch, safe_references, self._load_only)
+        if self._auto_prefetch:
+            PrefetchBatch(batch, self._load_only)
+
+    def iterator(self, chunk_size=None):
+        """Iterates over the results without caching them, so scanning a
+        large collection runs in constant memory. The queryset itself isn't
+        evaluated and ``scalar``, ``as_pymongo`` and ``batch_size`` are
+        honoured.
+
+        :param chunk_size: the number of results whose references are loaded
+            together, ``ITER_CHUNK_SIZE`` by default. Also used as the
+            cursor's batch size if :meth:`batch_size` wasn't set.
+        """
+        queryset = self.clone()
+        if chunk_size is None:
+            chunk_size = ITER_CHUNK_SIZE
+        elif queryset._batch_size is None:
+            queryset = queryset.batch_size(chunk_size)
+        return queryset._iter_chunks(chunk_size)
+
+    def partition(self, n, method='sample'):
+        """Splits the queryset into up to `n` querysets matching
+        non-overlapping ranges of ``_id``, e.g. to scan a collection in
+        parallel with :meth:`parallel_map`. The first and last ranges are
+        open ended, so together the partitions match the same documents as
+        the queryset.
+
+        :param n: the number of partitions
+        :param method: how the range boundaries are chosen: ``'sample'``
+            splits a ``$sample`` of the matching ids in equal parts,
+            ``'interpolate'`` splits the range between the smallest and
+            largest matching ids evenly, which only takes two queries but
+            requires ObjectId or numeric ids
+        """
+        if n < 1:
+            raise ValueError('The number of partitions must be positive')
+        if self._limit is not None or self._skip:
+            raise InvalidQueryError("Can't partition a queryset with a limit "
+                                    "or skip")
+        if n == 1 or self._none:
+            return [self.clone()]
+
+        partitions = []
+        lower = None
+        for upper in self._partition_bounds(n, method) + [None]:
+            bounds = {}
+            if lower is not None:
+                bounds['pk__gte'] = lower
+            if upper is not None:
+                bounds['pk__lt'] = upper
+            partitions.append(self.filter(**bounds))
+            lower = upper
+        return partitions
+
+    def _partition_bounds(self, n, method):
+        """Returns the sorted ids splitting the results in `n` ranges, see
+        :meth:`partition`.
+        """
+        collection = self._collection
+        if method == 'sample':
+            pipeline = [
+                {'$match': self._query},
+                {'$sample': {'size': n * PARTITION_SAMPLE_SIZE}},
+                {'$project': {'_id': 1}},
+            ]
+            ids = sorted(set(son['_id'] for son in
+                             collection.aggregate(pipeline)))
+            if not ids:
+                return []
+            bounds = [ids[len(ids) * i // n] for i in range(1, n)]
+        elif method == 'interpolate':
+            first = collection.find_one(self._query, {'_id': 1},
+                                        sort=[('_id', 1)])
+            if first is None:
+                return []
+            last = collection.find_one(self._query, {'_id': 1},
+                                       sort=[('_id', -1)])
+            lowest, highest = first['_id'], last['_id']
+            if isinstance(lowest, ObjectId) and isinstance(highest, ObjectId):
+                # Split the range of creation times
+                start = int(str(lowest)[:8], 16)
+                end = int(str(highest)[:8], 16) + 1
+                bounds = [ObjectId('%08x' % (start + (end - start) * i // n) +
+                                   '0' * 16) for i in range(1, n)]
+            elif (isinstance(lowest, numbers.Real) and
+                    isinstance(highest, numbers.Real)):
+                step = (highest - lowest) / float(n)
+                bounds = [lowest + step * i for i in range(1, n)]
+            else:
+                raise InvalidQueryError("Can't interpolate ids of type %s" %
+                                        type(lowest).__name__)
+        else:
+            raise ValueError('Unknown partition method %r' % method)
+        return sorted(set(bounds))
+
+    def parallel_map(self, func, workers=None, executor='thread',
+                     method='sample'):
+        """Calls `func` with each result of the queryset and returns the list
+        of the values it returned. The queryset is split with
+        :meth:`partition` and the partitions are scanned concurrently with
+        :meth:`iterator`. The values are in the order of the partitions,
+        i.e. of ``_id`` ranges, and in the queryset's order within them.
+
+        With the ``'process'`` executor, `func` and the values it returns
+        must be picklable and the document class must be importable by the
+        worker processes, which connect to the database again.
+
+        :param func: the function to call with each result
+        :param workers: the number of partitions and of threads or processes,
+            the number of CPUs by default
+        :param executor: ``'thread'`` or ``'process'``
+        :param method: the partition method, see :meth:`partition`
+        """
+        if workers is None:
+            workers = os.cpu_count() or 1
+        partitions = self.partition(workers, method)
+        if executor == 'thread':
+            pool = ThreadPoolExecutor(workers)
+            jobs = [pool.submit(_map_results, func, partition)
+                    for partition in partitions]
+        elif executor == 'process':
+            pool = ProcessPoolExecutor(
+                workers, initializer=_reset_connections,
+                initargs=(dict(connection._connection_settings),))
+            jobs = [pool.submit(_map_partition, func,
+                                partition._partition_spec())
+                    for partition in partitions]
+        else:
+            raise ValueError('Unknown executor %r' % executor)
+        with pool:
+            results = []
+            for job in jobs:
+                results.extend(job.result())
+        return results
+
+    def _partition_spec(self):
+        """Returns the picklable state :func:`_map_partition` rebuilds the
+        queryset from in a worker process.
+        """
+        props = dict((prop, getattr(self, prop)) for prop in (
+            '_loaded_fields', '_ordering', '_timeout', '_read_preference',
+            '_read_concern', '_scalar', '_as_pymongo', '_as_pymongo_coerce',
+            '_raw_bson', '_hint', '_batch_size', '_auto_dereference',
+            '_load_only'))
+        return (type(self), self._document._class_name, self._query, props)
+
+    def _iter_chunks(self, chunk_size):
+        """A generator for :meth:`iterator`, reading `chunk_size` results at
+        a time from the cursor.
+        """
+        while True:
+            chunk = []
+            try:
+                for i in range(chunk_size):
+                    chunk.append(next(self))
+            except StopIteration:
+                if not chunk:
+                    return
+            # References are only shared within a chunk
+            self._load_batch(chunk, {})
+            for result in chunk:
+                yield result
+            if len(chunk) < chunk_size:
+                return
 
     def __getitem__(self, key):
         """Support skip and limit using getitem and slicing syntax.
@@ -202,12 +399,10 @@ class QuerySet(object):
         elif isinstance(key, int):
             if queryset._scalar:
                 return queryset._get_scalar(
-                    queryset._document._from_son(queryset._cursor[key],
-                                                 _auto_dereference=self._auto_dereference))
+                    queryset._from_son(queryset._son(queryset._cursor[key])))
             if queryset._as_pymongo:
-                return queryset._get_as_pymongo(next(queryset._cursor))
-            return queryset._document._from_son(queryset._cursor[key],
-                                                _auto_dereference=self._auto_dereference)
+                return queryset._get_as_pymongo(queryset._son(next(queryset._cursor)))
+            return queryset._from_son(queryset._son(queryset._cursor[key]))
         raise AttributeError
 
     def __repr__(self):
@@ -326,7 +521,8 @@ class QuerySet(object):
         return result
 
     def insert(self, doc_or_docs, load_bulk=True, write_concern=None,
-               signal_kwargs=None):
+               signal_kwargs=None, batch_size=None, ordered=True,
+               reload=False):
         """bulk insert documents
 
         :param docs_or_doc: a document or list of documents to be inserted
@@ -335,9 +531,16 @@ class QuerySet(object):
         :param write_concern: Write concern of this operation.
         :parm signal_kwargs: (optional) kwargs dictionary to be passed to
             the signal calls.
+        :param batch_size: (optional) the number of documents inserted per
+            request, all of them by default
+        :param ordered: (optional) whether the documents are inserted in
+            order, stopping at the first error
+        :param reload: (optional) return the documents read back from the
+            database instead of the inserted instances
 
         By default returns document instances, set ``load_bulk`` to False to
-        return just ``ObjectIds``
+        return just ``ObjectIds``. The inserted instances are marked as saved
+        like :meth:`~mongoengine.Document.save` does.
 
         .. versionadded:: 0.5
         """
@@ -351,6 +554,8 @@ class QuerySet(object):
         if isinstance(docs, Document) or issubclass(docs.__class__, Document):
             return_one = True
             docs = [docs]
+        else:
+            docs = list(docs)
 
         for doc in docs:
             if not isinstance(doc, self._document):
@@ -366,16 +571,41 @@ class QuerySet(object):
                                      documents=docs, **signal_kwargs)
 
         raw = [doc.to_mongo() for doc in docs]
+        if not batch_size:
+            batch_size = max(len(raw), 1)
 
         with set_write_concern(self._collection, write_concern) as collection:
-            insert_func = collection.insert_many
-            if return_one:
-                raw = raw[0]
-                insert_func = collection.insert_one
+            ids = []
+            for start in range(0, len(raw), batch_size):
+                batch = raw[start:start + batch_size]
+                ids.extend(self._insert_batch(collection, batch, return_one,
+                                              ordered))
+                # Insert functions set the generated ids on the SON
+                for doc, son in zip(docs[start:start + batch_size], batch):
+                    doc._mark_inserted(son, son['_id'])
+                    doc._clear_changed_fields()
+
+        if not load_bulk:
+            signals.post_bulk_insert.send(
+                self._document, documents=docs, loaded=False)
+            return return_one and ids[0] or ids
 
+        if reload:
+            documents = self.in_bulk(ids)
+            results = [documents.get(obj_id) for obj_id in ids]
+        else:
+            results = list(docs)
+        signals.post_bulk_insert.send(
+            self._document, documents=results, loaded=True, **signal_kwargs)
+        return results[0] if return_one else results
+
+    def _insert_batch(self, collection, raw, return_one, ordered):
+        """Inserts the SON of a batch of :meth:`insert`, returning the ids.
+        """
         try:
-            inserted_result = insert_func(raw)
-            ids = [inserted_result.inserted_id] if return_one else inserted_result.inserted_ids
+            if return_one:
+                return [collection.insert_one(raw[0]).inserted_id]
+            return collection.insert_many(raw, ordered=ordered).inserted_ids
         except pymongo.errors.DuplicateKeyError as err:
             message = 'Could not save document (%s)'
             raise NotUniqueError(message % str(err))
@@ -393,20 +623,109 @@ class QuerySet(object):
                 raise NotUniqueError(message % str(err))
             raise OperationError(message % str(err))
 
-        # Apply inserted_ids to documents
-        for doc, doc_id in zip(docs, ids):
-            doc.pk = doc_id
+    def bulk_save(self, docs, ordered=False, batch_size=1000,
+                  validate='changed', clean=True, write_concern=None,
+                  full=False):
+        """Saves documents with one ``bulk_write`` per batch, inserting new
+        documents and updating the changed fields of existing ones like
+        :meth:`~mongoengine.Document.save` does. The ``pre_save`` signals
+        of a batch are sent before its write and the ``post_save`` signals
+        after it. Cascading saves aren't supported.
+
+        If some writes fail, the documents that were written are still
+        marked as saved and sent ``post_save`` before :class:`~mongoengine.NotUniqueError` or
+        :class:`~mongoengine.OperationError` is raised.
+
+        :param docs: the documents to save
+        :param ordered: whether the writes of a batch are applied in order,
+            stopping at the first error
+        :param batch_size: the number of documents written per request
+        :param validate: see :meth:`~mongoengine.Document.save`
+        :param clean: see :meth:`~mongoengine.Document.save`
+        :param write_concern: write concern of the writes
+        :param full: save all fields instead of only the changed ones
+        """
+        docs = list(docs)
+        for doc in docs:
+            if not isinstance(doc, self._document):
+                msg = ("Some documents saved aren't instances of %s"
+                       % str(self._document))
+                raise OperationError(msg)
 
-        if not load_bulk:
-            signals.post_bulk_insert.send(
-                self._document, documents=docs, loaded=False)
-            return return_one and ids[0] or ids
+        if write_concern is None:
+            write_concern = {}
 
-        documents = self.in_bulk(ids)
-        results = [documents.get(obj_id) for obj_id in ids]
-        signals.post_bulk_insert.send(
-            self._document, documents=results, loaded=True, **signal_kwargs)
-        return results[0] if return_one else results
+        with set_write_concern(self._collection, write_concern) as collection:
+            for start in range(0, len(docs), batch_size):
+                batch = docs[start:start + batch_size]
+                self._bulk_save_batch(collection, batch, ordered, validate,
+                                      clean, full)
+        return docs
+
+    def _bulk_save_batch(self, collection, docs, ordered, validate, clean,
+                         full):
+        """Saves a batch of :meth:`bulk_save`."""
+        for doc in docs:
+            signals.pre_save.send(doc.__class__, document=doc)
+            doc._validate_for_save(validate, clean, full)
+
+        requests = []
+        # The documents with the index of their request, if any, and the SON
+        # of new documents
+        pending = []
+        for doc in docs:
+            if doc._created:
+                update_query = doc._save_update(full)
+                if update_query:
+                    pending.append((doc, len(requests), None))
+                    requests.append(UpdateOne(doc._db_object_key,
+                                              update_query))
+                else:
+                    pending.append((doc, None, None))
+            else:
+                son = doc.to_mongo()
+                pending.append((doc, len(requests), son))
+                requests.append(InsertOne(son))
+
+        failed = ()
+        error = None
+        if requests:
+            try:
+                collection.bulk_write(requests, ordered=ordered)
+            except pymongo.errors.BulkWriteError as err:
+                error = err
+                indexes = [write_error['index']
+                           for write_error in err.details['writeErrors']]
+                if ordered and indexes:
+                    # Writes after the first error weren't attempted
+                    failed = set(range(min(indexes), len(requests)))
+                else:
+                    failed = set(indexes)
+            except pymongo.errors.OperationFailure as err:
+                raise OperationError('Could not save documents (%s)' % err)
+
+        saved = []
+        for doc, index, son in pending:
+            if index in failed:
+                continue
+            if son is not None:
+                # bulk_write sets the generated ids on the inserted SON
+                doc._mark_inserted(son, son['_id'])
+            doc._clear_changed_fields()
+            saved.append((doc, son is not None))
+
+        # Documents saved before a failure are sent post_save too
+        for doc, created in saved:
+            signals.post_save.send(doc.__class__, document=doc,
+                                   created=created)
+
+        if error is not None:
+            message = 'Could not save documents (%s)'
+            if any(write_error.get('code') in (11000, 11001)
+                   for write_error in error.details['writeErrors']):
+                message = 'Tried to save duplicate unique keys (%s)'
+                raise NotUniqueError(message % str(error))
+            raise OperationError(message % str(error))
 
     def count(self, with_limit_and_skip=True):
         """Count the selected elements in the query.
@@ -524,16 +843,7 @@ class QuerySet(object):
             write_concern = {}
 
         queryset = self.clone()
-        query = queryset._query
-        update = transform.update(queryset._document, **update)
-
-        # If doing an atomic upsert on an inheritable class
-        # then ensure we add _cls to the update operation
-        if upsert and '_cls' in query:
-            if '$set' in update:
-                update["$set"]["_cls"] = queryset._document._class_name
-            else:
-                update["$set"] = {"_cls": queryset._document._class_name}
+        query, update = queryset._update_spec(update, upsert)
         try:
             with set_read_write_concern(
                 queryset._collection, write_concern, read_concern
@@ -552,6 +862,22 @@ class QuerySet(object):
                 raise OperationError(message)
             raise OperationError('Update failed (%s)' % str(err))
 
+    def _update_spec(self, update, upsert=False):
+        """Returns the query and the update document of an update of the
+        matched documents with the Django-style `update` keyword arguments.
+        """
+        query = self._query
+        update = transform.update(self._document, **update)
+
+        # If doing an atomic upsert on an inheritable class
+        # then ensure we add _cls to the update operation
+        if upsert and '_cls' in query:
+            if '$set' in update:
+                update["$set"]["_cls"] = self._document._class_name
+            else:
+                update["$set"] = {"_cls": self._document._class_name}
+        return query, update
+
     def update_one(self, upsert=False, write_concern=None, **update):
         """Perform an atomic update on first field matched by the query.
 
@@ -573,6 +899,24 @@ class QuerySet(object):
             **update
         )
 
+    def counter_buffer(self, max_size=1000, max_delay=1.0, upsert=False,
+                       flush_on_exit=True):
+        """Returns a :class:`~mongoengine.queryset.counters.CounterBuffer`
+        summing ``inc__`` updates of documents matched by the queryset in
+        process, to write them with one ``bulk_write``.
+
+        :param max_size: the number of distinct queries pending that
+            triggers a write
+        :param max_delay: the age in seconds of the oldest pending increment
+            that triggers a write, from a timer thread if no other increment
+            is buffered; None to only write on `max_size` and :meth:`flush`
+        :param upsert: insert documents that don't match the queries
+        :param flush_on_exit: write pending increments when the interpreter
+            exits
+        """
+        return CounterBuffer(self.clone(), max_size, max_delay, upsert,
+                             flush_on_exit)
+
     def modify(self, upsert=False, full_response=False, remove=False, new=False, **update):
         """Update and return the updated document.
 
@@ -632,10 +976,10 @@ class QuerySet(object):
 
         if full_response:
             if result["value"] is not None:
-                result["value"] = self._document._from_son(result["value"])
+                result["value"] = self._from_son(result["value"])
         else:
             if result is not None:
-                result = self._document._from_son(result)
+                result = self._from_son(result)
 
         return result
 
@@ -669,14 +1013,13 @@ class QuerySet(object):
                                      **self._cursor_args)
         if self._scalar:
             for doc in docs:
-                doc_map[doc['_id']] = self._get_scalar(
-                    self._document._from_son(doc))
+                doc_map[doc['_id']] = self._get_scalar(self._from_son(doc))
         elif self._as_pymongo:
             for doc in docs:
                 doc_map[doc['_id']] = self._get_as_pymongo(doc)
         else:
             for doc in docs:
-                doc_map[doc['_id']] = self._document._from_son(doc)
+                doc_map[doc['_id']] = self._from_son(doc)
 
         return doc_map
 
@@ -735,8 +1078,9 @@ class QuerySet(object):
             '_mongo_query', '_initial_query', '_none', '_query_obj',
             '_loaded_fields', '_ordering', '_timeout',
             '_class_check', '_read_preference', '_iter', '_scalar',
-            '_as_pymongo', '_as_pymongo_coerce', '_limit', '_skip', '_hint',
-            '_batch_size', '_auto_dereference'
+            '_as_pymongo', '_as_pymongo_coerce', '_raw_bson',
+            '_auto_prefetch', '_load_only', '_prefetch_depth', '_limit',
+            '_skip', '_hint', '_batch_size', '_auto_dereference'
         )
 
         for prop in copy_props:
@@ -748,17 +1092,106 @@ class QuerySet(object):
 
         return c
 
-    def select_related(self, max_depth=1):
+    def select_related(self, max_depth=1, strategy='queries', fields=None):
         """Handles dereferencing of :class:`~bson.dbref.DBRef` objects or
         :class:`~bson.object_id.ObjectId` a maximum depth in order to cut down
         the number queries to mongodb.
 
+        With the default `strategy` of ``'queries'``, the references of the
+        results are fetched with one query per referenced collection and
+        depth level. With ``'lookup'``, the query runs as an aggregation
+        joining the referenced documents with ``$lookup`` stages, so the
+        results and their references are loaded in one round trip. Deeper
+        levels are fetched with queries. The aggregation honours the read
+        preference, read concern, hint and batch size of the queryset, and
+        can't be combined with :meth:`as_pymongo` or a disabled timeout.
+
+        :param max_depth: the number of levels of references to fetch
+        :param strategy: ``'queries'`` or ``'lookup'``
+        :param fields: the names of the reference fields to look up with the
+            ``'lookup'`` strategy, all ``ReferenceField`` fields and lists of
+            them by default. Fields storing references as ``DBRef`` or
+            referencing documents of another database can't be looked up,
+            they're left out by default and raise ``InvalidQueryError`` when
+            named. Joined documents only have the fields to load of the
+            field's `load_only` option or of :meth:`load_only`.
+
         .. versionadded:: 0.5
         """
-        # Make select related work the same for querysets
-        max_depth += 1
         queryset = self.clone()
-        return queryset._dereference(queryset, max_depth=max_depth)
+        if strategy == 'lookup':
+            return queryset._select_related_lookup(max_depth, fields)
+        elif strategy != 'queries':
+            raise ValueError('Unknown select_related strategy %r' % strategy)
+        return queryset._dereference(queryset, max_depth=max_depth,
+                                     load_only=queryset._load_only)
+
+    def _select_related_lookup(self, max_depth, fields):
+        """Loads the results with an aggregation pipeline joining the
+        documents referenced by `fields`, see :meth:`select_related`.
+        """
+        if self._as_pymongo:
+            raise InvalidQueryError("Can't look up references of results "
+                                    "loaded with as_pymongo()")
+        if not self._timeout:
+            raise InvalidQueryError("Can't disable the cursor timeout of "
+                                    "a $lookup aggregation")
+        if self._limit == 0 or self._none:
+            return []
+        dereference = self._dereference
+        stages, joins = dereference.lookup_stages(self._document, fields,
+                                                  self._load_only)
+
+        pipeline = [{'$match': self._query}]
+        ordering = self._ordering
+        if ordering is None and self._document._meta['ordering']:
+            ordering = self._get_order_by(self._document._meta['ordering'])
+        if ordering:
+            pipeline.append({'$sort': SON(ordering)})
+        if self._skip:
+            pipeline.append({'$skip': self._skip})
+        if self._limit is not None:
+            pipeline.append({'$limit': self._limit})
+        if self._loaded_fields:
+            projection = self._loaded_fields.as_dict()
+            for key, value in projection.items():
+                if isinstance(value, dict) and '$slice' in value:
+                    value = value['$slice']
+                    if not isinstance(value, list):
+                        value = [value]
+                    projection[key] = {'$slice': ['$' + key] + value}
+            pipeline.append({'$project': projection})
+        pipeline.extend(stages)
+
+        # Read with the same options as the cursor of the queryset
+        collection = self._collection
+        if self._read_preference is not None or self._read_concern is not None:
+            collection = collection.with_options(
+                read_preference=self._read_preference,
+                read_concern=self._read_concern)
+        aggregate_args = {}
+        if self._hint not in (-1, None):
+            hint = self._hint
+            # Index specs given as (key, direction) pairs
+            if isinstance(hint, list):
+                hint = SON(hint)
+            aggregate_args['hint'] = hint
+        if self._batch_size is not None:
+            aggregate_args['batchSize'] = self._batch_size
+
+        docs = []
+        referenced = []
+        for son in collection.aggregate(pipeline, **aggregate_args):
+            joined = dict((alias, son.pop(alias, None))
+                          for _, _, _, _, _, alias in joins)
+            doc = self._from_son(son)
+            referenced.extend(dereference.attach_joined(doc, joined, joins))
+            docs.append(doc)
+        if max_depth > 1:
+            dereference(referenced, max_depth=max_depth - 1)
+        if self._scalar:
+            return [self._get_scalar(doc) for doc in docs]
+        return docs
 
     def limit(self, n):
         """Limit the number of returned documents to `n`. This may also be
@@ -1034,6 +1467,68 @@ class QuerySet(object):
         queryset._as_pymongo_coerce = coerce_types
         return queryset
 
+    def raw_bson(self, enabled=True):
+        """Read results as raw BSON and only decode the fields that are
+        accessed on the returned documents. Lookups scan the raw bytes up to
+        the requested element, so this pays off for large documents or
+        documents with big nested values of which only a few fields are
+        read. Plain values are still decoded in full by
+        :meth:`as_pymongo`.
+
+        :param enabled: whether or not to read raw BSON
+        """
+        queryset = self.clone()
+        queryset._raw_bson = enabled
+        queryset._cursor_obj = None
+        return queryset
+
+    def auto_prefetch(self, enabled=True):
+        """Fetch lazy references in batches while iterating. Reading the
+        first lazy reference of a field fetches the references of that field
+        of all documents in the same batch of results (up to 100 documents)
+        with a single query, instead of one query per document.
+
+        :param enabled: whether or not to prefetch references
+        """
+        queryset = self.clone()
+        queryset._auto_prefetch = enabled
+        return queryset
+
+    def prefetch(self, depth=1):
+        """Read the results ahead in a worker thread while iterating, so the
+        next batch of results is fetched from the server while the current
+        one is decoded and processed. Up to `depth` batches of
+        :meth:`batch_size` results (``ITER_CHUNK_SIZE`` by default) are read
+        ahead.
+
+        :param depth: the number of batches to read ahead, or 0 to read the
+            results on demand
+        """
+        if depth < 0:
+            raise ValueError('The prefetch depth must not be negative')
+        queryset = self.clone()
+        queryset._prefetch_depth = depth
+        return queryset
+
+    def load_only(self, **fields):
+        """Overrides the `load_only` option of reference fields for the
+        references the queryset fetches with :meth:`select_related`,
+        :meth:`auto_prefetch` and safe reference checks. The referenced
+        documents are loaded with the given fields only and fetch the rest
+        when they're accessed. ::
+
+            Post.objects.load_only(author=('name', 'email')).select_related()
+
+        :param fields: reference field names mapped to the names of the
+            fields to load, or to None to load whole documents
+        """
+        queryset = self.clone()
+        load_only = dict(queryset._load_only or {})
+        for name, names in fields.items():
+            load_only[name] = tuple(names) if names else None
+        queryset._load_only = load_only
+        return queryset
+
     # JSON Helpers
 
     def to_json(self, json_options=None):
@@ -1093,11 +1588,14 @@ class QuerySet(object):
         if self._limit == 0 or self._none:
             raise StopIteration
 
-        raw_doc = next(self._cursor)
+        if self._prefetch_depth:
+            raw_doc = self._son(next(self._background_cursor))
+        else:
+            raw_doc = self._son(next(self._cursor))
         if self._as_pymongo:
             return self._get_as_pymongo(raw_doc)
 
-        doc = self._document._from_son(raw_doc)
+        doc = self._from_son(raw_doc)
         if self._scalar:
             return self._get_scalar(doc)
 
@@ -1109,6 +1607,9 @@ class QuerySet(object):
         .. versionadded:: 0.3
         """
         self._iter = False
+        if self._background_cursor_obj is not None:
+            self._background_cursor_obj.close(wait=True)
+            self._background_cursor_obj = None
         self._cursor.rewind()
 
     # Properties
@@ -1129,6 +1630,42 @@ class QuerySet(object):
             cursor_args['projection'] = self._loaded_fields.as_dict()
         return cursor_args
 
+    def _from_son(self, son):
+        """Returns the document for a query result. Documents loaded with a
+        projection bypass the identity map, see
+        :class:`~mongoengine.context_managers.identity_map`.
+        """
+        loaded_fields = self._loaded_fields
+        return self._document._from_son(
+            son, _auto_dereference=self._auto_dereference,
+            _identity=not (loaded_fields or loaded_fields.slice))
+
+    def _son(self, raw_doc):
+        """Wrap a document returned by a raw BSON cursor for lazy decoding.
+        """
+        if not self._raw_bson:
+            return raw_doc
+        codec_options = self._collection.codec_options
+        if self._as_pymongo:
+            return decode(raw_doc.raw, codec_options)
+        return LazyBSONDocument(raw_doc.raw, codec_options)
+
+    @property
+    def _background_cursor(self):
+        """The :class:`BackgroundCursor` reading the cursor ahead, see
+        :meth:`prefetch`.
+        """
+        background = self._background_cursor_obj
+        cursor = self._cursor
+        if background is None or background.cursor is not cursor:
+            if background is not None:
+                background.close()
+            background = BackgroundCursor(
+                cursor, self._prefetch_depth,
+                self._batch_size or ITER_CHUNK_SIZE)
+            self._background_cursor_obj = background
+        return background
+
     @property
     def _cursor(self):
         if self._cursor_obj is None:
@@ -1138,15 +1675,15 @@ class QuerySet(object):
             # level, not a cursor level. Thus, if read preference is defined,
             # we need to get a cloned collection object using `with_options`
             # first.
+            collection = self._collection
             if self._read_preference is not None or self._read_concern is not None:
-                self._cursor_obj = (
-                    self._collection
-                        .with_options(read_preference=self._read_preference, read_concern=self._read_concern)
-                        .find(self._query, **self._cursor_args)
-                )
-            else:
-                self._cursor_obj = self._collection.find(self._query,
-                                                         **self._cursor_args)
+                collection = collection.with_options(
+                    read_preference=self._read_preference,
+                    read_concern=self._read_concern)
+            if self._raw_bson:
+                collection = raw_bson_collection(collection)
+            self._cursor_obj = collection.find(self._query,
+                                               **self._cursor_args)
 
             if self._ordering:
                 # Apply query ordering
@@ -1177,23 +1714,24 @@ class QuerySet(object):
     @property
     def _query(self):
         if self._mongo_query is None:
-            self._mongo_query = self._query_obj.to_query(self._document)
+            mongo_query = self._query_obj.to_query(self._document)
             if self._class_check:
-                self._mongo_query.update(self._initial_query)
-
-        # Simplify a { '$and': [...], ... } query if possible.
-        if '$and' in self._mongo_query:
-            parent_keys_set = set(self._mongo_query.keys()) - set(['$and'])
-            children_keys = [key for child in self._mongo_query['$and'] for key in list(child.keys())]
-
-            # We can simplify if there are no collisions between the keys, i.e.
-            # no duplicates in children_keys and no intersection between the
-            # children and parent keys.
-            if len(parent_keys_set | set(children_keys)) == len(list(parent_keys_set) + children_keys):
-                # OK to simplify.
-                and_query = self._mongo_query.pop('$and')
-                for child in and_query:
-                    self._mongo_query.update(child)
+                mongo_query.update(self._initial_query)
+
+            # Simplify a { '$and': [...], ... } query if possible, once.
+            if '$and' in mongo_query:
+                parent_keys_set = set(mongo_query.keys()) - set(['$and'])
+                children_keys = [key for child in mongo_query['$and'] for key in list(child.keys())]
+
+                # We can simplify if there are no collisions between the keys, i.e.
+                # no duplicates in children_keys and no intersection between the
+                # children and parent keys.
+                if len(parent_keys_set | set(children_keys)) == len(list(parent_keys_set) + children_keys):
+                    # OK to simplify.
+                    and_query = mongo_query.pop('$and')
+                    for child in and_query:
+                        mongo_query.update(child)
+            self._mongo_query = mongo_query
         return self._mongo_query
 
     @property
@@ -1349,3 +1887,36 @@ class QuerySet(object):
                "Use Doc.ensure_indexes() instead.")
         warnings.warn(msg, DeprecationWarning)
         self._document.__class__.ensure_indexes()
+
+
+def _map_results(func, queryset):
+    """Calls `func` with each result of `queryset`, see
+    :meth:`QuerySet.parallel_map`.
+    """
+    return [func(result) for result in queryset.iterator()]
+
+
+def _map_partition(func, spec):
+    """Rebuilds a queryset from :meth:`QuerySet._partition_spec` in a worker
+    process and maps `func` over its results.
+    """
+    queryset_class, class_name, query, props = spec
+    document = get_document(class_name)
+    queryset = queryset_class(document, document._get_collection())
+    queryset._mongo_query = query
+    for prop, value in props.items():
+        setattr(queryset, prop, value)
+    return _map_results(func, queryset)
+
+
+def _reset_connections(connection_settings):
+    """Initializes a worker process of :meth:`QuerySet.parallel_map`.
+    Connections inherited from the parent process are dropped without
+    closing them, since they're still used by the parent.
+    """
+    connection._connections.clear()
+    connection._dbs.clear()
+    connection._connection_settings.update(connection_settings)
+    for document in _document_registry.values():
+        if document.__dict__.get('_collection') is not None:
+            document._collection = None
@@ -26,15 +26,39 @@ MATCH_OPERATORS      = (COMPARISON_OPERATORS + GEO_OPERATORS +
 UPDATE_OPERATORS     = ('set', 'unset', 'inc', 'dec', 'pop', 'push',
                         'pull', 'pull_all', 'add_to_set', 'set_on_insert')
 
-
-def query(_doc_cls=None, _field_operation=False, **query):
-    """Transform a query from Django-style format to Mongo format.
+# The number of query shapes whose compilation plan is cached per document
+# class
+QUERY_PLAN_CACHE_SIZE = 1024
+
+# Plans of queries without a document class
+_plans = {}
+
+
+def _query_plan(_doc_cls, keys):
+    """Returns how the sorted `keys` of a query on `_doc_cls` compile, as
+    ``(key, mongo key, field, operator, negate)`` tuples. The field converts
+    the values and is None without a document class. The mongo key of
+    ``__raw__`` is None. Plans are cached with the field paths of the class,
+    so a cached plan costs a version check and a dict lookup, and plans are
+    dropped along with the paths when fields change or a class is
+    registered.
     """
-    mongo_query = {}
-    merge_query = defaultdict(list)
-    for key, value in sorted(query.items()):
+    plans = _doc_cls._field_path_cache().plans if _doc_cls else _plans
+    plan = plans.get(keys)
+    if plan is None:
+        plan = _build_query_plan(_doc_cls, keys)
+        if len(plans) >= QUERY_PLAN_CACHE_SIZE:
+            plans.clear()
+        plans[keys] = plan
+    return plan
+
+
+def _build_query_plan(_doc_cls, keys):
+    """Compiles the plan returned by :func:`_query_plan`."""
+    plan = []
+    for key in keys:
         if key == "__raw__":
-            mongo_query.update(value)
+            plan.append((key, None, None, None, False))
             continue
 
         parts = key.split('__')
@@ -50,6 +74,7 @@ def query(_doc_cls=None, _field_operation=False, **query):
             parts.pop()
             negate = True
 
+        field = None
         if _doc_cls:
             # Switch field names to proper names [set in Field(name='foo')]
             try:
@@ -69,9 +94,37 @@ def query(_doc_cls=None, _field_operation=False, **query):
                 if append_field:
                     cleaned_fields.append(field)
 
-            # Convert value to proper value
             field = cleaned_fields[-1]
 
+            reference = getattr(field, 'field', None) or field
+            if getattr(reference, 'store_cls', False):
+                ReferenceField = _import_class('ReferenceField')
+                if op in ReferenceField.id_operators:
+                    # Match the id of references stored with their class
+                    parts.append('_id')
+
+        for i, part in indices:
+            parts.insert(i, part)
+        plan.append((key, '.'.join(parts), field, op, negate))
+    return tuple(plan)
+
+
+def query(_doc_cls=None, _field_operation=False, **query):
+    """Transform a query from Django-style format to Mongo format. The
+    compilation plan of each query shape, i.e. document class and keys, is
+    cached and the values are converted on each call.
+    """
+    mongo_query = {}
+    merge_query = defaultdict(list)
+    for key, mongo_key, field, op, negate in _query_plan(
+            _doc_cls, tuple(sorted(query))):
+        value = query[key]
+        if mongo_key is None:
+            mongo_query.update(value)
+            continue
+
+        if _doc_cls:
+            # Convert value to proper value
             singular_ops = [None, 'ne', 'gt', 'gte', 'lt', 'lte', 'not']
             singular_ops += STRING_OPERATORS
             if op in singular_ops:
@@ -104,13 +157,13 @@ def query(_doc_cls=None, _field_operation=False, **query):
         if negate:
             value = {'$not': value}
 
-        for i, part in indices:
-            parts.insert(i, part)
-        key = '.'.join(parts)
+        key = mongo_key
         if op is None or key not in mongo_query:
             mongo_query[key] = value
         elif key in mongo_query:
             if key in mongo_query and isinstance(mongo_query[key], dict):
+                # Don't modify the caller's value, e.g. a __raw__ query
+                mongo_query[key] = dict(mongo_query[key])
                 mongo_query[key].update(value)
                 # $maxDistance needs to come last - convert to SON
                 if '$maxDistance' in mongo_query[key]:
@@ -65,7 +65,7 @@ setup(name='mongoengine',
       long_description=LONG_DESCRIPTION,
       platforms=['any'],
       classifiers=CLASSIFIERS,
-      install_requires=['pymongo>=3.7,<5.0'],
+      install_requires=['pymongo>=3.9,<5.0'],
       test_suite='nose.collector',
       **extra_opts
 )
@@ -42,6 +42,46 @@ class ClassMethodsTest(unittest.TestCase):
                         sorted([x.__class__.__name__ for x in
                                 list(self.Person._fields.values())]))
 
+    def test_lookup_field_cache(self):
+        """Ensure resolved field paths are cached until the fields of the
+        class change.
+        """
+        class Address(EmbeddedDocument):
+            city = StringField(db_field='c')
+
+        class Person(Document):
+            name = StringField(db_field='n')
+            address = EmbeddedDocumentField('Address')
+
+        fields = Person._lookup_field(['address', 'city'])
+        self.assertEqual([field.db_field for field in fields],
+                         ['address', 'c'])
+        cache = Person._field_path_cache()
+        self.assertTrue(Person._lookup_field(['address', 'city'])[1]
+                        is fields[1])
+        self.assertEqual(Person._translate_field_name('address.city'),
+                         'address.c')
+        self.assertTrue(Person._field_path_cache() is cache)
+        self.assertRaises(LookUpError, Person._lookup_field, ['title'])
+
+        # Changed fields invalidate the cache
+        title = StringField(db_field='t')
+        title.name = 'title'
+        Person._fields['title'] = title
+        self.assertEqual(Person._translate_field_name('title'), 't')
+        self.assertFalse(Person._field_path_cache() is cache)
+        self.assertEqual(Person.objects(title='x')._query, {'t': 'x'})
+
+        # Fields replaced in place invalidate the cache and query plans too
+        self.assertEqual(Person.objects(name='a')._query, {'n': 'a'})
+        cache = Person._field_path_cache()
+        name = StringField(db_field='x')
+        name.name = 'name'
+        Person._fields['name'] = name
+        self.assertEqual(Person._translate_field_name('name'), 'x')
+        self.assertFalse(Person._field_path_cache() is cache)
+        self.assertEqual(Person.objects(name='a')._query, {'x': 'a'})
+
     def test_get_db(self):
         """Ensure that get_db returns the expected db.
         """
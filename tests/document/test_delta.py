@@ -608,6 +608,215 @@ class DeltaTest(unittest.TestCase):
         self.assertEqual(doc._delta(), ({},
             {'db_embedded_field.db_list_field.2.db_list_field': 1}))
 
+    def test_delta_dirty_embedded_documents(self):
+        """Ensure embedded documents report their changes to the owning
+        document, including ones that were added or moved since loading.
+        """
+        class Comment(EmbeddedDocument):
+            text = StringField()
+
+        class Post(Document):
+            info = EmbeddedDocumentField(Comment)
+            comments = ListField(EmbeddedDocumentField(Comment))
+            by_author = MapField(EmbeddedDocumentField(Comment))
+
+        Post.drop_collection()
+        Post(info=Comment(text='info'),
+             comments=[Comment(text=str(i)) for i in range(100)],
+             by_author={'ross': Comment(text='ross')}).save()
+
+        post = Post.objects.first()
+        self.assertEqual(post._get_changed_fields(), set())
+
+        post.comments[5].text = 'five'
+        for comment in post.comments:
+            if comment.text == '10':
+                comment.text = 'ten'
+        post.info.text = 'changed'
+        post.by_author['ross'].text = 'changed'
+        self.assertEqual(post._get_changed_fields(), set([
+            'comments.5.text', 'comments.10.text', 'info.text',
+            'by_author.ross.text']))
+        self.assertEqual(post._delta(), ({
+            'comments.5.text': 'five', 'comments.10.text': 'ten',
+            'info.text': 'changed', 'by_author.ross.text': 'changed'}, {}))
+
+        post.save()
+        self.assertEqual(post._get_changed_fields(), set())
+        self.assertEqual(post._dirty_fields, None)
+
+        comment = Comment(text='new')
+        post.comments.insert(0, comment)
+        post.comments[1].text = 'zero'
+        self.assertEqual(post._get_changed_fields(), set(['comments']))
+        post.save()
+
+        comment.text = 'first'
+        post.comments[1].text = '0'
+        self.assertEqual(post._get_changed_fields(),
+                         set(['comments.0.text', 'comments.1.text']))
+        post.save()
+
+        post = Post.objects.first()
+        self.assertEqual([c.text for c in post.comments[:3]],
+                         ['first', '0', '1'])
+        self.assertEqual(post.comments[6].text, 'five')
+
+    def test_delta_update_list_operations(self):
+        """Ensure appends and removals are saved with $push, $pull and $pop
+        and conflicting operations fall back to setting the list.
+        """
+        class Comment(EmbeddedDocument):
+            text = StringField()
+
+        class Doc(Document):
+            tags = ListField(StringField(), db_field='t')
+            comments = ListField(EmbeddedDocumentField(Comment))
+            ranks = SortedListField(IntField())
+            name = StringField()
+
+        Doc.drop_collection()
+        Doc(tags=['a', 'b', 'c'], comments=[Comment(text='first')],
+            ranks=[2, 1]).save()
+
+        doc = Doc.objects.first()
+        self.assertEqual(doc._delta_update(), {})
+
+        doc.tags.append('d')
+        doc.tags.extend(['e', 'f'])
+        doc.comments.append(Comment(text='second'))
+        doc.name = 'doc'
+        self.assertEqual(doc._delta_update(), {
+            '$set': {'name': 'doc'},
+            '$push': {'t': {'$each': ['d', 'e', 'f']},
+                      'comments': {'$each': [{'text': 'second'}]}}})
+        # _delta still describes the full values
+        self.assertEqual(doc._delta()[0]['t'], ['a', 'b', 'c', 'd', 'e', 'f'])
+        doc.save()
+        self.assertEqual(doc._delta_update(), {})
+
+        doc.tags.remove('a')
+        doc.tags.remove('b')
+        doc.comments.pop()
+        self.assertEqual(doc._delta_update(), {
+            '$pull': {'t': {'$in': ['a', 'b']}},
+            '$pop': {'comments': 1}})
+        doc.save()
+
+        doc.tags.pop(0)
+        doc.ranks.append(3)
+        self.assertEqual(doc._delta_update(), {
+            '$pop': {'t': -1}, '$set': {'ranks': [1, 2, 3]}})
+        doc.save()
+
+        doc = Doc.objects.first()
+        self.assertEqual(doc.tags, ['d', 'e', 'f'])
+        self.assertEqual([c.text for c in doc.comments], ['first'])
+
+        doc.tags.append('g')
+        doc.tags.remove('d')
+        self.assertEqual(doc._delta_update(), {'$set': {'t': ['e', 'f', 'g']}})
+        doc.save()
+
+        doc.tags.pop()
+        doc.tags.pop()
+        self.assertEqual(doc._delta_update(), {'$set': {'t': ['e']}})
+        doc.save()
+
+        doc.tags.append('e')
+        doc.tags.remove('e')
+        self.assertEqual(doc._delta_update(), {'$set': {'t': ['e']}})
+        doc.tags = ['x']
+        self.assertEqual(doc._delta_update(), {'$set': {'t': ['x']}})
+        doc.save()
+
+        doc.comments[0].text = 'changed'
+        doc.comments.append(Comment(text='new'))
+        self.assertEqual(doc._delta_update(), {'$set': {
+            'comments': [{'text': 'changed'}, {'text': 'new'}]}})
+        doc.save()
+
+        doc = Doc.objects.first()
+        self.assertEqual(doc.tags, ['x'])
+        self.assertEqual([c.text for c in doc.comments], ['changed', 'new'])
+
+    def test_delta_update_list_removals_set_unpullable_items(self):
+        """Ensure removing items MongoDB wouldn't match in $pull, such as
+        embedded documents stored with another key order, saves the list.
+        """
+        class Item(EmbeddedDocument):
+            name = StringField()
+            x = IntField()
+
+        class Doc(Document):
+            items = ListField(EmbeddedDocumentField(Item))
+            numbers = ListField(IntField())
+
+        Doc.drop_collection()
+        Doc._get_collection().insert_one({
+            'items': [{'x': 1, 'name': 'a'}, {'name': 'b', 'legacy': 3}],
+            'numbers': [1, 2]})
+
+        doc = Doc.objects.first()
+        doc.items.remove(doc.items[0])
+        doc.items.remove(doc.items[0])
+        doc.numbers.remove(True)
+        self.assertEqual(doc._delta_update(), {
+            '$set': {'numbers': [2]}, '$unset': {'items': 1}})
+        doc.save()
+
+        raw = Doc._get_collection().find_one()
+        self.assertNotIn('items', raw)
+        self.assertEqual(raw['numbers'], [2])
+
+        doc.numbers.remove(2)
+        self.assertEqual(doc._delta_update(), {
+            '$pull': {'numbers': {'$in': [2]}}})
+
+    def test_delta_update_atomic_fields(self):
+        """Ensure changes of atomic numeric fields are saved with $inc.
+        """
+        class Counter(Document):
+            hits = IntField(atomic=True, default=0, db_field='h')
+            score = FloatField(atomic=True)
+            total = IntField()
+
+        Counter.drop_collection()
+        Counter(score=1.5).save()
+
+        counter = Counter.objects.first()
+        other = Counter.objects.first()
+
+        counter.hits += 1
+        counter.hits += 2
+        counter.score = 2.0
+        counter.total = 3
+        self.assertEqual(counter._delta_update(), {
+            '$inc': {'h': 3, 'score': 0.5}, '$set': {'total': 3}})
+        counter.save()
+
+        other.hits += 10
+        other.save()
+        self.assertEqual(other.hits, 10)
+        self.assertEqual(Counter.objects.first().hits, 13)
+
+        counter.hits = 3
+        self.assertEqual(counter._delta_update(), {})
+        counter.hits = 5
+        counter.hits = 3
+        self.assertEqual(counter._delta_update(), {})
+
+        counter.score = None
+        self.assertEqual(counter._delta_update(), {'$unset': {'score': 1}})
+        counter.save()
+        counter.score = 4.0
+        self.assertEqual(counter._delta_update(), {'$set': {'score': 4.0}})
+        counter.save()
+
+        counter = Counter.objects.first()
+        self.assertEqual((counter.hits, counter.score, counter.total),
+                         (13, 4.0, 3))
+
     @unittest.skip("DynamicDocument not implemented")
     def test_delta_for_dynamic_documents(self):
         class Person(DynamicDocument):
@@ -252,6 +252,18 @@ class InheritanceTest(unittest.TestCase):
         classes = [obj.__class__ for obj in Human.objects]
         self.assertEqual(classes, [Human])
 
+    def test_from_son_leaf_class(self):
+        """Ensure classes without subclasses load the class stored in _cls.
+        """
+        class Animal(Document):
+            meta = {'allow_inheritance': True}
+        class Fish(Animal): pass
+        class Dog(Animal): pass
+
+        son = {'_id': 1, '_cls': 'Animal.Dog'}
+        self.assertTrue(isinstance(Fish._from_son(son), Dog))
+        self.assertTrue(isinstance(Fish._from_son({'_id': 1}), Fish))
+
     def test_allow_inheritance(self):
         """Ensure that inheritance may be disabled on simple classes and that
         _cls and _subclasses will not be used.
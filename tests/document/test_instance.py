@@ -331,6 +331,41 @@ class InstanceTest(unittest.TestCase):
         self.assertEqual(person.name, "Test User")
         self.assertEqual(person.age, 30)
 
+    def test_slotted_layout(self):
+        """Ensure documents with a slotted layout have no instance dict and
+        still track and save changes.
+        """
+        class Comment(EmbeddedDocument):
+            text = StringField()
+            meta = {'slots': True}
+
+        class Post(Document):
+            title = StringField()
+            comments = ListField(EmbeddedDocumentField(Comment))
+            meta = {'slots': True, 'allow_inheritance': True}
+
+        class LinkPost(Post):
+            url = StringField()
+
+        Post.drop_collection()
+
+        post = LinkPost(title='Test', url='http://example.com',
+                        comments=[Comment(text='Hi')])
+        self.assertFalse(hasattr(post, '__dict__'))
+        self.assertFalse(hasattr(post.comments[0], '__dict__'))
+        post.save()
+
+        post = Post.objects.get()
+        self.assertTrue(isinstance(post, LinkPost))
+        self.assertEqual(post._changed_fields, set())
+        post.comments[0].text = 'Hello'
+        self.assertEqual(post._get_changed_fields(), set(['comments.0.text']))
+        post.save()
+
+        post.reload()
+        self.assertEqual(post.comments[0].text, 'Hello')
+        self.assertRaises(OperationError, post.switch_db, 'testdb-1')
+
     def test_to_dbref(self):
         """Ensure that you can get a dbref of a document"""
         person = self.Person(name="Test User", age=30)
@@ -1884,7 +1919,75 @@ class InstanceTest(unittest.TestCase):
         self.assertEqual(pickle_doc.string, "Two")
         self.assertEqual(pickle_doc.lists, ["1", "2", "3"])
 
-    @unittest.skip("not implemented")
+    def test_pickle_lazy_state(self):
+        """Ensure pickling only stores changed values and the unpickled
+        document keeps decoding lazily and tracking changes.
+        """
+        PickleSignalsTest.drop_collection()
+        PickleSignalsTest(number=1, string="One", lists=['1', '2'],
+                          embedded=PickleEmbedded()).save()
+
+        doc = PickleSignalsTest.objects.first()
+        self.assertEqual(doc.number, 1)
+        doc.lists.append('3')
+        doc.embedded.date = datetime(2020, 1, 1)
+
+        state = doc.__getstate__()
+        self.assertEqual(set(state['_internal_data']), set(['lists', 'embedded']))
+
+        resurrected = pickle.loads(pickle.dumps(doc))
+        self.assertEqual(resurrected._internal_data.keys(),
+                         set(['lists', 'embedded']))
+        self.assertEqual(resurrected._get_changed_fields(),
+                         set(['lists', 'embedded.date']))
+        self.assertEqual(resurrected.number, 1)
+        self.assertEqual(resurrected.lists, ['1', '2', '3'])
+        self.assertTrue(resurrected.embedded._instance is resurrected)
+
+        resurrected.string = "Two"
+        resurrected.save()
+        doc = PickleSignalsTest.objects.first()
+        self.assertEqual(doc.string, "Two")
+        self.assertEqual(doc.lists, ['1', '2', '3'])
+        self.assertEqual(doc.embedded.date, datetime(2020, 1, 1))
+
+        doc.lists.append('4')
+        resurrected = pickle.loads(pickle.dumps(doc))
+        resurrected.lists.append('5')
+        resurrected.save()
+        self.assertEqual(PickleSignalsTest.objects.first().lists,
+                         ['1', '2', '3', '4', '5'])
+
+    def test_cache_bytes(self):
+        """Ensure documents can be cached as BSON and restored lazily.
+        """
+        PickleSignalsTest.drop_collection()
+        PickleSignalsTest(number=1, string="One", lists=['1', '2']).save()
+
+        doc = PickleSignalsTest.objects.raw_bson().first()
+        cached = doc.to_cache_bytes()
+        self.assertEqual(doc._internal_data, {})
+
+        restored = PickleSignalsTest.from_cache_bytes(cached)
+        self.assertEqual(restored._internal_data, {})
+        self.assertEqual(restored._get_changed_fields(), set())
+        self.assertEqual(restored.pk, doc.pk)
+        self.assertEqual(restored.lists, ['1', '2'])
+
+        restored.number = 2
+        restored = Document.from_cache_bytes(restored.to_cache_bytes())
+        self.assertTrue(isinstance(restored, PickleSignalsTest))
+        self.assertEqual(restored._get_changed_fields(), set(['number']))
+        self.assertEqual(restored.number, 2)
+        restored.save()
+        self.assertEqual(PickleSignalsTest.objects.first().number, 2)
+
+        new = PickleSignalsTest.from_cache_bytes(
+            PickleSignalsTest(number=3).to_cache_bytes())
+        self.assertFalse(new._created)
+        self.assertEqual(new.number, 3)
+        self.assertRaises(ValueError, PickleTest.from_cache_bytes, cached)
+
     def test_picklable_on_signals(self):
         pickle_doc = PickleSignalsTest(number=1, string="One", lists=['1', '2'])
         pickle_doc.embedded = PickleEmbedded()
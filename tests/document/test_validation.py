@@ -152,6 +152,42 @@ class ValidatorErrorTest(unittest.TestCase):
         with self.assertRaises(ValueError):
             doc.e.val = "OK"
 
+    def test_save_validates_changed_fields(self):
+        """Ensure updates only validate changed fields unless asked to
+        validate the full document.
+        """
+        class Doc(Document):
+            name = StringField(required=True)
+            email = EmailField()
+            count = IntField(required=True)
+
+        Doc.drop_collection()
+        Doc._get_collection().insert_one({'name': 'test',
+                                          'email': 'not an email'})
+
+        doc = Doc.objects.first()
+        doc.name = 'changed'
+        self.assertRaises(ValidationError, doc.save)
+
+        doc.count = 1
+        doc.save()
+        self.assertFalse('email' in doc._internal_data)
+        self.assertRaises(ValidationError, doc.save, validate='full')
+
+        doc.name = None
+        try:
+            doc.save()
+        except ValidationError as e:
+            self.assertEqual(list(e.to_dict().keys()), ['name'])
+        else:
+            self.fail('ValidationError not raised')
+
+        # Required fields stored as null are missing
+        Doc._get_collection().insert_one({'name': None, 'count': 10})
+        doc = Doc.objects.get(count=10)
+        doc.count = 11
+        self.assertRaises(ValidationError, doc.save)
+
 
 if __name__ == '__main__':
     unittest.main()
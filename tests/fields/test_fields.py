@@ -17,6 +17,7 @@ from bson import Binary, DBRef, ObjectId
 
 from mongoengine import *
 from mongoengine.connection import get_db
+from mongoengine.context_managers import query_counter
 from mongoengine.base import _document_registry
 from mongoengine.errors import NotRegistered
 from mongoengine.python_support import PY3, b, bin_type
@@ -1401,6 +1402,136 @@ class FieldTest(unittest.TestCase):
         p = Person.objects.get(name="Ross")
         self.assertEqual(p.parent, p1)
 
+    def test_store_cls_reference_fields(self):
+        """Ensure references stored with their class are read as lazy
+        documents of that class without querying the database.
+        """
+        class Animal(Document):
+            name = StringField()
+            meta = {'allow_inheritance': True}
+
+        class Dog(Animal):
+            pass
+
+        class Owner(Document):
+            name = StringField()
+            pet = ReferenceField(Animal, store_cls=True)
+            pets = ListField(ReferenceField(Animal, store_cls=True))
+
+        Animal.drop_collection()
+        Owner.drop_collection()
+
+        rex = Dog(name='Rex').save()
+        tom = Animal(name='Tom').save()
+        Owner(name='Ross', pet=rex, pets=[rex, tom]).save()
+
+        col = Owner._get_collection()
+        data = col.find_one({'name': 'Ross'})
+        self.assertEqual(data['pet'], {'_id': rex.pk, '_cls': 'Animal.Dog'})
+        self.assertEqual(data['pets'][1], {'_id': tom.pk, '_cls': 'Animal'})
+
+        owner = Owner.objects.get(name='Ross')
+        with query_counter() as q:
+            self.assertTrue(isinstance(owner.pet, Dog))
+            self.assertTrue(owner.pet._lazy)
+            self.assertEqual([type(pet) for pet in owner.pets], [Dog, Animal])
+            owner.validate()
+            self.assertEqual(q, 0)
+        self.assertEqual(owner.pet.name, 'Rex')
+
+        # Queries match the id of the reference
+        self.assertEqual(Owner.objects(pet=rex).count(), 1)
+        self.assertEqual(Owner.objects(pet=rex.pk).count(), 1)
+        self.assertEqual(Owner.objects(pet__in=[tom, rex]).count(), 1)
+        self.assertEqual(Owner.objects(pets=tom).count(), 1)
+        self.assertEqual(Owner.objects(pet__ne=rex).count(), 0)
+
+        # Unfetched proxies are stored without their class
+        col.insert_one({'name': 'Alice', 'pet': rex.pk})
+        owner = Owner.objects.get(name='Alice')
+        with query_counter() as q:
+            owner.save(full=True)
+            self.assertEqual(q, 1)
+        data = col.find_one({'name': 'Alice'})
+        self.assertEqual(data['pet'], {'_id': rex.pk})
+        self.assertEqual(Owner.objects(pet=rex).count(), 2)
+        owner = Owner.objects.get(name='Alice')
+        self.assertTrue(isinstance(owner.pet, Dog))
+
+        # References stored as ids are read as proxies and converted on save
+        col.insert_one({'name': 'Bob', 'pet': rex.pk})
+        owner = Owner.objects.get(name='Bob')
+        self.assertEqual(owner.pet.name, 'Rex')
+        self.assertTrue(isinstance(owner.pet, Dog))
+        owner.save(full=True)
+        data = col.find_one({'name': 'Bob'})
+        self.assertEqual(data['pet'], {'_id': rex.pk, '_cls': 'Animal.Dog'})
+
+        self.assertRaises(ValidationError, ReferenceField, Animal,
+                          dbref=True, store_cls=True)
+
+    def test_reference_load_only(self):
+        """Ensure references with load_only fetch the given fields first and
+        the rest of the document when another field is accessed.
+        """
+        class User(Document):
+            name = StringField()
+            email = StringField(db_field='e')
+            bio = StringField()
+
+        class Post(Document):
+            title = StringField()
+            author = ReferenceField(User, load_only=('name', 'email'))
+            editor = ReferenceField(User)
+
+        User.drop_collection()
+        Post.drop_collection()
+
+        ross = User(name='Ross', email='ross@example.com', bio='...').save()
+        bob = User(name='Bob', email='bob@example.com').save()
+        Post(title='Hello', author=ross, editor=bob).save()
+
+        post = Post.objects.first()
+        with query_counter() as q:
+            self.assertEqual(post.author.name, 'Ross')
+            self.assertEqual(q, 1)
+            self.assertEqual(post.author.email, 'ross@example.com')
+            self.assertEqual(q, 1)
+            self.assertEqual(post.author.bio, '...')
+            self.assertEqual(q, 2)
+
+        post = Post.objects.select_related()[0]
+        self.assertEqual(post.author._partial, ('name', 'e'))
+        self.assertEqual(post.editor._partial, None)
+        self.assertEqual(post.author.bio, '...')
+        self.assertEqual(post.author._partial, None)
+
+        # Documents wanted whole by another reference are fetched whole
+        Post(title='Again', author=ross, editor=ross).save()
+        post = Post.objects(title='Again').select_related()[0]
+        self.assertEqual(post.author._partial, None)
+
+        # Querysets override the fields to load
+        posts = Post.objects(title='Hello')
+        post = posts.load_only(author=('bio',),
+                               editor=('name',)).select_related()[0]
+        self.assertEqual(post.author._partial, ('bio',))
+        self.assertEqual(post.editor._partial, ('name',))
+        post = posts.load_only(author=None).select_related()[0]
+        self.assertEqual(post.author._partial, None)
+
+        # So do the documents joined with $lookup
+        post = posts.select_related(strategy='lookup')[0]
+        self.assertEqual(post.author._partial, ('name', 'e'))
+        self.assertFalse('bio' in post.author._db_data)
+        self.assertEqual(post.editor._partial, None)
+        self.assertEqual(post.editor.name, 'Bob')
+        post = posts.load_only(author=('bio',)).select_related(
+            strategy='lookup')[0]
+        self.assertEqual(post.author._partial, ('bio',))
+        self.assertFalse('name' in post.author._db_data)
+        self.assertEqual(post.author.bio, '...')
+
     def test_list_item_dereference(self):
         """Ensure that DBRef items in ListFields are dereferenced.
         """
@@ -1,9 +1,11 @@
 import sys
+import time
 
 sys.path[0:0] = [""]
 
 import unittest
 import uuid
+import warnings
 from datetime import datetime, timedelta
 
 import pymongo
@@ -14,6 +16,8 @@ from pymongo.read_concern import ReadConcern
 from pymongo.read_preferences import ReadPreference
 
 from mongoengine import *
+from mongoengine import signals
+from mongoengine.base import LazyBSONDocument
 from mongoengine.connection import get_connection
 from mongoengine.context_managers import query_counter
 from mongoengine.errors import InvalidQueryError
@@ -24,6 +28,10 @@ from mongoengine.queryset import (DoesNotExist, MultipleObjectsReturned,
 __all__ = ("QuerySetTest",)
 
 
+def _get_title(post):
+    return post['title']
+
+
 class QuerySetTest(unittest.TestCase):
 
     def setUp(self):
@@ -662,8 +670,24 @@ class QuerySetTest(unittest.TestCase):
                  for i in range(99)]
         with query_counter() as q:
             self.assertEqual(q, 0)
-            Blog.objects.insert(blogs)
-            self.assertEqual(q, 2)  # 1 for insert 1 for fetch
+            results = Blog.objects.insert(blogs)
+            self.assertEqual(q, 1)  # The documents aren't fetched again
+        self.assertEqual(results, blogs)
+        self.assertTrue(all(blog.pk and blog._created for blog in blogs))
+        self.assertEqual(results[5].posts[0].comments[1].name, 'testb')
+
+        # Check bulk insert in batches, reading the documents back
+        Blog.drop_collection()
+        blogs = [Blog(title="%s" % i, posts=[post1, post2])
+                 for i in range(10)]
+        with query_counter() as q:
+            results = Blog.objects.insert(blogs, batch_size=4, ordered=False,
+                                          reload=True)
+            self.assertEqual(q, 4)  # 3 inserts 1 for fetch
+        self.assertEqual([blog.title for blog in results],
+                         ["%s" % i for i in range(10)])
+        self.assertFalse(any(result is blog
+                             for result, blog in zip(results, blogs)))
 
         Blog.drop_collection()
 
@@ -2762,6 +2786,340 @@ class QuerySetTest(unittest.TestCase):
         self.assertEqual(results[0]['name'], 'Bob Dole')
         self.assertEqual(results[1]['name'], 'Barack Obama')
 
+    def test_raw_bson(self):
+
+        class Address(EmbeddedDocument):
+            city = StringField()
+
+        class User(Document):
+            name = StringField()
+            age = IntField()
+            address = EmbeddedDocumentField(Address)
+
+        User.drop_collection()
+        User(name="Bob Dole", age=89, address=Address(city="Russell")).save()
+
+        user = User.objects.raw_bson().get()
+        self.assertTrue(isinstance(user._db_data, LazyBSONDocument))
+        self.assertEqual(user.name, "Bob Dole")
+        self.assertEqual(user.address.city, "Russell")
+
+        user.age = 90
+        user.save()
+        user.reload()
+        self.assertTrue(isinstance(user._db_data, LazyBSONDocument))
+        self.assertEqual(user.age, 90)
+
+        results = list(User.objects.raw_bson().only('name').as_pymongo())
+        self.assertTrue(isinstance(results[0], dict))
+        self.assertEqual(results[0]['name'], "Bob Dole")
+        self.assertEqual(User.objects.raw_bson().scalar('age')[0], 90)
+
+    def test_auto_prefetch(self):
+
+        class Author(Document):
+            name = StringField()
+
+        class Animal(Document):
+            name = StringField()
+            meta = {'allow_inheritance': True}
+
+        class Post(Document):
+            author = ReferenceField(Author)
+            animal = ReferenceField(Animal)
+
+        Author.drop_collection()
+        Animal.drop_collection()
+        Post.drop_collection()
+
+        authors = [Author(name='Author %d' % i).save() for i in range(5)]
+        animal = Animal(name='Rex').save()
+        for i in range(150):
+            Post(author=authors[i % 5], animal=animal).save()
+
+        posts = list(Post.objects.auto_prefetch())
+        self.assertEqual(posts[3].author.name, 'Author 3')
+        # Only the references of the batch of the touched post are fetched
+        self.assertFalse(any(post.author._lazy for post in posts[:100]))
+        self.assertTrue(all(post.author._lazy for post in posts[100:]))
+        self.assertTrue(all(post.animal._lazy for post in posts[:100]))
+
+        self.assertEqual(posts[120].author.name, 'Author 0')
+        self.assertFalse(any(post.author._lazy for post in posts[100:]))
+
+        self.assertEqual(posts[0].animal.name, 'Rex')
+        self.assertFalse(any(post.animal._lazy for post in posts[:100]))
+        self.assertTrue(posts[100].animal._lazy)
+
+        posts = list(Post.objects)
+        self.assertEqual(posts[0].author.name, 'Author 0')
+        self.assertTrue(posts[1].author._lazy)
+
+    def test_iterator(self):
+        """Ensure QuerySet.iterator streams results without caching them.
+        """
+        class Author(Document):
+            name = StringField()
+
+        class Post(Document):
+            title = StringField()
+            author = SafeReferenceField(Author)
+
+        Author.drop_collection()
+        Post.drop_collection()
+
+        author = Author(name='Ross').save()
+        for i in range(5):
+            Post(title='Post %d' % i, author=author).save()
+
+        posts = Post.objects.order_by('title')
+        with query_counter() as q:
+            results = list(posts.iterator(chunk_size=2))
+            self.assertTrue(q <= 6)
+        self.assertEqual([post.title for post in results],
+                         ['Post %d' % i for i in range(5)])
+        self.assertEqual(results[4].author.name, 'Ross')
+        self.assertEqual(posts._result_cache, [])
+        self.assertEqual(posts._cursor_obj, None)
+
+        self.assertEqual(list(posts.scalar('title').iterator())[:2],
+                         ['Post 0', 'Post 1'])
+        self.assertEqual(list(posts.as_pymongo().only('title').iterator())[0],
+                         {'title': 'Post 0'})
+        self.assertEqual(len(list(posts.limit(3).iterator(chunk_size=3))), 3)
+        self.assertEqual(list(posts.none().iterator()), [])
+
+    def test_prefetch(self):
+        """Ensure QuerySet.prefetch reads the results in a worker thread.
+        """
+        class Post(Document):
+            title = StringField()
+
+        Post.drop_collection()
+        for i in range(5):
+            Post(title='Post %d' % i).save()
+
+        posts = Post.objects.order_by('title').batch_size(2).prefetch()
+        self.assertEqual([post.title for post in posts],
+                         ['Post %d' % i for i in range(5)])
+        self.assertEqual(posts.count(), 5)
+        self.assertEqual(list(posts.scalar('title').prefetch(depth=2))[4],
+                         'Post 4')
+        self.assertEqual(len(list(posts.prefetch(0))), 5)
+        self.assertRaises(ValueError, posts.prefetch, -1)
+
+        # Rewinding stops the worker before reading the results again
+        posts = Post.objects.order_by('title').batch_size(2).prefetch()
+        self.assertEqual(next(posts).title, 'Post 0')
+        worker = posts._background_cursor_obj.thread
+        posts.rewind()
+        self.assertFalse(worker.is_alive())
+        self.assertEqual(next(posts).title, 'Post 0')
+
+    def test_counter_buffer(self):
+        """Ensure buffered increments are summed and written together.
+        """
+        class Post(Document):
+            title = StringField()
+            views = IntField(db_field='v', default=0)
+            likes = IntField(default=0)
+
+        Post.drop_collection()
+        posts = [Post(title='Post %d' % i).save() for i in range(3)]
+
+        counters = Post.objects.counter_buffer(max_size=3, max_delay=60,
+                                               flush_on_exit=False)
+        with query_counter() as q:
+            for i in range(10):
+                counters.update({'pk': posts[0].pk}, inc__views=1)
+            counters.update(Q(pk=posts[1].pk), inc__views=2, dec__likes=1)
+            self.assertEqual(len(counters), 2)
+            self.assertEqual(q, 0)
+            counters.update({'title': 'Post 2'}, inc__likes=1)
+            self.assertEqual(q, 1)
+            self.assertEqual(len(counters), 0)
+
+        self.assertEqual([(post.views, post.likes) for post in
+                          Post.objects.order_by('title')],
+                         [(10, 0), (2, -1), (0, 1)])
+
+        with Post.objects(title='Post 0').counter_buffer(
+                flush_on_exit=False) as counters:
+            counters.update({}, inc__views=5)
+            self.assertRaises(InvalidQueryError, counters.update,
+                              {'pk': posts[0].pk}, set__views=1)
+        self.assertEqual(Post.objects.get(title='Post 0').views, 15)
+
+        counters = Post.objects.counter_buffer(max_delay=0,
+                                               flush_on_exit=False)
+        counters.update({'pk': posts[2].pk}, inc__views=1)
+        self.assertEqual(Post.objects.get(pk=posts[2].pk).views, 1)
+
+        # Idle buffers are written after max_delay
+        counters = Post.objects.counter_buffer(max_delay=0.05,
+                                               flush_on_exit=False)
+        counters.update({'pk': posts[2].pk}, inc__views=1)
+        for i in range(100):
+            if not len(counters):
+                break
+            time.sleep(0.02)
+        self.assertEqual(Post.objects.get(pk=posts[2].pk).views, 2)
+
+        # Increments failing permanently are dropped and reported
+        Post.ensure_index('title', unique=True)
+        counters = Post.objects.counter_buffer(upsert=True, max_delay=None,
+                                               flush_on_exit=False)
+        counters.update({'title': 'Post 0', 'likes': 5}, inc__views=1)
+        counters.update({'pk': posts[1].pk}, inc__views=1)
+        self.assertRaises(OperationError, counters.flush)
+        self.assertEqual(len(counters), 0)
+        self.assertEqual(Post.objects.get(pk=posts[1].pk).views, 3)
+
+        counters = Post.objects.counter_buffer(upsert=True, max_delay=0.05,
+                                               flush_on_exit=False)
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            counters.update({'title': 'Post 0', 'likes': 5}, inc__views=1)
+            for i in range(100):
+                if caught:
+                    break
+                time.sleep(0.02)
+        self.assertEqual(len(counters), 0)
+        self.assertEqual([w.category for w in caught], [RuntimeWarning])
+
+    def test_bulk_save(self):
+        """Ensure documents are inserted and updated with bulk writes.
+        """
+        class Post(Document):
+            title = StringField(required=True)
+            slug = StringField(unique=True)
+            score = IntField()
+
+        Post.drop_collection()
+        Post.ensure_indexes()
+
+        saved = []
+
+        def post_save(sender, document, created):
+            saved.append((document.title, created))
+
+        existing = Post(title='Existing', slug='existing', score=1).save()
+        existing.score = 2
+        unchanged = Post.objects.get(pk=existing.pk)
+        new = [Post(title='Post %d' % i, slug='post-%d' % i)
+               for i in range(5)]
+
+        signals.post_save.connect(post_save)
+        try:
+            with query_counter() as q:
+                Post.objects.bulk_save(new + [existing, unchanged],
+                                       batch_size=4)
+                self.assertEqual(q, 2)
+        finally:
+            signals.post_save.disconnect(post_save)
+
+        self.assertEqual(Post.objects.count(), 6)
+        self.assertEqual(Post.objects.get(pk=existing.pk).score, 2)
+        self.assertTrue(all(post.pk for post in new))
+        self.assertEqual(Post.objects.get(pk=new[0].pk).title, 'Post 0')
+        self.assertFalse(existing._get_changed_fields())
+        self.assertEqual(saved[:2], [('Post 0', True), ('Post 1', True)])
+        self.assertEqual(saved[-1], ('Existing', False))
+
+        # Later saves update the inserted documents
+        new[0].score = 3
+        with query_counter() as q:
+            Post.objects.bulk_save(new)
+            self.assertEqual(q, 1)
+        self.assertEqual(Post.objects.get(pk=new[0].pk).score, 3)
+
+        self.assertRaises(ValidationError, Post.objects.bulk_save, [Post()])
+
+        # Successful writes are marked as saved when others fail
+        duplicate = Post(title='Duplicate', slug='post-1')
+        other = Post(title='Other', slug='other')
+        saved = []
+        signals.post_save.connect(post_save)
+        try:
+            self.assertRaises(NotUniqueError, Post.objects.bulk_save,
+                              [duplicate, other])
+        finally:
+            signals.post_save.disconnect(post_save)
+        self.assertEqual(saved, [('Other', True)])
+        self.assertFalse(duplicate.pk)
+        self.assertTrue(other.pk)
+        self.assertEqual(Post.objects(slug='other').count(), 1)
+
+    def test_partition(self):
+        """Ensure querysets are split in non-overlapping ranges of ids and
+        scanned in parallel.
+        """
+        class Post(Document):
+            title = StringField()
+            score = IntField()
+
+        Post.drop_collection()
+        for i in range(50):
+            Post(title='Post %d' % i, score=i % 10).save()
+
+        posts = Post.objects(score__lt=5)
+        for method in ('sample', 'interpolate'):
+            partitions = posts.only('title').partition(4, method=method)
+            self.assertTrue(1 <= len(partitions) <= 4)
+            titles = [post.title for partition in partitions
+                      for post in partition]
+            self.assertEqual(sorted(titles), sorted(posts.scalar('title')))
+            self.assertEqual(len(titles), 25)
+
+        self.assertEqual(len(Post.objects(score=20).partition(3)), 1)
+        self.assertRaises(InvalidQueryError, posts.limit(5).partition, 2)
+        self.assertRaises(ValueError, posts.partition, 0)
+
+        titles = posts.as_pymongo().parallel_map(_get_title, workers=3)
+        self.assertEqual(sorted(titles), sorted(posts.scalar('title')))
+        self.assertEqual(Post.objects.no_dereference().parallel_map(
+            _get_title, workers=2, method='interpolate'),
+            list(Post.objects.order_by('id').scalar('title')))
+        self.assertRaises(ValueError, posts.parallel_map, _get_title,
+                          executor='greenlet')
+
+    def test_safe_references_batch(self):
+        """Ensure the safe references of the results are checked with one
+        query per batch of results.
+        """
+        class Author(Document):
+            name = StringField()
+
+        class Post(Document):
+            author = SafeReferenceField(Author)
+            editors = SafeReferenceListField(ReferenceField(Author))
+
+        Author.drop_collection()
+        Post.drop_collection()
+
+        authors = [Author(name='Author %d' % i).save() for i in range(5)]
+        for i in range(150):
+            Post(author=authors[i % 5], editors=authors[:2]).save()
+        authors[1].delete()
+
+        with query_counter() as q:
+            posts = list(Post.objects)
+            # The results (fetched in two batches at most) and the references
+            # of the first batch, those of the second batch are already known
+            self.assertTrue(q <= 3)
+
+        with query_counter() as q:
+            self.assertEqual(posts[0].author.name, 'Author 0')
+            self.assertEqual(posts[1].author, None)
+            self.assertEqual(posts[122].author.name, 'Author 2')
+            self.assertEqual([editor.name for editor in posts[140].editors],
+                             ['Author 0'])
+            self.assertEqual(q, 0)
+
+        post = Post.objects.get(pk=posts[1].pk)
+        self.assertEqual(post.author, None)
+        self.assertEqual(len(post.editors), 1)
+
     def test_as_pymongo_json_limit_fields(self):
 
         class User(Document):
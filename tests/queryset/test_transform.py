@@ -144,5 +144,68 @@ class TransformTest(unittest.TestCase):
         self.assertEqual(expected, raw_query)
 
 
+    def test_query_plan_cache(self):
+        """Ensure queries of the same shape reuse their compilation plan and
+        only convert the new values.
+        """
+        class Doc(Document):
+            name = StringField(db_field='n')
+            age = IntField()
+
+        def compile(**query):
+            return transform.query(Doc, **query)
+
+        self.assertEqual(compile(name='a', age__gt='1'),
+                         {'n': 'a', 'age': {'$gt': 1}})
+        plans = Doc._field_path_cache().plans
+        plan = plans[('age__gt', 'name')]
+        self.assertEqual(compile(age__gt=2, name='b'),
+                         {'n': 'b', 'age': {'$gt': 2}})
+        self.assertTrue(plans[('age__gt', 'name')] is plan)
+        self.assertEqual(compile(name__in=['c'], name__ne='d'),
+                         {'n': {'$in': ['c'], '$ne': 'd'}})
+        self.assertRaises(InvalidQueryError, compile, title='e')
+
+        queryset = Doc.objects(Q(name='a') | Q(age=1), age__lt=5)
+        self.assertEqual(queryset._query, {
+            '$or': [{'n': 'a'}, {'age': 1}], 'age': {'$lt': 5}})
+        self.assertTrue(queryset._query is queryset._query)
+
+        # Changed fields drop the plans
+        Doc._fields['title'] = StringField(db_field='t')
+        Doc._fields['title'].name = 'title'
+        self.assertEqual(compile(title='e'), {'t': 'e'})
+        self.assertFalse(('age__gt', 'name') in Doc._field_path_cache().plans)
+
+        # So does registering a document class
+        plans = Doc._field_path_cache().plans
+        self.assertTrue(('title',) in plans)
+
+        class Other(Document):
+            pass
+
+        self.assertFalse(Doc._field_path_cache().plans is plans)
+        self.assertEqual(compile(title='f'), {'t': 'f'})
+
+    def test_chained_raw_query(self):
+        """Ensure compiling a chained filter doesn't modify the raw query or
+        the parent queryset's query.
+        """
+        class Doc(Document):
+            age = IntField()
+
+        raw = {'age': {'$gt': 1}}
+        queryset = Doc.objects(__raw__=raw)
+        self.assertEqual(queryset._query, {'age': {'$gt': 1}})
+        self.assertEqual(queryset.filter(age__lt=5)._query,
+                         {'age': {'$gt': 1, '$lt': 5}})
+        self.assertEqual(queryset._query, {'age': {'$gt': 1}})
+        self.assertEqual(raw, {'age': {'$gt': 1}})
+
+        self.assertEqual(transform.query(Doc, __raw__=raw, age__lt=5),
+                         {'age': {'$gt': 1, '$lt': 5}})
+        self.assertEqual(raw, {'age': {'$gt': 1}})
+
+
 if __name__ == '__main__':
     unittest.main()
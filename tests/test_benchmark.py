@@ -1,3 +1,4 @@
+import tracemalloc
 import unittest
 from timeit import repeat
 
@@ -86,6 +87,76 @@ class BenchmarkTestCase(unittest.TestCase):
         print('Serialize big object from database: %.3fms' % (timeit(c.to_mongo, 100) * 10**3))
         print('Load big object from database: %.3fms' % (timeit(lambda: Company.objects[0], 100) * 10**3))
 
+    def test_prefetch(self):
+        class Book(Document):
+            name = StringField()
+            pages = IntField()
+            tags = ListField(StringField())
+
+        Book.drop_collection()
+        Book._get_collection().insert_many([
+            {'name': 'Book %d' % i, 'pages': i, 'tags': ['tag %d' % i] * 10}
+            for i in range(20000)])
+
+        def scan(queryset):
+            for book in queryset.batch_size(1000):
+                book.name
+                book.tags
+
+        print('Scan 20000 documents: %.3fms' % (
+            timeit(lambda: scan(Book.objects), 3) * 10**3))
+        print('Scan 20000 documents with prefetch: %.3fms' % (
+            timeit(lambda: scan(Book.objects.prefetch()), 3) * 10**3))
+
+    def test_query_building(self):
+        class Author(EmbeddedDocument):
+            name = StringField(db_field='n')
+
+        class Book(Document):
+            name = StringField(db_field='nm')
+            pages = IntField(db_field='p')
+            author = EmbeddedDocumentField(Author, db_field='a')
+            tags = ListField(StringField(), db_field='t')
+
+        def build_query():
+            return Book.objects.filter(
+                name='Always be closing', pages__gte=100,
+                author__name='Dale', tags__in=['sales']
+            ).order_by('-pages', 'author.name').only(
+                'name', 'author.name')._query
+
+        print('Build filter/order_by/only query: %.3fus' % (
+            timeit(build_query, 1000) * 10**6))
+
+    def test_memory(self):
+        n = 100000
+
+        def load(slots):
+            class Book(Document):
+                name = StringField()
+                pages = IntField()
+                tags = ListField(StringField())
+                is_published = BooleanField()
+                meta = {'collection': 'book', 'slots': slots}
+
+            sons = [{'_id': i, 'name': 'Always be closing', 'pages': 100,
+                     'tags': ['self-help', 'sales'], 'is_published': True}
+                    for i in range(n)]
+
+            tracemalloc.start()
+            docs = [Book._from_son(son) for son in sons]
+            loaded = tracemalloc.get_traced_memory()[0]
+            for doc in docs:
+                doc.name
+            accessed = tracemalloc.get_traced_memory()[0]
+            tracemalloc.stop()
+            return float(loaded) / n, float(accessed) / n
+
+        for slots in (False, True):
+            loaded, accessed = load(slots)
+            print('Memory per document (slots=%s): %.0fB loaded, %.0fB after '
+                  'getattr' % (slots, loaded, accessed))
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -2,11 +2,14 @@ import sys
 sys.path[0:0] = [""]
 import unittest
 
+from bson import ObjectId
+
 from mongoengine import *
 from mongoengine.connection import get_db
 from mongoengine.context_managers import (switch_db, switch_collection,
                                           no_sub_classes, no_dereference,
-                                          query_counter)
+                                          query_counter, identity_map,
+                                          write_batch)
 
 
 class ContextManagersTest(unittest.TestCase):
@@ -200,5 +203,196 @@ class ContextManagersTest(unittest.TestCase):
 
             self.assertEqual(50, q)
 
+    def test_identity_map(self):
+        connect('mongoenginetest')
+
+        class Author(Document):
+            name = StringField()
+
+        class Animal(Document):
+            name = StringField()
+            meta = {'allow_inheritance': True}
+
+        class Dog(Animal):
+            pass
+
+        class Comment(Document):
+            author = ReferenceField(Author)
+            animal = ReferenceField(Animal)
+
+        Author.drop_collection()
+        Animal.drop_collection()
+        Comment.drop_collection()
+
+        author = Author(name='Ross').save()
+        dog = Dog(name='Rex').save()
+        for i in range(3):
+            Comment(author=author, animal=dog).save()
+
+        comments = list(Comment.objects)
+        self.assertFalse(comments[0].author is comments[1].author)
+
+        with identity_map() as documents:
+            comments = list(Comment.objects)
+            authors = [comment.author for comment in comments]
+            self.assertTrue(all(a is authors[0] for a in authors))
+            self.assertTrue(authors[0]._lazy)
+            self.assertEqual(authors[1].name, 'Ross')
+            self.assertFalse(authors[2]._lazy)
+            self.assertTrue(Author.objects.get(pk=author.pk) is authors[0])
+            self.assertTrue(documents.get(Author, author.pk) is authors[0])
+
+            # Documents loaded with a projection aren't shared
+            partial = Author.objects.only('id').first()
+            self.assertFalse(partial is authors[0])
+            self.assertEqual(authors[0].name, 'Ross')
+
+            animals = [comment.animal for comment in comments]
+            self.assertTrue(all(a is animals[0] for a in animals))
+            self.assertEqual(animals[0].name, 'Rex')
+            loaded = documents.get(Animal, dog.pk)
+            self.assertTrue(isinstance(loaded, Dog))
+            self.assertTrue(Animal.objects.first() is loaded)
+            self.assertTrue(animals[1]._get_current_object() is loaded)
+
+            new = Author(name='New').save()
+            self.assertTrue(Author.objects.get(name='New') is new)
+            new.delete()
+            self.assertEqual(documents.get(Author, new.pk), None)
+
+            # Documents of other databases with the same pk aren't shared
+            register_connection('testdb-1', 'mongoenginetest2')
+            with switch_db(Author, 'testdb-1') as OtherAuthor:
+                OtherAuthor.drop_collection()
+                OtherAuthor._get_collection().insert_one(
+                    {'_id': author.pk, 'name': 'Other'})
+                other = OtherAuthor.objects.get(pk=author.pk)
+                self.assertFalse(other is authors[0])
+                self.assertEqual(other.name, 'Other')
+                self.assertTrue(documents.get(OtherAuthor, author.pk) is other)
+                OtherAuthor.drop_collection()
+            self.assertTrue(documents.get(Author, author.pk) is authors[0])
+
+        self.assertFalse(Author.objects.first() is authors[0])
+
+    def test_write_batch(self):
+        connect('mongoenginetest')
+
+        class Author(Document):
+            name = StringField()
+            slug = StringField(unique=True)
+            posts = IntField(default=0)
+
+        class Note(Document):
+            text = StringField()
+
+        Author.drop_collection()
+        Note.drop_collection()
+        Author.ensure_indexes()
+
+        ross = Author(name='Ross', slug='ross').save()
+        bob = Author(name='Bob', slug='bob').save()
+
+        with query_counter() as q:
+            with write_batch() as batch:
+                ross.name = 'Ross Lawley'
+                ross.save()
+                ross.posts = 2
+                ross.save()
+                bob.update(inc__posts=1)
+                new = Author(name='New', slug='new').save()
+                Note(text='Hello').save()
+                self.assertEqual(len(batch), 4)
+                self.assertEqual(q, 0)
+            # One bulk write per collection
+            self.assertEqual(q, 2)
+
+        ross = Author.objects.get(slug='ross')
+        self.assertEqual((ross.name, ross.posts), ('Ross Lawley', 2))
+        self.assertEqual(Author.objects.get(slug='bob').posts, 1)
+        self.assertTrue(new.pk)
+        self.assertEqual(Author.objects.get(pk=new.pk).name, 'New')
+        self.assertEqual(Note.objects.count(), 1)
+
+        with write_batch():
+            new.delete()
+            self.assertEqual(Author.objects.count(), 3)
+        self.assertEqual(Author.objects.count(), 2)
+
+        # Writes are discarded if the block fails
+        try:
+            with write_batch():
+                Note(text='Discarded').save()
+                raise ValueError
+        except ValueError:
+            pass
+        self.assertEqual(Note.objects.count(), 1)
+
+        # Failures map back to their documents
+        duplicate = Author(name='Duplicate', slug='bob')
+        other = Author(name='Other', slug='other')
+        try:
+            with write_batch(ordered=False):
+                duplicate.save()
+                other.save()
+        except WriteBatchError as e:
+            self.assertEqual([document for document, error in e.errors],
+                             [duplicate])
+            self.assertEqual(e.errors[0][1]['code'], 11000)
+        else:
+            self.fail('WriteBatchError not raised')
+        self.assertFalse(duplicate.pk)
+        self.assertTrue(other.pk)
+
+        # Ordered batches list the writes after a failure as not attempted
+        duplicate = Author(name='Duplicate', slug='bob')
+        after = Author(name='After', slug='after')
+        note = Note(text='Not attempted')
+        try:
+            with write_batch():
+                duplicate.save()
+                after.save()
+                note.save()
+        except WriteBatchError as e:
+            self.assertEqual([document for document, error in e.errors],
+                             [duplicate, after, note])
+            self.assertEqual(e.errors[0][1]['code'], 11000)
+            self.assertFalse('code' in e.errors[2][1])
+        else:
+            self.fail('WriteBatchError not raised')
+        self.assertFalse(after.pk or note.pk)
+        self.assertEqual(Note.objects.count(), 1)
+
+        # Update options can't be applied to queued updates
+        with write_batch() as batch:
+            self.assertRaises(OperationError, bob.update, inc__posts=1,
+                              write_concern={'w': 1})
+            self.assertEqual(len(batch), 0)
+
+    def test_write_batch_upsert(self):
+        connect('mongoenginetest')
+
+        class Animal(Document):
+            name = StringField()
+            meta = {'allow_inheritance': True}
+
+        class Dog(Animal):
+            pass
+
+        Animal.drop_collection()
+
+        dog = Dog(pk=ObjectId(), name='Rex')
+        empty = Dog(pk=ObjectId())
+        with write_batch() as batch:
+            dog.update(upsert=True, multi=False, set__name='Rex')
+            empty.update(upsert=True)
+            self.assertEqual(len(batch), 2)
+
+        # Upserts on inheritable classes store the class like QuerySet.update
+        loaded = Animal.objects.get(pk=dog.pk)
+        self.assertTrue(isinstance(loaded, Dog))
+        self.assertEqual(loaded.name, 'Rex')
+        self.assertTrue(isinstance(Animal.objects.get(pk=empty.pk), Dog))
+
 if __name__ == '__main__':
     unittest.main()
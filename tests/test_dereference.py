@@ -4,6 +4,7 @@ sys.path[0:0] = [""]
 import unittest
 
 from bson import DBRef, ObjectId
+from pymongo import ReadPreference
 
 from mongoengine import *
 from mongoengine.connection import get_db
@@ -1236,6 +1237,155 @@ class FieldTest(unittest.TestCase):
         b.properties['pages'] = 200
         self.assertEqual(b.properties['pages'], 200)
 
+    def test_select_related_reads_references_only(self):
+        """Ensure select_related fetches the references of all documents with
+        one query per collection, without decoding other fields.
+        """
+        class Author(Document):
+            name = StringField()
+
+        class Tag(Document):
+            name = StringField()
+
+        class Post(Document):
+            title = StringField()
+            author = ReferenceField(Author)
+            tags = ListField(ReferenceField(Tag))
+
+        Author.drop_collection()
+        Tag.drop_collection()
+        Post.drop_collection()
+
+        ross = Author.objects.create(name='Ross')
+        bob = Author.objects.create(name='Bob')
+        tags = [Tag.objects.create(name=str(i)) for i in range(3)]
+        Post.objects.create(title='a', author=ross, tags=tags[:2])
+        Post.objects.create(title='b', author=bob, tags=tags[1:])
+        Post.objects.create(title='c', author=ross)
+
+        with query_counter() as q:
+            posts = Post.objects.order_by('title').select_related()
+            self.assertEqual(q, 3)
+
+            self.assertEqual([post.author.name for post in posts],
+                             ['Ross', 'Bob', 'Ross'])
+            self.assertEqual([[tag.name for tag in post.tags]
+                              for post in posts], [['0', '1'], ['1', '2'], []])
+            self.assertTrue(posts[0].author is posts[2].author)
+            self.assertEqual(q, 3)
+
+        for post in posts:
+            self.assertFalse('title' in post._internal_data)
+
+        with query_counter() as q:
+            post = Post.objects.get(title='b')
+            post.tags
+            post.select_related()
+            self.assertEqual(q, 3)
+            self.assertEqual(post.author.name, 'Bob')
+            self.assertEqual([tag.name for tag in post.tags], ['1', '2'])
+            self.assertEqual(q, 3)
+
+    def test_select_related_lookup(self):
+        """Ensure select_related joins references with $lookup in one round
+        trip.
+        """
+        class Author(Document):
+            name = StringField()
+
+        class Tag(Document):
+            name = StringField()
+
+        class Post(Document):
+            title = StringField()
+            author = ReferenceField(Author)
+            editor = ReferenceField(Author, dbref=True)
+            tags = ListField(ReferenceField(Tag))
+
+        Author.drop_collection()
+        Tag.drop_collection()
+        Post.drop_collection()
+
+        ross = Author.objects.create(name='Ross')
+        bob = Author.objects.create(name='Bob')
+        tags = [Tag.objects.create(name=str(i)) for i in range(3)]
+        Post.objects.create(title='a', author=ross, editor=bob,
+                            tags=tags[:2])
+        Post.objects.create(title='b', author=bob, tags=tags[1:])
+        Post.objects.create(title='c', author=ross)
+
+        with query_counter() as q:
+            posts = Post.objects.order_by('-title').skip(1).select_related(
+                strategy='lookup', fields=['author', 'tags'])
+            self.assertEqual(q, 1)
+
+            self.assertEqual([post.title for post in posts], ['b', 'a'])
+            self.assertEqual([post.author.name for post in posts],
+                             ['Bob', 'Ross'])
+            self.assertEqual([[tag.name for tag in post.tags]
+                              for post in posts], [['1', '2'], ['0', '1']])
+            self.assertEqual(q, 1)
+
+        post = Post.objects.get(title='a')
+        with query_counter() as q:
+            post.select_related(strategy='lookup', fields=['author', 'tags'])
+            self.assertEqual(q, 1)
+            self.assertEqual(post.author.name, 'Ross')
+            self.assertEqual([tag.name for tag in post.tags], ['0', '1'])
+            self.assertEqual(q, 1)
+        self.assertFalse('title' in post._internal_data)
+
+        # DBRef fields are left lazy
+        post = Post.objects.select_related(strategy='lookup')[0]
+        self.assertTrue('tags' in post._internal_data)
+        self.assertFalse('editor' in post._internal_data)
+
+        # So are references to documents of another database
+        register_connection('testdb-1', 'mongoenginetest2')
+
+        class Remote(Document):
+            name = StringField()
+            meta = {'db_alias': 'testdb-1'}
+
+        class Link(Document):
+            author = ReferenceField(Author)
+            remote = ReferenceField(Remote)
+
+        Remote.drop_collection()
+        Link.drop_collection()
+        remote = Remote.objects.create(name='Remote')
+        Link.objects.create(author=ross, remote=remote)
+        link = Link.objects.select_related(strategy='lookup')[0]
+        self.assertTrue('author' in link._internal_data)
+        self.assertFalse('remote' in link._internal_data)
+        self.assertEqual(link.remote.name, 'Remote')
+        self.assertRaises(InvalidQueryError, Link.objects.select_related,
+                          strategy='lookup', fields=['remote'])
+        Remote.drop_collection()
+
+        self.assertRaises(InvalidQueryError, Post.objects.select_related,
+                          strategy='lookup', fields=['title'])
+        self.assertRaises(InvalidQueryError, Post.objects.select_related,
+                          strategy='lookup', fields=['editor'])
+        self.assertRaises(ValueError, Post.objects.select_related,
+                          strategy='join')
+
+        # The options of the queryset apply to the aggregation
+        posts = Post.objects.order_by('title').read_preference(
+            ReadPreference.SECONDARY_PREFERRED).hint([('_id', 1)]) \
+            .batch_size(1).select_related(strategy='lookup')
+        self.assertEqual([post.title for post in posts], ['a', 'b', 'c'])
+        authors = Post.objects.order_by('title').scalar('author') \
+            .select_related(strategy='lookup')
+        self.assertEqual([author.name for author in authors],
+                         ['Ross', 'Bob', 'Ross'])
+        self.assertRaises(InvalidQueryError,
+                          Post.objects.as_pymongo().select_related,
+                          strategy='lookup')
+        self.assertRaises(InvalidQueryError,
+                          Post.objects.timeout(False).select_related,
+                          strategy='lookup')
+
 if __name__ == '__main__':
     unittest.main()
 
@@ -0,0 +1,64 @@
+import sys
+sys.path[0:0] = [""]
+import datetime
+import re
+import unittest
+
+import bson
+from bson import Binary, Code, DBRef, ObjectId
+from bson.int64 import Int64
+from bson.timestamp import Timestamp
+
+from mongoengine.base import LazyBSONDocument
+
+
+class LazyBSONDocumentTest(unittest.TestCase):
+
+    def setUp(self):
+        self.data = {
+            '_id': ObjectId(),
+            'double': 1.5,
+            'string': 'hello',
+            'document': {'a': 1, 'b': [1, 2]},
+            'array': [{'x': 1}, 'y'],
+            'binary': Binary(b'\x00\x01'),
+            'bool': True,
+            'datetime': datetime.datetime(2020, 1, 1),
+            'null': None,
+            'regex': re.compile('^a.*', re.I),
+            'code': Code('return 1'),
+            'code_w_scope': Code('return x', {'x': 1}),
+            'int32': 1,
+            'timestamp': Timestamp(1, 2),
+            'int64': Int64(2 ** 40),
+            'dbref': DBRef('col', 1),
+            'last': 'end',
+        }
+        self.raw = bson.encode(self.data)
+
+    def test_lookup(self):
+        """Ensure elements are decoded individually and in any order.
+        """
+        doc = LazyBSONDocument(self.raw)
+        self.assertEqual(doc['last'], 'end')
+        self.assertEqual(doc['string'], 'hello')
+        self.assertEqual(doc['document'], {'a': 1, 'b': [1, 2]})
+        self.assertEqual(doc.get('missing', 'default'), 'default')
+        self.assertFalse('missing' in doc)
+        self.assertTrue('null' in doc)
+        self.assertRaises(KeyError, lambda: doc['missing'])
+
+    def test_mapping(self):
+        """Ensure the whole document decodes the same as bson.decode.
+        """
+        expected = bson.decode(self.raw)
+        doc = LazyBSONDocument(self.raw)
+        self.assertEqual(doc['int64'], expected['int64'])
+        self.assertEqual(list(doc), list(expected))
+        self.assertEqual(len(doc), len(expected))
+        self.assertEqual(dict(doc), expected)
+        self.assertEqual(doc.to_dict(), expected)
+
+
+if __name__ == '__main__':
+    unittest.main()